@@ -0,0 +1,177 @@
+# Load test of the tool server (src/api_server.py) at different worker counts.
+#
+# Starts `python -m src.api_server --workers N` for each N in --workers (and,
+# with --dev, the reloading development server for comparison), then drives
+# POST /call from --clients load-generator processes for --duration seconds.
+# The request mix includes generate_rml_mapping, whose result is a long prompt
+# string. Reports requests/sec, p50/p99 latency, errors and bytes per response
+# (gzip applies, as httpx accepts it).
+#
+# Results are written to benchmarks/results/api-<commit>-<time>.json.
+#
+#   python benchmarks/api_load_bench.py --workers 1,2,4 --concurrency 64 --duration 10
+#   python benchmarks/api_load_bench.py --workers 1 --dev --tools get_rml_prefixes
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from pipeline_bench import git_commit
+
+_ANALYSIS = "The first column is the key of each workstation. Numeric columns are measurements. " * 40
+
+CALLS = {
+    "get_rml_prefixes": {},
+    "analyze_thing_description": {"td_file_path": os.path.join(ROOT, "Data", "workstation_TD.json")},
+    "generate_rml_mapping": {"csv_analysis": _ANALYSIS, "td_analysis": _ANALYSIS, "csv_file_path": os.path.join(ROOT, "Data", "workstation.csv")},
+}
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(workers: int, dev: bool) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    command = [sys.executable, "-m", "src.api_server", "--port", str(port)]
+    command += ["--dev"] if dev else ["--workers", str(workers)]
+    # The server prints every tool call; that output is not part of the measurement
+    process = subprocess.Popen(command, cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"{url}/tools", timeout=1).status_code == 200:
+                return process, url
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    process.kill()
+    raise RuntimeError(f"Server with {workers} worker(s) did not start")
+
+
+def stop_server(process: subprocess.Popen) -> float:
+    """Sends SIGTERM (graceful drain) and returns the seconds until the server exited."""
+    start = time.perf_counter()
+    process.send_signal(signal.SIGTERM)
+    try:
+        process.wait(timeout=60)
+    except subprocess.TimeoutExpired:
+        process.kill()
+    return round(time.perf_counter() - start, 3)
+
+
+async def _generate_load(url: str, tools: list, concurrency: int, duration: float) -> dict:
+    latencies, sizes, errors = [], [], 0
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=30) as client:
+        deadline = time.perf_counter() + duration
+
+        async def user(i):
+            nonlocal errors
+            n = i
+            while time.perf_counter() < deadline:
+                tool = tools[n % len(tools)]
+                n += 1
+                start = time.perf_counter()
+                try:
+                    response = await client.post("/call", json={"tool_name": tool, "args": CALLS[tool]})
+                    response.raise_for_status()
+                    sizes.append(response.num_bytes_downloaded)
+                    latencies.append(time.perf_counter() - start)
+                except httpx.HTTPError:
+                    errors += 1
+
+        await asyncio.gather(*(user(i) for i in range(concurrency)))
+    return {"latencies": latencies, "sizes": sizes, "errors": errors}
+
+
+def _client_process(args):
+    return asyncio.run(_generate_load(*args))
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_load(url: str, tools: list, concurrency: int, duration: float, clients: int) -> dict:
+    per_client = max(1, concurrency // clients)
+    start = time.perf_counter()
+    with multiprocessing.Pool(clients) as pool:
+        parts = pool.map(_client_process, [(url, tools, per_client, duration)] * clients)
+    elapsed = time.perf_counter() - start
+    latencies = [v for p in parts for v in p["latencies"]]
+    sizes = [v for p in parts for v in p["sizes"]]
+    return {
+        "requests": len(latencies),
+        "errors": sum(p["errors"] for p in parts),
+        "requests_per_s": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(1000 * percentile(latencies, 50), 2),
+        "p99_ms": round(1000 * percentile(latencies, 99), 2),
+        "bytes_per_response": round(sum(sizes) / len(sizes)) if sizes else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test of the tool server at different worker counts.")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts")
+    parser.add_argument("--dev", action="store_true", help="Also measure the development server (--dev: reload, one worker)")
+    parser.add_argument("--tools", default=",".join(CALLS), help=f"Comma-separated tools to call in turn, from {list(CALLS)}")
+    parser.add_argument("--concurrency", type=int, default=64, help="Requests in flight at once (over all clients)")
+    parser.add_argument("--clients", type=int, default=min(4, os.cpu_count() or 1), help="Load-generator processes")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds of load per server")
+    parser.add_argument("--warmup", type=float, default=2.0, help="Seconds of unmeasured load per server")
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results"), help="Directory for the result JSON")
+    args = parser.parse_args()
+
+    tools = [t for t in args.tools.split(",") if t]
+    setups = [(int(w), False) for w in args.workers.split(",")] + ([(1, True)] if args.dev else [])
+    result = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "config": {k: v for k, v in vars(args).items() if k != "out"},
+        "servers": [],
+    }
+    print(f"{'mode':6s} {'workers':>7s} {'req/s':>9s} {'p50 ms':>8s} {'p99 ms':>8s} {'errors':>6s} {'B/resp':>7s} {'stop s':>7s}")
+    for workers, dev in setups:
+        process, url = start_server(workers, dev)
+        try:
+            if args.warmup > 0:
+                run_load(url, tools, args.concurrency, args.warmup, args.clients)
+            data = run_load(url, tools, args.concurrency, args.duration, args.clients)
+        finally:
+            shutdown_s = stop_server(process)
+        data.update({"mode": "dev" if dev else "prod", "workers": workers, "shutdown_s": shutdown_s})
+        result["servers"].append(data)
+        print(f"{data['mode']:6s} {workers:7d} {data['requests_per_s']:9.1f} {data['p50_ms']:8.2f} {data['p99_ms']:8.2f} "
+              f"{data['errors']:6d} {data['bytes_per_response']:7d} {shutdown_s:7.2f}")
+
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"api-{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nResults written to: {path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# OpenAI-compatible stand-in for the LLM, for offline benchmarks and tests.
+#
+# Serves POST /v1/chat/completions (plain and streaming) and recognizes the
+# pipeline's prompts:
+#   - CSV / TD analysis prompts get a short plain-text analysis (the CSV one
+#     repeats the "Column Headers" line, so the generation prompt carries it);
+#   - RML generation prompts get a mapping with one sensor TriplesMap and one
+#     observation TriplesMap per measurement column;
+#   - fragment refinement prompts get the statement back without the injected fault;
+#   - whole-mapping refinement prompts get the previous mapping back without
+#     the injected faults (a minimal valid mapping if it is incomplete).
+# Latency and fault injection are configurable; GET /stats counts what was served.
+#
+#   python benchmarks/mock_llm_server.py --port 8001 --latency 0.2 --fault-rate 0.3
+#   LLM_BASE_URL=http://127.0.0.1:8001/v1 OPENAI_API_KEY=mock model=mock python main.py
+
+import argparse
+import ast
+import asyncio
+import json
+import os
+import random
+import re
+import sys
+import time
+import uuid
+from dataclasses import dataclass, field
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from prefixes import get_prefix_declarations
+
+# Faults a generation answer can carry; see _inject()
+FAULTS = ("syntax", "iterator", "prefix", "function_call")
+
+# Line inserted by the "syntax" fault; not valid Turtle, removed again by fragment refinement
+_BROKEN = "    BROKEN-TOKEN ;\n"
+
+_MEASUREMENT_RE = re.compile(r"^(temperature|temp|humidity|hum|pressure)", re.IGNORECASE)
+
+
+@dataclass
+class MockConfig:
+    latency: float = 0.0          # Seconds before the first byte of every answer
+    chunk_latency: float = 0.0    # Seconds per streamed chunk (also added up for plain answers)
+    chunk_chars: int = 64         # Characters per streamed chunk
+    fault_rate: float = 0.0       # Share of generation answers with an injected fault
+    faults: tuple = FAULTS
+    tool_call_rate: float = 0.0   # Share of analysis requests answered with a get_rml_prefixes tool call
+    seed: int = 0
+    stats: dict = field(default_factory=lambda: {"requests": 0, "streamed": 0, "tool_calls": 0, "faults": {}})
+
+
+def _local_name(column: str) -> str:
+    return re.sub(r"\W", "_", column.strip()) or "column"
+
+
+def build_mapping(csv_name: str, columns: list) -> str:
+    """A mapping in the shape construct_combined_rml_prompt asks for: a sensor map plus one map per measurement."""
+    columns = [c.strip() for c in columns] or ["workstation_id"]
+    key = columns[0]
+    source = f'    rml:logicalSource [ rml:source "{csv_name}" ; rml:referenceFormulation ql:CSV ] ;\n'
+    parts = [get_prefix_declarations(), ""]
+
+    sensor = [f"<#SensorTriplesMap> a rml:TriplesMap ;\n", source,
+              f'    rml:subjectMap [ rml:template "http://example.org/sensor/{{{key}}}" ; rml:class sosa:Sensor ]']
+    measurements = []
+    for column in columns[1:]:
+        if _MEASUREMENT_RE.match(column):
+            measurements.append(column)
+        else:
+            sensor.append(f' ;\n    rml:predicateObjectMap [ rml:predicate ex:{_local_name(column)} ; '
+                          f'rml:objectMap [ rml:reference "{column}" ] ]')
+    parts.append("".join(sensor) + " .\n")
+
+    for column in measurements:
+        name = _local_name(column)
+        parts.append(
+            f"<#{name}ObservationTriplesMap> a rml:TriplesMap ;\n{source}"
+            f'    rml:subjectMap [ rml:template "http://example.org/obs/{name}-{{{key}}}" ; rml:class sosa:Observation ] ;\n'
+            f'    rml:predicateObjectMap [ rml:predicate sosa:hasSimpleResult ; rml:objectMap [ rml:reference "{column}" ; rml:datatype xsd:float ] ] ;\n'
+            f'    rml:predicateObjectMap [ rml:predicate sosa:madeBySensor ; rml:objectMap [ rml:template "http://example.org/sensor/{{{key}}}" ; rml:termType rml:IRI ] ] .\n'
+        )
+    return "\n".join(parts)
+
+
+def _inject(mapping: str, fault: str) -> str:
+    if fault == "syntax":
+        # Break the last statement, so fragment refinement has something to locate
+        head, sep, tail = mapping.rpartition("> a rml:TriplesMap ;\n")
+        return f"{head}{sep}{_BROKEN}{tail}"
+    if fault == "iterator":
+        return mapping.replace("rml:referenceFormulation ql:CSV ]", 'rml:referenceFormulation ql:CSV ; rml:iterator "$" ]', 1)
+    if fault == "prefix":
+        return re.sub(r"^@prefix sosa: <[^>]*> \.\n", "", mapping, flags=re.MULTILINE)
+    if fault == "function_call":
+        return json.dumps({"name": "generate_rml_mapping", "arguments": {"csv_file_path": "data.csv"}})
+    return mapping
+
+
+class MockLLM:
+    """Chooses the answer to a chat request; shared state lives in its MockConfig."""
+
+    def __init__(self, config: MockConfig):
+        self.config = config
+        self.rng = random.Random(config.seed)
+
+    def answer(self, prompt: str) -> str:
+        if "### STATEMENT TO FIX:" in prompt:
+            fragment = prompt.split("### STATEMENT TO FIX:\n", 1)[1].split("\n\nRULES:", 1)[0]
+            fragment = fragment.replace(_BROKEN, "").strip()
+            return fragment if fragment.endswith(".") else fragment + " ."
+        if "OUTPUT THE TURTLE NOW" in prompt:
+            match = re.search(r"Column Headers: (\[.*?\])", prompt)
+            columns = ast.literal_eval(match.group(1)) if match else []
+            csv_name = re.search(r"CSV File: (\S+)", prompt)
+            mapping = build_mapping(csv_name.group(1) if csv_name else "data.csv", columns)
+            if self.config.faults and self.rng.random() < self.config.fault_rate:
+                fault = self.rng.choice(list(self.config.faults))
+                self.config.stats["faults"][fault] = self.config.stats["faults"].get(fault, 0) + 1
+                mapping = _inject(mapping, fault)
+            return mapping
+        if prompt.lstrip().startswith(("Your previous", "Your RML output")):
+            previous = re.search(r"### YOUR PREVIOUS OUTPUT.*?\n```turtle\n(.*?)\n```", prompt, re.DOTALL)
+            previous = previous.group(1).strip() if previous else ""
+            # A function call, an aborted stream's partial output or a compacted mapping cannot be echoed back
+            if "rml:TriplesMap" not in previous or not previous.endswith(".") or "omitted to fit the token budget" in previous:
+                return build_mapping("data.csv", ["workstation_id"])
+            mapping = previous.replace(_BROKEN, "").replace(' ; rml:iterator "$"', "")
+            if "@prefix sosa:" not in mapping:
+                mapping = "@prefix sosa: <http://www.w3.org/ns/sosa/> .\n" + mapping
+            return mapping
+        if "data structure analyzer" in prompt:
+            headers = re.search(r"### Column Headers: (\[.*?\])", prompt)
+            return (f"Column Headers: {headers.group(1) if headers else '[]'}\n"
+                    "The first column is the key of each workstation. Numeric columns are measurements; "
+                    "use the measured xsd types as rml:datatype.")
+        if "semantic analyzer" in prompt:
+            properties = re.findall(r"^\s*- (\w+) \(", prompt, flags=re.MULTILINE)
+            return (f"The TD describes {len(properties)} properties: {', '.join(properties)}. "
+                    "Use sosa:Sensor for the thing, sosa:Observation for measurements and QUDT units.")
+        return "OK"
+
+    def wants_tool_call(self, body: dict) -> bool:
+        messages = body.get("messages", [])
+        return (bool(body.get("tools")) and body.get("tool_choice") != "none"
+                and not any(m.get("role") == "tool" for m in messages)
+                and "OUTPUT THE TURTLE NOW" not in str(messages[-1].get("content", ""))
+                and self.rng.random() < self.config.tool_call_rate)
+
+
+def _chunks(text: str, size: int) -> list:
+    return [text[i:i + size] for i in range(0, len(text), size)] or [""]
+
+
+def create_app(config: MockConfig = None) -> FastAPI:
+    config = config or MockConfig()
+    llm = MockLLM(config)
+    app = FastAPI(title="Mock LLM")
+
+    @app.get("/stats")
+    async def stats():
+        return config.stats
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        config.stats["requests"] += 1
+        prompt = next((m.get("content") or "" for m in body.get("messages", []) if m.get("role") == "user"), "")
+        tool_call = llm.wants_tool_call(body)
+        text = "" if tool_call else llm.answer(prompt)
+        if tool_call:
+            config.stats["tool_calls"] += 1
+        calls = [{"index": 0, "id": f"call_{uuid.uuid4().hex[:8]}", "type": "function",
+                  "function": {"name": "get_rml_prefixes", "arguments": "{}"}}] if tool_call else None
+        finish = "tool_calls" if tool_call else "stop"
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "created": int(time.time()), "model": body.get("model", "mock")}
+
+        await asyncio.sleep(config.latency)
+        if not body.get("stream"):
+            await asyncio.sleep(config.chunk_latency * len(_chunks(text, config.chunk_chars)))
+            message = {"role": "assistant", "content": text or None}
+            if calls:
+                message["tool_calls"] = [{k: v for k, v in c.items() if k != "index"} for c in calls]
+            tokens_in, tokens_out = len(json.dumps(body.get("messages", []))) // 4, len(text) // 4
+            return JSONResponse(dict(base, object="chat.completion",
+                                     choices=[{"index": 0, "message": message, "finish_reason": finish}],
+                                     usage={"prompt_tokens": tokens_in, "completion_tokens": tokens_out, "total_tokens": tokens_in + tokens_out}))
+
+        config.stats["streamed"] += 1
+
+        async def events():
+            def event(delta, finish_reason=None):
+                chunk = dict(base, object="chat.completion.chunk", choices=[{"index": 0, "delta": delta, "finish_reason": finish_reason}])
+                return f"data: {json.dumps(chunk)}\n\n"
+            if calls:
+                yield event({"role": "assistant", "tool_calls": calls})
+            else:
+                for i, piece in enumerate(_chunks(text, config.chunk_chars)):
+                    if i:
+                        await asyncio.sleep(config.chunk_latency)
+                    yield event({"role": "assistant", "content": piece} if i == 0 else {"content": piece})
+            yield event({}, finish)
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="OpenAI-compatible mock LLM for offline runs of main.py.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds before each answer")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Seconds per streamed chunk")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Share of generation answers with a fault")
+    parser.add_argument("--faults", default=",".join(FAULTS), help=f"Comma-separated subset of {FAULTS}")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0, help="Share of analysis requests answered with a tool call")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    config = MockConfig(latency=args.latency, chunk_latency=args.chunk_latency, fault_rate=args.fault_rate,
+                        faults=tuple(f for f in args.faults.split(",") if f), tool_call_rate=args.tool_call_rate, seed=args.seed)
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+# Offline end-to-end benchmark of the main.py pipeline.
+#
+# Generates synthetic CSV/TD pairs (benchmarks/synthetic.py) of increasing width
+# and row count, starts the mock LLM (benchmarks/mock_llm_server.py) in a
+# thread, and runs src.pipeline.run_batch() over each pair. Per dataset it reports
+# throughput, p50/p95 per stage from src/metrics.py, and time and peak memory
+# (tracemalloc) of Turtle parsing, SHACL validation and tool serving.
+#
+# Results are written to benchmarks/results/<commit>-<time>.json; --compare
+# prints the change against an earlier result file.
+#
+#   python benchmarks/pipeline_bench.py --widths 6,24,96 --rows 100,10000 --repeats 4
+#   python benchmarks/pipeline_bench.py --fault-rate 0.3 --latency 0.05 --compare benchmarks/results/<file>.json
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from mock_llm_server import FAULTS, MockConfig, create_app
+from synthetic import make_dataset
+
+SHAPES = os.path.join(ROOT, "Shapes", "core.ttl")
+
+# Metric series (src/metrics.py) reported per dataset
+REPORTED = ("stage_seconds", "llm_call_seconds", "tool_call_seconds", "turtle_parse_seconds", "shacl_validation_seconds",
+            "validation_seconds")
+
+
+def start_mock(config: MockConfig) -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(create_app(config), host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}/v1"
+
+
+def configure_env(llm_url: str, args) -> None:
+    """Points main.py at the mock and switches off everything that would skip the LLM pipeline."""
+    os.environ.update({
+        "LLM_BASE_URL": llm_url,
+        "OPENAI_API_KEY": "mock",
+        "model": "mock",
+        "SHACL_SHAPE_PATH": SHAPES,
+        "RULE_GENERATION": "1" if args.rules else "0",
+        "MAPPING_STORE_DIR": "",
+        "LLM_CACHE_DIR": "",
+        "METRICS_DIR": "",
+        "TOOL_TRANSPORT": "inprocess",
+    })
+    if args.validation_workers is not None:
+        os.environ["VALIDATION_WORKERS"] = str(args.validation_workers)
+
+
+def measure(fn):
+    """Runs fn twice: timed, then under tracemalloc (which slows it down). Returns (result, seconds, peak KiB)."""
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return result, round(elapsed, 4), round(peak / 1024, 1)
+
+
+def component_costs(csv_path: str, td_path: str, mapping_text: str) -> dict:
+    """Time and peak memory of parsing, SHACL validation (shapes already loaded) and tool serving (cold cache)."""
+    from src.pipeline import validate_rml_shacl_report
+    from src.mapping import RMLMapping
+    from src.tool_server import UniversalToolServer
+
+    def parse():
+        mapping = RMLMapping(mapping_text)
+        mapping.graph  # Parsed lazily
+        return mapping
+
+    def serve():
+        # A new server each time, so its result cache is cold
+        server = UniversalToolServer(root_path=ROOT)
+        server.dispatch("analyze_csv_structure", {"csv_file_path": csv_path})
+        server.dispatch("analyze_thing_description", {"td_file_path": td_path})
+
+    costs = {}
+    mapping, costs["parse_s"], costs["parse_peak_kib"] = measure(parse)
+    _, costs["shacl_s"], costs["shacl_peak_kib"] = measure(lambda: validate_rml_shacl_report(mapping, SHAPES))
+    with contextlib.redirect_stdout(io.StringIO()):
+        _, costs["tools_s"], costs["tools_peak_kib"] = measure(serve)
+    return costs
+
+
+async def run_dataset(csv_path: str, td_path: str, out_dir: str, repeats: int, concurrency: int) -> dict:
+    from src import pipeline
+    from src.metrics import METRICS
+
+    METRICS.reset()
+    name = os.path.splitext(os.path.basename(csv_path))[0]
+    items = [{"id": f"{name}-{i}", "data_file": csv_path, "td_file": td_path,
+              "output_file": os.path.join(out_dir, f"{name}-{i}.ttl")} for i in range(repeats)]
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with pipeline.make_tool_llm(bypass_cache=True) as tool_llm:
+            summary = await pipeline.run_batch(tool_llm, items, SHAPES, concurrency)
+    histograms = {series: stats for series, stats in METRICS.summary()["histograms"].items() if series.startswith(REPORTED)}
+    counters = METRICS.summary()["counters"]
+    return {
+        "items": summary["items"],
+        "succeeded": summary["succeeded"],
+        "wall_time_s": summary["wall_time_s"],
+        "throughput_items_per_min": summary["throughput_items_per_min"],
+        "latency_s": summary["latency_s"],
+        "refinements": sum(v for k, v in counters.items() if k.startswith("refinements")),
+        "retries": sum(v for k, v in counters.items() if k.startswith("llm_retries")),
+        "histograms": histograms,
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current: dict, previous_path: str) -> None:
+    with open(previous_path, encoding="utf-8") as f:
+        previous = json.load(f)
+    print(f"\nChange vs {previous.get('commit', '?')} ({os.path.basename(previous_path)}):")
+    for name, result in current["datasets"].items():
+        before = previous.get("datasets", {}).get(name)
+        if before is None:
+            print(f"  {name:14s} (not in the earlier run)")
+            continue
+        deltas = []
+        for key, label in (("throughput_items_per_min", "throughput"), ("parse_s", "parse"), ("shacl_s", "shacl"),
+                           ("tools_s", "tools"), ("shacl_peak_kib", "shacl mem")):
+            old = before.get(key) or before.get("components", {}).get(key)
+            new = result.get(key) or result.get("components", {}).get(key)
+            if old and new is not None:
+                deltas.append(f"{label} {100 * (new - old) / old:+.1f}%")
+        print(f"  {name:14s} " + ", ".join(deltas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark of the mapping pipeline.")
+    parser.add_argument("--widths", default="6,24,96", help="Comma-separated CSV column counts")
+    parser.add_argument("--rows", default="100,10000", help="Comma-separated CSV row counts")
+    parser.add_argument("--repeats", type=int, default=4, help="Pipeline runs per dataset")
+    parser.add_argument("--concurrency", type=int, default=4, help="Pipelines running at once (src.pipeline.run_batch)")
+    parser.add_argument("--latency", type=float, default=0.0, help="Mock LLM seconds before each answer")
+    parser.add_argument("--chunk-latency", type=float, default=0.0, help="Mock LLM seconds per streamed chunk")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Share of generated mappings with an injected fault")
+    parser.add_argument("--faults", default=",".join(FAULTS), help=f"Comma-separated subset of {FAULTS}")
+    parser.add_argument("--tool-call-rate", type=float, default=0.0, help="Share of analysis requests answered with a tool call")
+    parser.add_argument("--validation-workers", type=int, help="Validation processes (default: VALIDATION_WORKERS; 0 validates inline)")
+    parser.add_argument("--rules", action="store_true", help="Allow rule-based generation (default: every item goes through the LLM)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(ROOT, "benchmarks", "results"), help="Directory for the result JSON")
+    parser.add_argument("--compare", metavar="RESULT_JSON", help="Earlier result file to compare against")
+    args = parser.parse_args()
+
+    config = MockConfig(latency=args.latency, chunk_latency=args.chunk_latency, fault_rate=args.fault_rate,
+                        faults=tuple(f for f in args.faults.split(",") if f), tool_call_rate=args.tool_call_rate, seed=args.seed)
+    configure_env(start_mock(config), args)
+
+    result = {
+        "commit": git_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "datasets": {},
+    }
+    with tempfile.TemporaryDirectory() as work:
+        for rows in (int(r) for r in args.rows.split(",")):
+            for width in (int(w) for w in args.widths.split(",")):
+                csv_path, td_path = make_dataset(os.path.join(work, "data"), width, rows, args.seed)
+                name = f"w{width}_r{rows}"
+                data = asyncio.run(run_dataset(csv_path, td_path, os.path.join(work, "out"), args.repeats, args.concurrency))
+                mapping_file = os.path.join(work, "out", f"{name}-0.ttl")
+                if os.path.exists(mapping_file):
+                    with open(mapping_file, encoding="utf-8") as f:
+                        data["components"] = component_costs(csv_path, td_path, f.read())
+                result["datasets"][name] = data
+
+                stages = {s.split('"')[1]: v["p50"] for s, v in data["histograms"].items() if s.startswith("stage_seconds") and 'status="ok"' in s}
+                c = data.get("components", {})
+                print(f"{name:14s} {data['succeeded']}/{data['items']} ok  {data['throughput_items_per_min']:8.1f} items/min  "
+                      f"p95 {data['latency_s']['p95']}s  stages p50 {stages}  refinements {data['refinements']:g}  "
+                      f"parse {c.get('parse_s')}s/{c.get('parse_peak_kib')} KiB  shacl {c.get('shacl_s')}s/{c.get('shacl_peak_kib')} KiB  "
+                      f"tools {c.get('tools_s')}s/{c.get('tools_peak_kib')} KiB")
+
+    result["mock_llm"] = config.stats
+    result["max_rss_kib"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    os.makedirs(args.out, exist_ok=True)
+    path = os.path.join(args.out, f"{result['commit']}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"\nMock LLM: {config.stats}")
+    print(f"Max RSS: {result['max_rss_kib'] / 1024:.1f} MiB. Results written to: {path}")
+    if args.compare:
+        compare(result, args.compare)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Throughput benchmark for the streaming RML executor (src/rml_executor.py).
+#
+# Scales Data/sensor.csv up to millions of rows and materializes it with a
+# SOSA observation mapping, reporting rows/s, triples/s and peak memory.
+#
+#   python benchmarks/rml_executor_bench.py --rows 1000000 2000000 5000000
+
+import argparse
+import csv
+import os
+import resource
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from prefixes import get_prefix_declarations
+from src.rml_executor import RMLExecutor
+
+SENSOR_CSV = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Data", "sensor.csv")
+
+SENSOR_MAPPING = get_prefix_declarations() + """
+
+<#TemperatureObservationTriplesMap> a rml:TriplesMap;
+    rml:logicalSource [ rml:source "{source}"; rml:referenceFormulation ql:CSV ];
+    rml:subjectMap [ rml:template "http://example.org/obs/temp-{{timestamp}}"; rml:class sosa:Observation ];
+    rml:predicateObjectMap [ rml:predicate sosa:hasSimpleResult; rml:objectMap [ rml:reference "temperature"; rml:datatype xsd:float ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:resultTime; rml:objectMap [ rml:reference "timestamp"; rml:datatype xsd:dateTime ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:observedProperty; rml:objectMap [ rml:constant <http://qudt.org/vocab/quantitykind/Temperature> ] ];
+    rml:predicateObjectMap [ rml:predicate qudt:unit; rml:objectMap [ rml:constant <http://qudt.org/vocab/unit/DEG_C> ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:madeBySensor; rml:objectMap [ rml:constant <http://example.org/sensor/smartSensor-001> ] ].
+
+<#HumidityObservationTriplesMap> a rml:TriplesMap;
+    rml:logicalSource [ rml:source "{source}"; rml:referenceFormulation ql:CSV ];
+    rml:subjectMap [ rml:template "http://example.org/obs/hum-{{timestamp}}"; rml:class sosa:Observation ];
+    rml:predicateObjectMap [ rml:predicate sosa:hasSimpleResult; rml:objectMap [ rml:reference "humidity"; rml:datatype xsd:float ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:resultTime; rml:objectMap [ rml:reference "timestamp"; rml:datatype xsd:dateTime ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:observedProperty; rml:objectMap [ rml:constant <http://qudt.org/vocab/quantitykind/DimensionlessRatio> ] ];
+    rml:predicateObjectMap [ rml:predicate qudt:unit; rml:objectMap [ rml:constant <http://qudt.org/vocab/unit/PERCENT> ] ];
+    rml:predicateObjectMap [ rml:predicate sosa:madeBySensor; rml:objectMap [ rml:constant <http://example.org/sensor/smartSensor-001> ] ].
+"""
+
+
+def scale_sensor_csv(path: str, rows: int) -> None:
+    """Writes `rows` rows shaped like Data/sensor.csv, cycling its readings with increasing timestamps."""
+    with open(SENSOR_CSV, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        seed = [r for r in reader if r]
+
+    start = datetime(2025, 11, 12, 15, 0, 0)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(header)
+        for i in range(rows):
+            _, temperature, humidity = seed[i % len(seed)]
+            ts = (start + timedelta(seconds=i)).strftime("%Y-%m-%dT%H:%M:%SZ")
+            writer.writerow((ts, temperature, humidity))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1_000_000])
+    parser.add_argument("--format", choices=("nt", "turtle"), default="nt")
+    parser.add_argument("--batch-size", type=int, default=10_000)
+    parser.add_argument("--keep-output", action="store_true", help="Write triples to a temp file instead of /dev/null")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            csv_path = os.path.join(tmp, f"sensor_{rows}.csv")
+            print(f"Generating {rows:,} rows ...", flush=True)
+            scale_sensor_csv(csv_path, rows)
+
+            mapping = SENSOR_MAPPING.replace("{source}", csv_path).replace("{{", "{").replace("}}", "}")
+            executor = RMLExecutor(mapping, batch_size=args.batch_size)
+            out_path = os.path.join(tmp, "out.nt") if args.keep_output else os.devnull
+
+            start = time.perf_counter()
+            with open(out_path, "w", encoding="utf-8", buffering=1024 * 1024) as out:
+                stats = executor.run(out, args.format)
+            elapsed = time.perf_counter() - start
+
+            peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+            print(f"  rows={stats['rows']:,} triples={stats['triples']:,} time={elapsed:.2f}s "
+                  f"rows/s={stats['rows'] / elapsed:,.0f} triples/s={stats['triples'] / elapsed:,.0f} "
+                  f"peak_rss={peak_mb:.0f} MB")
+
+
+if __name__ == "__main__":
+    main()
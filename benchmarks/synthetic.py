@@ -0,0 +1,98 @@
+# Synthetic CSV/TD pairs for the benchmarks, modelled on Data/workstation.csv,
+# Data/sensor.csv and their Thing Descriptions.
+#
+# A dataset of width W has the workstation columns (id, name, floor, lat/long),
+# a timestamp, and W - 6 measurement columns cycling through temperature,
+# humidity and pressure (temperature_1, humidity_2, ...). The TD declares one
+# property per column with the units used in Data/sensor_TD.json.
+
+import csv
+import json
+import os
+import random
+
+BASE_COLUMNS = ["workstation_id", "name", "floor", "latitude", "longitude", "timestamp"]
+
+# Measurement kind -> (TD unit, value range)
+MEASUREMENTS = {
+    "temperature": ("degree celsius", (15.0, 35.0)),
+    "humidity": ("percent", (20.0, 80.0)),
+    "pressure": ("pascal", (98000.0, 103000.0)),
+}
+
+STATIONS = ["Assembly", "Welding", "Packaging", "Painting", "Inspection", "Cutting"]
+
+
+def columns_for(width: int) -> list:
+    kinds = list(MEASUREMENTS)
+    measured = [f"{kinds[i % len(kinds)]}_{i + 1}" for i in range(max(width - len(BASE_COLUMNS), 1))]
+    return BASE_COLUMNS + measured
+
+
+def _row(i: int, columns: list, rng: random.Random) -> list:
+    values = {
+        "workstation_id": f"WS{i + 1:05d}",
+        "name": f"{STATIONS[i % len(STATIONS)]} Station {i + 1}",
+        "floor": str(1 + i % 4),
+        "latitude": f"{48.8565 + rng.uniform(-0.01, 0.01):.6f}",
+        "longitude": f"{2.3521 + rng.uniform(-0.01, 0.01):.6f}",
+        "timestamp": f"2025-11-12T{(i // 60) % 24:02d}:{i % 60:02d}:00Z",
+    }
+    row = []
+    for column in columns:
+        if column in values:
+            row.append(values[column])
+        else:
+            low, high = MEASUREMENTS[column.rsplit("_", 1)[0]][1]
+            row.append(f"{rng.uniform(low, high):.1f}")
+    return row
+
+
+def _thing_description(name: str, columns: list) -> dict:
+    properties = {}
+    for column in columns:
+        kind = column.rsplit("_", 1)[0]
+        if kind in MEASUREMENTS:
+            properties[column] = {
+                "type": "number",
+                "unit": MEASUREMENTS[kind][0],
+                "description": f"Current {kind} reading ({column})",
+                "readOnly": True,
+                "forms": [{"href": f"https://example.org/things/{name}/properties/{column}", "contentType": "application/json", "op": ["readproperty"]}],
+            }
+        else:
+            properties[column] = {
+                "type": {"floor": "integer", "latitude": "number", "longitude": "number"}.get(column, "string"),
+                "title": column.replace("_", " ").title(),
+                "description": f"The {column.replace('_', ' ')} of the workstation",
+            }
+    return {
+        "@context": [
+            "https://www.w3.org/2022/wot/td/v1.1",
+            {"saref": "http://www.w3.org/ns/saref#", "schema": "https://schema.org/", "geo": "http://www.w3.org/2003/01/geo/wgs84_pos#"},
+        ],
+        "id": f"urn:dev:wot:bench:{name}",
+        "title": f"Synthetic Workstation Sensor ({name})",
+        "description": "A factory workstation with environmental sensors, generated for benchmarking.",
+        "securityDefinitions": {"nosec_sc": {"scheme": "nosec"}},
+        "security": ["nosec_sc"],
+        "properties": properties,
+    }
+
+
+def make_dataset(out_dir: str, width: int, rows: int, seed: int = 0) -> tuple[str, str]:
+    """Writes <out_dir>/w<width>_r<rows>.csv and its _TD.json; returns their paths."""
+    os.makedirs(out_dir, exist_ok=True)
+    name = f"w{width}_r{rows}"
+    csv_path = os.path.join(out_dir, f"{name}.csv")
+    td_path = os.path.join(out_dir, f"{name}_TD.json")
+    columns = columns_for(width)
+    rng = random.Random(seed)
+    with open(csv_path, "w", encoding="utf-8", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(columns)
+        for i in range(rows):
+            writer.writerow(_row(i, columns, rng))
+    with open(td_path, "w", encoding="utf-8") as f:
+        json.dump(_thing_description(name, columns), f, indent=2)
+    return csv_path, td_path
@@ -0,0 +1,85 @@
+# Latency benchmark for ToolLLM's tool transports (src/tool_transport.py).
+#
+# Calls the same tools over HTTP (src/api_server.py, started here in a thread)
+# and in-process, checks both return identical results, and reports the
+# per-call latency of each mode.
+#
+#   python benchmarks/tool_transport_bench.py --calls 500
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import socket
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from src.tool_server import UniversalToolServer
+from src.tool_transport import HttpToolTransport, InProcessToolTransport
+
+CALLS = [
+    ("get_rml_prefixes", {}),
+    ("validate_rml_syntax", {"rml_content": open(os.path.join(ROOT, "output", "workstation_mapping.ttl"), encoding="utf-8").read()}),
+    ("analyze_thing_description", {"td_file_path": os.path.join(ROOT, "Data", "workstation_TD.json")}),
+]
+
+
+def start_api_server() -> str:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config("src.api_server:app", host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+async def measure(transport, calls: int) -> dict:
+    await transport.open()
+    results = {}
+    timings = {name: [] for name, _ in CALLS}
+    try:
+        for name, args in CALLS:
+            results[name] = await transport.call(name, args)  # warm-up
+        for _ in range(calls):
+            for name, args in CALLS:
+                start = time.perf_counter()
+                await transport.call(name, args)
+                timings[name].append(time.perf_counter() - start)
+    finally:
+        await transport.close()
+    return {"results": results, "timings": timings}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--calls", type=int, default=200, help="Calls per tool and mode")
+    args = parser.parse_args()
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        url = start_api_server()
+        http = asyncio.run(measure(HttpToolTransport(url, httpx.AsyncClient()), args.calls))
+        inprocess = asyncio.run(measure(InProcessToolTransport(UniversalToolServer(root_path=ROOT)), args.calls))
+
+    for name, _ in CALLS:
+        same = json.dumps(http["results"][name], sort_keys=True) == json.dumps(inprocess["results"][name], sort_keys=True)
+        line = [f"{name:28s}"]
+        for mode, data in (("http", http), ("inprocess", inprocess)):
+            t = sorted(data["timings"][name])
+            line.append(f"{mode}: p50={t[len(t) // 2] * 1000:.3f} ms p95={t[int(len(t) * 0.95)] * 1000:.3f} ms")
+        line.append("same result" if same else "RESULTS DIFFER")
+        print("  ".join(line))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,306 +1,232 @@
 # main.py (refactored with three-prompt approach and self-correction)
 
+from __future__ import annotations
+
+import argparse
 import asyncio
+import hashlib
+import json
 import os
-import re
-import csv
 import sys
-from xml.etree import ElementTree as ET
 from dotenv import load_dotenv
-from rdflib import Graph, RDF
-from rdflib.exceptions import ParserError
-from rdflib.namespace import SH
-from pyshacl import validate  
-from src.llm_client import ToolLLM
-
-from tools.data_analyzer import construct_data_prompt
-from tools.td_analyzer import construct_td_prompt
-from tools.rml_generator import construct_combined_rml_prompt
-from tools.error_handler import create_refinement_prompt, detect_rml_syntax_errors
-'''
-from prompt_samples import construct_data_prompt  # Import the prompt function
-from prompt_samples import construct_td_prompt  # Import the prompt function
-from prompt_samples import create_refinement_prompt  # Import the refinement prompt function
-from prompt_samples import construct_combined_rml_prompt  # Import the prompt function
-
-# from prompt import construct_rml_generation_prompt # Import the prompt function'''
-
-
-# --- Configuration ---
-'''TOOL_SERVER_URL = os.getenv("TOOL_SERVER_URL")
-if not TOOL_SERVER_URL:
-    raise ValueError("TOOL_SERVER_URL environment variable must be set.")
-TOOL_SERVER_URL = TOOL_SERVER_URL.strip()'''
-
-TOOL_SERVER_URL = "http://127.0.0.1:8000"
-
-MAX_RETRIES = 3
-  
-
-# --- Enhanced Sanitization ---
-def extract_turtle(text: str) -> str:
-    if not text:
-        return ""
-    # Remove Python byte-string artifacts: b'...', b"..."
-    text = re.sub(r"^b[\"'](.*)[\"']$", r"\1", text.strip(), flags=re.DOTALL)
-    text = re.sub(r"\\n", "\n", text)  # unescape newlines
-    text = re.sub(r"\\\"", "\"", text)  # unescape quotes
-    # Remove markdown fences
-    m = re.search(r"```(?:turtle|ttl)?\n(.*?)```", text, re.DOTALL | re.IGNORECASE)
-    if m:
-        return m.group(1).strip()
-    # Find Turtle start
-    m2 = re.search(r"(@prefix|@base|rml:|ql:|ex:|dct:|saref:)", text, re.IGNORECASE)
-    if m2:
-        return text[m2.start():].strip()
-    return text.strip()
-
-def is_valid_prefix_usage(turtle_str: str) -> bool:
-    allowed_prefixes = { "rml", "ql", "ex", "dct", "saref"}
-    # Find all qnames like dct:title
-    qnames = re.findall(r"\b([a-z]+):[a-zA-Z_][a-zA-Z0-9_]*", turtle_str)
-    return all(prefix in allowed_prefixes for prefix in qnames)
-
-def is_function_call_response(text: str) -> bool:
-    """Check if LLM returned a function call JSON instead of plain text."""
-    text = text.strip()
-    if text.startswith("{") and '"name":' in text and '"parameters":' in text:
-        try:
-            import json
-            obj = json.loads(text)
-            # Check if it's a function call
-            return "name" in obj and "parameters" in obj
-        except:
-            return False
-    return False
-
-def extract_content_from_function_call(text: str) -> str:
-    """Try to extract meaningful content from function call response."""
-    if is_function_call_response(text):
-        try:
-            import json
-            obj = json.loads(text)
-            params = obj.get("parameters", {})
-            
-            # If it's a CSV analysis call, try to extract the CSV file info
-            if obj.get("name") == "csv_structure_analysis":
-                csv_file = params.get("csv_file", "unknown.csv")
-                # Return a plain text summary
-                return f"CSV file: {csv_file}\nColumns: {read_csv_headers(csv_file)}"
-            
-            # If it's a TD analysis call
-            elif obj.get("name") == "semantic_analysis":
-                return f"TD ID: {params.get('td_id', 'unknown')}\nTD Title: {params.get('td_title', 'unknown')}\nProperties: {params.get('td_properties', 'unknown')}"
-            
-            # Otherwise, return the original text
-            return str(params)
-        except:
-            return text
-    return text
-
-def extract_plain_text_from_llm_response(text: str) -> str:
-    """Extract plain text from LLM response, handling function calls."""
-    if is_function_call_response(text):
-        return extract_content_from_function_call(text)
-    return text
-
-def read_csv_headers(path):
-    """Reads the first row of a CSV file to get column headers."""
-    with open(path, "r", encoding="utf-8") as f:
-        reader = csv.reader(f)
-        headers = next(reader) # Get the first row (headers)
-    return headers 
-
-# --- Validate Turtle Syntax ---
-def validate_turtle_syntax(content: str) -> tuple[bool, str]:
-    try:
-        g = Graph()
-        g.parse(data=content, format="turtle")
-        return True, ""
-    except ParserError as e:
-        return False, f"Turtle syntax error: {e}"
-    except Exception as e:
-        return False, f"Unexpected error: {e}"
-
-
-# --- Validate RML Semantics with SHACL ---
-def validate_rml_shacl(rml_content: str, shacl_path: str) -> tuple[bool, str]:
-    try:
-        data_graph = Graph()
-        data_graph.parse(data=rml_content, format="turtle")
-
-        shacl_graph = Graph()
-        shacl_graph.parse(shacl_path, format="turtle")
-
-        conforms, report_graph, _ = validate(
-            data_graph,
-            shacl_graph=shacl_graph,
-            inference="rdfs",
-            debug=False
-        )
-
-        if conforms:
-            return True, ""
-        else:
-            report_str = ""
-            for result in report_graph.subjects(RDF.type, SH.ValidationResult):
-                for message in report_graph.objects(result, SH.resultMessage):
-                    report_str += f"- {message}\n"
-            return False, report_str.strip()
-
-    except Exception as e:
-        return False, f"SHACL validation failed: {e}"
-
-async def robust_llm_call(tool_llm, prompt: str, step_name: str, max_retries: int = 3, allow_function_calls: bool = True) -> str:
-    """Call LLM with retries and better error handling."""
-    for attempt in range(1, max_retries + 1):
-        try:
-            print(f"   🔄 {step_name} – Attempt {attempt}/{max_retries}")
-            response = await tool_llm.ask(prompt)
-            response = extract_plain_text_from_llm_response(response)
-            
-            if not response or "Error:" in response or "LLM API call timed out" in response:
-                print(f"   ❌ {step_name} failed: {response[:100]}...")
-                if attempt == max_retries:
-                    raise RuntimeError(f"{step_name} failed after {max_retries} attempts")
-                await asyncio.sleep(1)  # Brief backoff
-                continue
-            
-            # Only check for function calls if not allowed
-            if not allow_function_calls and is_function_call_response(response):
-                print(f"   ❌ {step_name} returned function call instead of plain text.")
-                if attempt == max_retries:
-                    raise RuntimeError(f"{step_name} returned invalid format")
-                await asyncio.sleep(1)
-                continue
-
-            print(f"   ✅ {step_name} succeeded.")
-            return response
-
-        except Exception as e:
-            print(f"   ❌ {step_name} exception: {e}")
-            if attempt == max_retries:
-                raise RuntimeError(f"{step_name} failed after {max_retries} attempts: {e}")
-            await asyncio.sleep(1)
-    
-    raise RuntimeError(f"{step_name} failed after {max_retries} attempts")
-
-
-
-async def generate_and_refine_rml(tool_llm, csv_file_path, csv_analysis, td_analysis, max_refinement_attempts=3):
-    """Generate RML and refine it based on validation errors."""
-    current_prompt = construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis)
-    
-    for attempt in range(1, max_refinement_attempts + 1):
-        print(f"   🔄 RML Generation – Attempt {attempt}/{max_refinement_attempts}")
-        
+# openai, rdflib and pyshacl (and the modules using them) are imported where they
+# are needed, so --help, daemon clients and reused mappings start without them
+from src.cassette import CassetteMiss
+from src.daemon import DAEMON_SOCKET, DaemonClient
+from src.metrics import METRICS
+# The pipeline itself lives in src/pipeline.py; this script is its command line
+from src.pipeline import (
+    AUTO_REPAIR_STATS, TOKEN_STATS, load_manifest, make_cassette, make_mapping_store, make_tool_llm,
+    print_auto_repair_stats, print_cache_stats, print_cassette_stats, print_mapping_store_stats,
+    print_shapes_stats, print_stage_latency, print_token_stats, print_transport_stats,
+    reuse_stored_mapping, run_batch, run_pipeline, write_run_metrics,
+)
+from src.validation_pool import validation_pool
+from tools.token_budget import estimate_tokens
+
+
+# --- Daemon Mode ---
+# Environment a daemon fixes when it starts (LLM, generation, caches, budgets);
+# a run whose values differ is not forwarded to it
+DAEMON_SETTINGS = (
+    "LLM_BASE_URL", "OPENAI_API_KEY", "model", "LLM_TIMEOUT", "LLM_MAX_CONNECTIONS", "LLM_MAX_KEEPALIVE", "LLM_KEEPALIVE_EXPIRY",
+    "LLM_CACHE_DIR", "LLM_CACHE_MAX_MB", "LLM_CACHE_MAX_AGE_DAYS", "LLM_CACHE_BYPASS", "MAPPING_STORE_DIR", "MAPPING_STORE_BYPASS",
+    "METRICS_DIR", "SHAPES_SNAPSHOT_DIR", "VALIDATION_WORKERS", "TOOL_TRANSPORT", "TOOL_SERVER_URL", "TOOL_MAX_PARALLEL",
+    "TOOL_TIMEOUT", "TOOL_RESULT_CACHE_SIZE", "RULE_GENERATION", "RULE_MIN_CONFIDENCE", "RML_STREAMING",
+    "SHACL_REFINEMENT_ATTEMPTS", "PROMPT_TOKEN_BUDGET", "CSV_PROFILE_BYTE_BUDGET",
+)
+
+
+def daemon_settings() -> dict:
+    """Fingerprints of this process's DAEMON_SETTINGS (hashed, so the API key never travels)."""
+    return {name: hashlib.sha256(os.getenv(name, "\0unset").encode("utf-8")).hexdigest()[:16] for name in DAEMON_SETTINGS}
+
+
+async def serve_daemon(shacl_path: str) -> None:
+    """
+    Keeps the pipeline warm for main.py runs: openai, rdflib and pyshacl imported,
+    the SHACL shapes loaded and the LLM client connected with its tool list. Each
+    request is one run_pipeline() call, and requests run concurrently.
+    """
+    if DaemonClient(DAEMON_SOCKET).alive():
+        raise RuntimeError(f"A daemon is already listening on {DAEMON_SOCKET}")
+    import pyshacl  # noqa: F401 – imported now rather than by the first validation
+    from src.daemon import DaemonServer
+    from src.shapes import load_shapes_graph
+
+    load_shapes_graph(shacl_path)
+    validation_pool(shacl_path)  # Validation workers, if any, preload the shapes too
+    estimate_tokens("warm up")  # Loads the tiktoken encoding, if installed
+    mapping_store = make_mapping_store()
+    settings = daemon_settings()
+    async with make_tool_llm() as tool_llm:
+        async def handle(request: dict) -> dict:
+            client_settings = request.get("settings", {})
+            differing = [name for name in DAEMON_SETTINGS if client_settings.get(name) != settings[name]]
+            if differing:
+                return {"ok": False, "differing_settings": differing,
+                        "error": f"Settings differ from the daemon's: {', '.join(differing)}"}
+            result = await run_pipeline(tool_llm, request["data_file"], request["td_file"], request["shacl_path"],
+                                        request["output_file"], mapping_store=mapping_store)
+            return {"ok": True, **result}
+
+        print(f"🔥 Daemon ready on {DAEMON_SOCKET}; main.py runs are forwarded to it (Ctrl+C to stop)")
         try:
-            rml_output = await tool_llm.ask(current_prompt)
-            rml_output = extract_plain_text_from_llm_response(rml_output)
-            
-            if is_function_call_response(rml_output):
-                raise ValueError("RML generation returned function call instead of Turtle")
-            
-            # Check for common RML semantic errors first
-            if "parentTriplesMap" in rml_output and "childTriplesMap" in rml_output:
-                # Check if they're in objectMap (which is wrong)
-                import re
-                pattern = r'rml:objectMap\s*\[\s*[^]]*rml:parentTriplesMap\s*[^]]*rml:childTriplesMap'
-                if re.search(pattern, rml_output, re.DOTALL):
-                    error_msg = "Invalid RML: rml:parentTriplesMap and rml:childTriplesMap used in rml:objectMap. This is incorrect syntax for linking resources."
-                    print(f"   ❌ RML semantic error: {error_msg[:200]}")
-                    if attempt == max_refinement_attempts:
-                        raise RuntimeError(f"RML semantic error after {max_refinement_attempts} attempts: {error_msg}")
-                    current_prompt = create_refinement_prompt(rml_output, error_msg, "rml_semantic")
-                    continue
-            
-            # Validate syntax
-            is_syntax_valid, syntax_error = validate_turtle_syntax(rml_output)
-            if not is_syntax_valid:
-                error_msg = f"Turtle syntax error: {syntax_error}"
-                print(f"   ❌ Syntax error: {error_msg[:200]}")
-                if attempt == max_refinement_attempts:
-                    raise RuntimeError(f"RML syntax failed after {max_refinement_attempts} attempts: {error_msg}")
-                current_prompt = create_refinement_prompt(rml_output, error_msg, "syntax")
-                continue
-
-            return rml_output
-
-        except Exception as e:
-            error_msg = str(e)
-            print(f"   ❌ RML generation error: {error_msg}")
-            if attempt == max_refinement_attempts:
-                raise RuntimeError(f"RML generation failed after {max_refinement_attempts} attempts: {error_msg}")
-            current_prompt = create_refinement_prompt("", error_msg, "generation")
-            await asyncio.sleep(1)
-
-    raise RuntimeError("RML refinement failed")
-
-
-async def main():
+            await DaemonServer(DAEMON_SOCKET, handle).serve_forever()
+        finally:
+            print_cache_stats(tool_llm)
+            print_mapping_store_stats(mapping_store)
+            print_stage_latency()
+            write_run_metrics()
+
+def run_in_daemon(data_file: str, td_file: str, shacl_path: str, output_file: str) -> dict | None:
+    """
+    Hands a single run to the daemon (main.py --daemon) and relays its output.
+    Returns None if no daemon is running, or if it started with different
+    DAEMON_SETTINGS than this process has (the run must then happen here).
+    """
+    request = {name: os.path.abspath(path) for name, path in
+               (("data_file", data_file), ("td_file", td_file), ("shacl_path", shacl_path), ("output_file", output_file))}
+    request["settings"] = daemon_settings()
+    result = DaemonClient(DAEMON_SOCKET).run(request)
+    if result is not None and result.get("differing_settings"):
+        print(f"⚠️  The daemon runs with other settings ({', '.join(result['differing_settings'])}); running in this process")
+        return None
+    return result
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate RML mappings from CSV data and WoT Thing Descriptions.")
+    parser.add_argument("--batch", metavar="MANIFEST", help="JSON manifest of {data_file, td_file, output_file} items to map concurrently")
+    parser.add_argument("--concurrency", type=int, default=int(os.getenv("BATCH_CONCURRENCY", "4")), help="Maximum number of pipelines running at once in batch mode (default: 4)")
+    parser.add_argument("--bypass-cache", action="store_true", help="Ignore cached LLM responses and stored mappings (fresh validated results are still cached)")
+    parser.add_argument("--summary", default=os.getenv("BATCH_SUMMARY_FILE", "output/batch_summary.json"), help="Where to write the batch throughput/latency summary")
+    cassette = parser.add_mutually_exclusive_group()
+    cassette.add_argument("--record", metavar="CASSETTE", help="Record every LLM and tool answer of this run to CASSETTE")
+    cassette.add_argument("--replay", metavar="CASSETTE", help="Answer every LLM request from CASSETTE, offline (fails on an unrecorded request)")
+    daemon = parser.add_mutually_exclusive_group()
+    daemon.add_argument("--daemon", action="store_true", help="Run as a warm worker that later main.py runs hand their job to. "
+                        "Runs whose LLM, cache, rule or budget settings differ from the daemon's run in their own process")
+    daemon.add_argument("--no-daemon", action="store_true", help="Run in this process even if a daemon is running")
+    return parser.parse_args(argv)
+
+
+async def main(args=None):
+    args = args or parse_args()
     load_dotenv()
     
     # Config
-    LLM_BASE_URL = os.getenv("LLM_BASE_URL").strip()
-    LLM_API_KEY = os.getenv("OPENAI_API_KEY").strip()
-    MODEL = os.getenv("model").strip()
-    DATA_FILE = os.getenv("DATA_FILE").strip() # Should be CSV
-    TD_FILE = os.getenv("TD_FILE").strip() # Should be JSON
     SHACL_SHAPE_PATH = os.getenv("SHACL_SHAPE_PATH").strip()
-    output_mapping_filename = os.getenv("OUTPUT_MAPPING_FILE").strip()
-    
-    if not os.path.exists(TD_FILE):
-        print(f"❌ TD file not found: {TD_FILE}")
-        sys.exit(1)
-    if not os.path.exists(DATA_FILE):
-        print(f"❌ Data file (CSV) not found: {DATA_FILE}")
-        sys.exit(1)
+
     if not os.path.exists(SHACL_SHAPE_PATH):
         print(f"❌ SHACL shape file not found: {SHACL_SHAPE_PATH}")
         sys.exit(1)
 
-    async with ToolLLM(LLM_BASE_URL, LLM_API_KEY, MODEL, TOOL_SERVER_URL) as tool_llm:
-        # Perform robust CSV and TD analysis (will exit if either fails)
+    if args.daemon:
         try:
-            # Step 1: Get analyses
-            data_prompt = construct_data_prompt(DATA_FILE)
-            csv_analysis = await robust_llm_call(tool_llm, data_prompt, "CSV Analysis", 3, allow_function_calls=True)
-            print("data_Analysis:", csv_analysis)
-
-            td_prompt = construct_td_prompt(TD_FILE)
-            td_analysis = await robust_llm_call(tool_llm, td_prompt, "TD Analysis", 3, allow_function_calls=True)
-            print("td_Analysis:", td_analysis)
-
-            print("✅ Both analyses completed successfully.")
+            await serve_daemon(SHACL_SHAPE_PATH)
+        except RuntimeError as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        return
+
+    # Single runs go to a running daemon, unless they need options of their own
+    if not (args.batch or args.no_daemon or args.bypass_cache or args.record or args.replay or os.getenv("LLM_CASSETTE")):
+        result = run_in_daemon(os.getenv("DATA_FILE").strip(), os.getenv("TD_FILE").strip(), SHACL_SHAPE_PATH,
+                               os.getenv("OUTPUT_MAPPING_FILE").strip())
+        if result is not None:
+            if not result["ok"]:
+                print(f"\n💥 Mapping generation failed (daemon): {result['error']}")
+                sys.exit(1)
+            print(f"\n✨ SUCCESS! Valid RML saved to: {result['output_file']} (generation path: {result['generation_path']}, daemon)")
+            return
 
-            # Step 2: Generate and refine RML with feedback
-            raw_response = await generate_and_refine_rml(tool_llm, DATA_FILE, csv_analysis, td_analysis, 3)
+    try:
+        cassette = make_cassette(args.record, args.replay)
+    except (CassetteMiss, ValueError) as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    # With a cassette every item must go through the LLM calls, so stored mappings are not reused
+    bypass_store = args.bypass_cache or cassette is not None
 
+    if args.batch:
+        try:
+            items = load_manifest(args.batch)
         except Exception as e:
-            print(f"\n💥 Analysis or RML generation failed: {e}")
+            print(f"❌ Could not read batch manifest {args.batch}: {e}")
             sys.exit(1)
 
-        # Step 3: Final validation (SHACL only, since syntax should be fixed)
-        final_rml = None
-        clean_rml = extract_turtle(raw_response)
-        if not clean_rml:
-            print("❌ Empty RML output after refinement.")
+        print(f"📦 Batch mode: {len(items)} item(s), concurrency {args.concurrency}")
+        mapping_store = make_mapping_store(bypass_store)
+        async with make_tool_llm(args.bypass_cache, cassette) as tool_llm:
+            summary = await run_batch(tool_llm, items, SHACL_SHAPE_PATH, args.concurrency, mapping_store)
+            print_cache_stats(tool_llm)
+            print_transport_stats(tool_llm)
+            summary["tool_transport"] = tool_llm.transport_stats()
+        print_mapping_store_stats(mapping_store)
+        print_cassette_stats(cassette)
+        from src.shapes import shapes_load_stats
+
+        summary["shapes"] = shapes_load_stats()
+        summary["auto_repair"] = dict(AUTO_REPAIR_STATS)
+        summary["tokens"] = TOKEN_STATS
+        summary["metrics"] = METRICS.summary()
+        summary["mapping_store"] = mapping_store.stats() if mapping_store is not None else None
+        summary["cassette"] = cassette.stats() if cassette is not None else None
+
+        summary_dir = os.path.dirname(args.summary)
+        if summary_dir:
+            os.makedirs(summary_dir, exist_ok=True)
+        with open(args.summary, "w", encoding="utf-8") as f:
+            json.dump(summary, f, indent=2)
+
+        latency = summary["latency_s"]
+        print(f"\n📊 Batch finished: {summary['succeeded']}/{summary['items']} succeeded in {summary['wall_time_s']}s "
+              f"({summary['throughput_items_per_min']} items/min)")
+        print(f"   Generation paths: {summary['generation_paths']}")
+        print(f"   Latency per item: mean {latency['mean']}s, p50 {latency['p50']}s, p95 {latency['p95']}s, max {latency['max']}s")
+        print_shapes_stats()
+        print_auto_repair_stats()
+        print_token_stats()
+        print_stage_latency()
+        write_run_metrics()
+        print(f"   Summary written to: {args.summary}")
+        if summary["failed"]:
             sys.exit(1)
+        return
 
-        # Now validate SHACL (no retry needed unless you want RML semantic refinement too)
-        is_shacl_valid, shacl_errors = validate_rml_shacl(clean_rml, SHACL_SHAPE_PATH)
-        if not is_shacl_valid:
-            print(f"❌ SHACL validation failed:\n{shacl_errors}")
-            # Optionally: add another refinement loop for SHACL errors too
-            sys.exit(1)
+    DATA_FILE = os.getenv("DATA_FILE").strip() # Should be CSV
+    TD_FILE = os.getenv("TD_FILE").strip() # Should be JSON
+    output_mapping_filename = os.getenv("OUTPUT_MAPPING_FILE").strip()
 
-        final_rml = clean_rml
+    mapping_store = make_mapping_store(bypass_store)
+    # A feed whose schema already has a validated mapping needs no LLM client (nor its imports)
+    if os.path.exists(DATA_FILE) and os.path.exists(TD_FILE):
+        result = reuse_stored_mapping(mapping_store, DATA_FILE, TD_FILE, output_mapping_filename)
+        if result is not None:
+            print_mapping_store_stats(mapping_store)
+            print(f"\n✨ SUCCESS! Valid RML saved to: {output_mapping_filename} (generation path: reused)")
+            return
 
-        # Save result
-        os.makedirs(os.path.dirname(output_mapping_filename), exist_ok=True)
-        with open(output_mapping_filename, "w", encoding="utf-8") as f:
-            f.write(final_rml)
-        print(f"\n✨ SUCCESS! Valid RML saved to: {output_mapping_filename}")
+    async with make_tool_llm(args.bypass_cache, cassette) as tool_llm:
+        try:
+            result = await run_pipeline(tool_llm, DATA_FILE, TD_FILE, SHACL_SHAPE_PATH, output_mapping_filename,
+                                        mapping_store=mapping_store, reuse=False)
+        except Exception as e:
+            print(f"\n💥 Mapping generation failed: {e}")
+            sys.exit(1)
+        finally:
+            print_cache_stats(tool_llm)
+            print_transport_stats(tool_llm)
+            print_mapping_store_stats(mapping_store)
+            print_cassette_stats(cassette)
+            print_shapes_stats()
+            print_auto_repair_stats()
+            print_token_stats()
+            print_stage_latency()
+            write_run_metrics()
+
+        print(f"\n✨ SUCCESS! Valid RML saved to: {output_mapping_filename} (generation path: {result['generation_path']})")
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(main())
@@ -1,15 +1,31 @@
 # Main interface that imports from all tools
-from tools.data_analyzer import construct_data_prompt, read_csv_headers
+from tools.data_analyzer import construct_data_prompt, read_csv_headers, profile_csv, cached_profile, format_profile
 from tools.td_analyzer import construct_td_prompt, read_td
 from tools.rml_generator import construct_combined_rml_prompt
-from tools.error_handler import create_refinement_prompt, detect_rml_syntax_errors
+from tools.error_handler import create_refinement_prompt, create_fragment_refinement_prompt, detect_rml_syntax_errors, IncrementalTurtleChecker
+from tools.fragment_refiner import split_statements, splice_fragments
+from tools.auto_repair import auto_repair
+from tools.rule_based_generator import align_columns, generate_rule_based_rml
+from tools.token_budget import estimate_tokens, compact_passages
 
 __all__ = [
     "construct_data_prompt",
     "construct_td_prompt", 
     "construct_combined_rml_prompt",
     "create_refinement_prompt",
+    "create_fragment_refinement_prompt",
+    "split_statements",
+    "splice_fragments",
+    "auto_repair",
     "detect_rml_syntax_errors",
+    "IncrementalTurtleChecker",
     "read_csv_headers",
+    "profile_csv",
+    "cached_profile",
+    "format_profile",
+    "align_columns",
+    "generate_rule_based_rml",
+    "estimate_tokens",
+    "compact_passages",
     "read_td"
 ]
\ No newline at end of file
@@ -0,0 +1,168 @@
+# runner.py – resumable, multi-process mapping generation for large manifests
+#
+#   python runner.py --manifest fleet.json --queue runs/fleet --workers 8
+#
+# Several hosts can drain the same manifest by pointing --queue at a shared
+# directory; re-running the same command after a crash skips every item that
+# already has a checkpoint.
+
+import argparse
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from src.work_queue import FileWorkQueue
+
+
+async def _heartbeat(queue: FileWorkQueue, item_id: str, worker_id: str):
+    """Renews the item's lease while the pipeline runs."""
+    while True:
+        await asyncio.sleep(queue.lease_seconds / 3)
+        if not queue.renew(item_id, worker_id):
+            print(f"   ⚠️  [{item_id}] lease lost; another worker may redo this item")
+            return
+
+
+async def _worker_loop(queue_dir: str, lease_seconds: float, shacl_path: str, poll_interval: float):
+    # Imported here so the coordinating process stays light
+    from src.pipeline import make_mapping_store, make_tool_llm, run_pipeline
+
+    queue = FileWorkQueue(queue_dir, lease_seconds)
+    worker_id = FileWorkQueue.worker_id()
+    # A shared directory lets every worker (and host) reuse mappings the others validated
+    mapping_store = make_mapping_store()
+
+    async with make_tool_llm() as tool_llm:
+        while True:
+            item = queue.claim(worker_id)
+            if item is None:
+                counts = queue.counts()
+                if counts["pending"] == 0 and counts["leased"] == 0:
+                    return
+                # Items are leased by other workers; wait in case one of them dies
+                await asyncio.sleep(poll_interval)
+                continue
+
+            heartbeat = asyncio.create_task(_heartbeat(queue, item["id"], worker_id))
+            start = time.perf_counter()
+            try:
+                result = await run_pipeline(tool_llm, item["data_file"], item["td_file"], shacl_path, item["output_file"],
+                                            label=item["id"], mapping_store=mapping_store)
+                with open(item["output_file"], "r", encoding="utf-8") as f:
+                    mapping = f.read()
+                queue.complete(item["id"], worker_id, {
+                    "id": item["id"],
+                    "status": "success",
+                    "output_file": item["output_file"],
+                    "validation": {"syntax": True, "shacl_conforms": True},
+                    "generation_path": result["generation_path"],
+                    "mapping_sha256": hashlib.sha256(mapping.encode("utf-8")).hexdigest(),
+                    "mapping": mapping,
+                    "latency_s": round(time.perf_counter() - start, 3),
+                })
+                print(f"   ✅ [{item['id']}] mapping saved to: {item['output_file']}")
+            except Exception as e:
+                queue.fail(item["id"], worker_id, {
+                    "id": item["id"],
+                    "status": "failed",
+                    "output_file": item["output_file"],
+                    "error": str(e),
+                    "latency_s": round(time.perf_counter() - start, 3),
+                })
+                print(f"   ❌ [{item['id']}] failed: {e}")
+            finally:
+                heartbeat.cancel()
+
+
+def worker_main(queue_dir: str, lease_seconds: float, shacl_path: str, poll_interval: float):
+    """Entry point of one worker process."""
+    load_dotenv()
+    # The fleet already runs one pipeline process per core; validate inline rather than in a pool per worker
+    os.environ.setdefault("VALIDATION_WORKERS", "0")
+    asyncio.run(_worker_loop(queue_dir, lease_seconds, shacl_path, poll_interval))
+    # One metrics file per worker process
+    from src.pipeline import write_run_metrics
+    write_run_metrics()
+
+
+def print_progress(queue: FileWorkQueue, start: float, done_at_start: int) -> dict:
+    counts = queue.counts()
+    elapsed = time.time() - start
+    finished = counts["done"] + counts["failed"]
+    rate = (finished - done_at_start) / elapsed * 60 if elapsed > 0 else 0.0
+    print(f"📈 {finished}/{counts['total']} finished ({counts['done']} ok, {counts['failed']} failed), "
+          f"{counts['leased']} in progress, {counts['pending']} pending – {rate:.1f} items/min")
+    return {**counts, "elapsed_s": round(elapsed, 1), "items_per_min": round(rate, 2)}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Resumable multi-process RML generation over a manifest.")
+    parser.add_argument("--manifest", help="Batch manifest (see main.py --batch); items already queued are kept")
+    parser.add_argument("--queue", required=True, help="Queue directory; share it between hosts to split the work")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes on this host")
+    parser.add_argument("--lease-seconds", type=float, default=600.0, help="How long a claimed item stays reserved without a heartbeat")
+    parser.add_argument("--progress-interval", type=float, default=10.0)
+    parser.add_argument("--retry-failed", action="store_true", help="Requeue items that failed in an earlier run")
+    parser.add_argument("--status", action="store_true", help="Print queue progress and exit")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    queue = FileWorkQueue(args.queue, args.lease_seconds)
+
+    if args.status:
+        counts = queue.counts()
+        print(f"📈 {counts['done'] + counts['failed']}/{counts['total']} finished ({counts['done']} ok, {counts['failed']} failed), "
+              f"{counts['leased']} in progress, {counts['pending']} pending")
+        return
+
+    if args.manifest:
+        from src.pipeline import load_manifest
+        added = queue.enqueue(load_manifest(args.manifest))
+        print(f"📦 Queued {added} new item(s) from {args.manifest}")
+    if args.retry_failed:
+        print(f"🔁 Requeued {queue.requeue_failed()} failed item(s)")
+
+    shacl_path = os.getenv("SHACL_SHAPE_PATH", "").strip()
+    if not os.path.exists(shacl_path):
+        print(f"❌ SHACL shape file not found: {shacl_path}")
+        sys.exit(1)
+
+    counts = queue.counts()
+    done_at_start = counts["done"] + counts["failed"]
+    print(f"⏭️  {done_at_start}/{counts['total']} item(s) already checkpointed; starting {args.workers} worker(s)")
+
+    ctx = multiprocessing.get_context("spawn")
+    workers = [
+        ctx.Process(target=worker_main, args=(args.queue, args.lease_seconds, shacl_path, min(30.0, args.lease_seconds / 4)))
+        for _ in range(max(1, args.workers))
+    ]
+    start = time.time()
+    for w in workers:
+        w.start()
+
+    while any(w.is_alive() for w in workers):
+        for w in workers:
+            w.join(timeout=args.progress_interval / len(workers))
+        print_progress(queue, start, done_at_start)
+
+    progress = print_progress(queue, start, done_at_start)
+    records = queue.records()
+    latencies = sorted(r["latency_s"] for r in records if "latency_s" in r)
+    if latencies:
+        print(f"   Per-item latency: p50 {latencies[len(latencies) // 2]}s, max {latencies[-1]}s")
+    succeeded = [r for r in records if r.get("status") == "success"]
+    if succeeded:
+        reused = sum(1 for r in succeeded if r.get("generation_path") == "reused")
+        print(f"   Mapping reuse: {reused}/{len(succeeded)} item(s) ({reused / len(succeeded):.0%})")
+    if progress["failed"]:
+        print(f"   {progress['failed']} item(s) failed; see {os.path.join(args.queue, 'failed')} (rerun with --retry-failed)")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,59 @@
 # This file makes the 'src' directory a Python package
 # and exports the main classes for easier importing.
+#
+# The exports are imported on first use (PEP 562), so `from src.metrics import
+# METRICS` does not pull in openai, rdflib or pyshacl.
 
-from .llm_client import ToolLLM
-from .tool_server import UniversalToolServer
+import importlib
 
-__all__ = [
-    "ToolLLM",
-    "UniversalToolServer"
-]
\ No newline at end of file
+# Exported name -> submodule defining it
+_EXPORTS = {
+    "ToolLLM": "llm_client",
+    "StreamAborted": "llm_client",
+    "UniversalToolServer": "tool_server",
+    "ToolTransport": "tool_transport",
+    "HttpToolTransport": "tool_transport",
+    "InProcessToolTransport": "tool_transport",
+    "RMLMapping": "mapping",
+    "parse_mapping": "mapping",
+    "RMLExecutor": "rml_executor",
+    "RMLExecutionError": "rml_executor",
+    "execute_mapping": "rml_executor",
+    "ResponseCache": "response_cache",
+    "load_shapes_graph": "shapes",
+    "shapes_load_stats": "shapes",
+    "Stage": "stages",
+    "StageError": "stages",
+    "run_stages": "stages",
+    "FileWorkQueue": "work_queue",
+    "MappingStore": "mapping_store",
+    "schema_fingerprint": "mapping_store",
+    "Metrics": "metrics",
+    "METRICS": "metrics",
+    "Cassette": "cassette",
+    "CassetteMiss": "cassette",
+    "Job": "jobs",
+    "JobManager": "jobs",
+    "QueueFull": "jobs",
+    "DaemonClient": "daemon",
+    "DaemonServer": "daemon",
+    "run_pipeline": "pipeline",
+    "run_batch": "pipeline",
+    "ValidationPool": "validation_pool",
+    "validation_pool": "validation_pool",
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    module = _EXPORTS.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
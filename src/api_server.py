@@ -1,12 +1,28 @@
+import argparse
+import asyncio
+import importlib.util
+import json
+import os
+import time
 import uvicorn
-from fastapi import FastAPI
+from dotenv import load_dotenv
+from fastapi import FastAPI, HTTPException, Request, Response
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Union
 from pathlib import Path
-from contextlib import asynccontextmanager 
+from contextlib import AsyncExitStack, asynccontextmanager
 
 # Import your tool server
 from .tool_server import UniversalToolServer
+from .metrics import METRICS
+from .jobs import JobManager, QueueFull, job_key
+
+try:
+    import orjson
+except ImportError:  # Optional: responses fall back to the json module
+    orjson = None
 
 # --- Configuration ---
 
@@ -16,19 +32,119 @@ PROJECT_ROOT = Path(__file__).parent.parent
 # Initialize the tool server with the correct root path
 tool_server = UniversalToolServer(root_path=PROJECT_ROOT)
 
+load_dotenv()
+# Mapping jobs (POST /jobs): pipelines running at once, and jobs allowed to wait before clients get 429
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "16"))
+# Validated mappings are written to <JOB_OUTPUT_DIR>/<job id>.ttl; uploaded files are kept under JOB_UPLOAD_DIR
+JOB_OUTPUT_DIR = os.getenv("JOB_OUTPUT_DIR", "output/jobs").strip()
+JOB_UPLOAD_DIR = os.getenv("JOB_UPLOAD_DIR", ".cache/uploads").strip()
+# data_file/td_file paths of a job must lie inside this directory (relative paths start at the project root)
+JOB_DATA_ROOT = Path(os.getenv("JOB_DATA_ROOT") or PROJECT_ROOT / "Data").resolve()
+
+# Serving (python -m src.api_server): worker processes, and seconds shutdown waits for in-flight requests and jobs
+API_WORKERS = int(os.getenv("API_WORKERS", "1"))
+API_DRAIN_SECONDS = float(os.getenv("API_DRAIN_SECONDS", "30"))
+# Responses of at least this many bytes are gzip-compressed for clients that accept it
+API_GZIP_MIN_BYTES = int(os.getenv("API_GZIP_MIN_BYTES", "1000"))
+
+# Set in lifespan() once the LLM client is up; None while jobs are unavailable
+job_manager: Optional[JobManager] = None
+# HTTP requests being handled by this process (see InFlightMiddleware)
+_in_flight = {"requests": 0}
+
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when it is installed; tool results carry long prompt strings."""
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(content)
+        return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class InFlightMiddleware:
+    """Counts HTTP requests in progress, so shutdown can wait for them."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        _in_flight["requests"] += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _in_flight["requests"] -= 1
+
+
+async def _drain_requests(timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while _in_flight["requests"] and time.monotonic() < deadline:
+        await asyncio.sleep(0.05)
+    if _in_flight["requests"]:
+        print(f"Lifespan: {_in_flight['requests']} request(s) still running after {timeout:g}s")
+
+
+async def _start_jobs(stack) -> Optional[JobManager]:
+    """
+    Builds the job pipeline from the same environment variables as main.py, sharing
+    this process's tool server. Returns None (jobs disabled) if the LLM is not configured.
+    """
+    # Imported here so the plain tool server does not load the pipeline
+    from .pipeline import make_cassette, make_mapping_store, make_tool_llm, run_pipeline
+
+    if API_WORKERS > 1:
+        # Job state lives in one process, and requests are spread over all workers
+        print(f"Lifespan: mapping jobs disabled with {API_WORKERS} workers (run a single worker for /jobs)")
+        return None
+    shacl_path = (os.getenv("SHACL_SHAPE_PATH") or "").strip()
+    try:
+        cassette = make_cassette()
+        if not shacl_path or not os.path.exists(shacl_path):
+            raise ValueError(f"SHACL shape file not found: {shacl_path or '(SHACL_SHAPE_PATH is not set)'}")
+        tool_llm = make_tool_llm(cassette=cassette, tool_server=tool_server)
+    except Exception as e:
+        print(f"Lifespan: mapping jobs disabled: {e}")
+        return None
+    tool_llm = await stack.enter_async_context(tool_llm)
+    mapping_store = make_mapping_store(bypass=cassette is not None)
+
+    async def run(job):
+        output_file = os.path.join(JOB_OUTPUT_DIR, f"{job.id}.ttl")
+        result = await run_pipeline(tool_llm, job.data_file, job.td_file, shacl_path, output_file,
+                                    label=job.id[:8], mapping_store=mapping_store)
+        with open(output_file, "r", encoding="utf-8") as f:
+            result["mapping"] = f.read()
+        return result
+
+    manager = JobManager(run, workers=JOB_WORKERS, max_queue=JOB_QUEUE_SIZE)
+    manager.start()
+    print(f"Lifespan: mapping jobs enabled ({manager.workers} worker(s), queue of {manager.max_queue})")
+    return manager
+
 # --- 2. CREATE THE NEW LIFESPAN FUNCTION ---
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """
     Handles startup and shutdown events for the tool server.
     """
+    global job_manager
     # This runs on startup
     print("Lifespan: Tool server starting up...")
     await tool_server.__aenter__()
-    
-    yield # This is where your application runs
-    
-    # This runs on shutdown
+    async with AsyncExitStack() as stack:
+        job_manager = await _start_jobs(stack)
+
+        yield # This is where your application runs
+
+        # This runs on shutdown: requests still in progress and queued jobs get
+        # API_DRAIN_SECONDS to finish, then unfinished jobs are cancelled
+        await _drain_requests(API_DRAIN_SECONDS)
+        if job_manager is not None:
+            await job_manager.stop(API_DRAIN_SECONDS)
+            job_manager = None
     print("Lifespan: Tool server shutting down...")
     await tool_server.__aexit__(None, None, None)
 
@@ -36,33 +152,159 @@ async def lifespan(app: FastAPI):
 app = FastAPI(
     title="Universal Tool Server",
     description="Exposes IoT and FileSystem tools over an API.",
-    lifespan=lifespan  # --- 3. PASS THE LIFESPAN FUNCTION HERE ---
+    lifespan=lifespan,  # --- 3. PASS THE LIFESPAN FUNCTION HERE ---
+    default_response_class=FastJSONResponse,
 )
+app.add_middleware(GZipMiddleware, minimum_size=API_GZIP_MIN_BYTES)
+app.add_middleware(InFlightMiddleware)
 
 # --- API Models ---
 class ToolCallRequest(BaseModel):
     tool_name: str
     args: Dict[str, Any]
 
+class JobRequest(BaseModel):
+    """Either paths (data_file, td_file) under JOB_DATA_ROOT, or the files themselves (csv_name, csv_content, td_content)."""
+    data_file: Optional[str] = None
+    td_file: Optional[str] = None
+    csv_name: Optional[str] = None
+    csv_content: Optional[str] = None
+    td_content: Optional[Union[str, Dict[str, Any]]] = None
+
 # --- API Endpoints ---
 
 @app.get("/tools", description="Get the list of available tools in MCP format.")
-async def get_tools():
+async def get_tools(request: Request):
     """
     This endpoint provides the tool definitions (the "MCP" part).
+    The list only changes with the code, so clients can revalidate with If-None-Match.
     """
-    return await tool_server.get_mcp_tools()
+    etag = f'"{tool_server.tools_etag}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+    return FastJSONResponse(await tool_server.get_mcp_tools(), headers={"ETag": etag})
 
 @app.post("/call", description="Execute a specific tool.")
 async def call_tool_endpoint(request: ToolCallRequest):
     """
     This endpoint executes a tool and returns the JSON result.
+    Tool results are plain JSON, so they are rendered directly (skipping FastAPI's encoder).
     """
     result = await tool_server.call_tool(request.tool_name, request.args)
-    return result
+    return FastJSONResponse(result)
+
+@app.get("/metrics", description="Prometheus metrics of this process.")
+async def metrics_endpoint():
+    """
+    Counters and latency histograms (tool calls, and every pipeline stage run in
+    this process) in the Prometheus text format, for p50/p95 per stage.
+    """
+    return Response(METRICS.render_prometheus(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+def _require_jobs() -> JobManager:
+    if job_manager is None:
+        raise HTTPException(status_code=503, detail="Mapping jobs are disabled: the LLM or SHACL_SHAPE_PATH is not configured")
+    return job_manager
+
+def _resolve_files(request: JobRequest) -> tuple[str, str, str]:
+    """Returns (data_file, td_file, key); uploaded files are stored under JOB_UPLOAD_DIR/<key>/."""
+    if request.csv_content is not None and request.td_content is not None:
+        csv_name = os.path.basename(request.csv_name or "") or "data.csv"
+        td = request.td_content if isinstance(request.td_content, str) else json.dumps(request.td_content, indent=2)
+        csv_bytes, td_bytes = request.csv_content.encode("utf-8"), td.encode("utf-8")
+        key = job_key(csv_name, csv_bytes, td_bytes)
+        directory = os.path.join(JOB_UPLOAD_DIR, key[:32])
+        os.makedirs(directory, exist_ok=True)
+        data_file = os.path.join(directory, csv_name)
+        td_file = os.path.join(directory, f"{os.path.splitext(csv_name)[0]}_TD.json")
+        for path, content in ((data_file, csv_bytes), (td_file, td_bytes)):
+            with open(path, "wb") as f:
+                f.write(content)
+        return data_file, td_file, key
+    if request.data_file and request.td_file:
+        # resolve() follows symlinks and "..", so nothing outside the data root can be read
+        paths = [str((PROJECT_ROOT / p).resolve()) for p in (request.data_file, request.td_file)]
+        contents = []
+        for path in paths:
+            if not Path(path).is_relative_to(JOB_DATA_ROOT):
+                raise HTTPException(status_code=403, detail=f"{path} is outside the job data root ({JOB_DATA_ROOT})")
+            try:
+                with open(path, "rb") as f:
+                    contents.append(f.read())
+            except OSError as e:
+                raise HTTPException(status_code=400, detail=f"Cannot read {path}: {e.strerror}")
+        return paths[0], paths[1], job_key(os.path.basename(paths[0]), *contents)
+    raise HTTPException(status_code=422, detail="Give either data_file and td_file, or csv_content and td_content")
+
+@app.post("/jobs", status_code=202, description="Submit a CSV/TD pair for mapping generation.")
+async def submit_job(request: JobRequest):
+    """
+    Queues a mapping job and returns its id at once; poll GET /jobs/{id} for the result.
+    An identical submission that is still queued or running returns that job
+    ("deduplicated": true). A full queue answers 429 with Retry-After.
+    """
+    manager = _require_jobs()
+    data_file, td_file, key = await asyncio.to_thread(_resolve_files, request)
+    try:
+        job, created = manager.submit(data_file, td_file, key)
+    except QueueFull as e:
+        raise HTTPException(status_code=429, detail=f"Job queue is full: {e}", headers={"Retry-After": "5"})
+    return FastJSONResponse({"id": job.id, "status": job.status, "deduplicated": not created},
+                        status_code=202, headers={"Location": f"/jobs/{job.id}"})
+
+@app.get("/jobs", description="Job pool status.")
+async def list_jobs():
+    return _require_jobs().stats()
+
+@app.get("/jobs/{job_id}", description="Status of a mapping job, with the mapping once it succeeded.")
+async def get_job(job_id: str):
+    job = _require_jobs().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    return job.to_dict()
+
+@app.delete("/jobs/{job_id}", description="Cancel a queued or running mapping job.")
+async def cancel_job(job_id: str):
+    manager = _require_jobs()
+    job = manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown job: {job_id}")
+    if job.done:
+        raise HTTPException(status_code=409, detail=f"Job {job_id} already {job.status}")
+    manager.cancel(job_id)
+    # A running job reaches "cancelled" once its pipeline has unwound
+    return FastJSONResponse(job.to_dict(), status_code=202)
 
 # --- Run the Server ---
-if __name__ == "__main__":
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the tools and mapping jobs over HTTP.")
+    parser.add_argument("--host", default=os.getenv("API_HOST", "127.0.0.1"))
+    parser.add_argument("--port", type=int, default=int(os.getenv("API_PORT", "8000")))
+    parser.add_argument("--workers", type=int, default=API_WORKERS, help="Worker processes (default: API_WORKERS or 1; /jobs needs 1)")
+    parser.add_argument("--access-log", action="store_true", help="Log every request (off by default: it costs throughput)")
+    parser.add_argument("--dev", action="store_true", help="Development mode: one worker that reloads on code changes")
+    return parser.parse_args(argv)
+
+def serve(args) -> None:
     print(f"Starting server, serving tools from project root: {PROJECT_ROOT}")
-    # Run with the module command: python -m src.api_server
-    uvicorn.run("src.api_server:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
+    if args.dev:
+        uvicorn.run("src.api_server:app", host=args.host, port=args.port, reload=True)
+        return
+    # Worker processes import this module again and read their count from the environment
+    os.environ["API_WORKERS"] = str(args.workers)
+    loop = "uvloop" if importlib.util.find_spec("uvloop") else "asyncio"
+    print(f"Production mode: {args.workers} worker(s), {loop} event loop, {'orjson' if orjson else 'json'} responses")
+    uvicorn.run(
+        "src.api_server:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop=loop,
+        http="auto",  # httptools when installed
+        access_log=args.access_log,
+        timeout_graceful_shutdown=API_DRAIN_SECONDS,
+    )
+
+if __name__ == "__main__":
+    # Run with the module command: python -m src.api_server (add --dev to reload on code changes)
+    serve(parse_args())
\ No newline at end of file
@@ -0,0 +1,126 @@
+import asyncio
+import gzip
+import hashlib
+import json
+import os
+import threading
+from typing import Any, Optional, Union
+
+
+class CassetteMiss(RuntimeError):
+    """Raised in replay mode for a request the cassette has no recording of."""
+
+
+class Cassette:
+    """
+    Recorded LLM conversations for ToolLLM: every chat completion and tool call
+    of a run, keyed by a hash of the request (model, messages, tool list and
+    options; streamed and plain requests share keys).
+
+    In "record" mode ToolLLM talks to the real LLM and tools and stores each
+    answer here; save() writes the cassette (gzip-compressed for *.gz paths).
+    In "replay" mode answers come from the file without any network access,
+    after `latency` seconds (or the recorded time with latency="recorded"), and
+    an unknown request raises CassetteMiss. A request recorded several times
+    (for example a retry) is answered in the recorded order, and its last
+    answer is repeated once they are used up.
+    """
+
+    VERSION = 1
+
+    def __init__(self, path: str, mode: str = "replay", latency: Union[float, str] = 0.0):
+        if mode not in ("record", "replay"):
+            raise ValueError(f"Unknown cassette mode: {mode} (use 'record' or 'replay')")
+        self.path = path
+        self.mode = mode
+        self.latency = latency
+        self._lock = threading.Lock()
+        self._data = {"version": self.VERSION, "model": None, "tools": None, "chat": {}, "tool": {}}
+        self._cursor = {}
+        self.hits = 0
+        self.recorded = 0
+        if self.replaying:
+            self._load()
+
+    @property
+    def recording(self) -> bool:
+        return self.mode == "record"
+
+    @property
+    def replaying(self) -> bool:
+        return self.mode == "replay"
+
+    def _load(self) -> None:
+        opener = gzip.open if self.path.endswith(".gz") else open
+        try:
+            with opener(self.path, "rt", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            raise CassetteMiss(f"Cassette not found: {self.path} (record it first)") from None
+        if data.get("version") != self.VERSION:
+            raise ValueError(f"Cassette {self.path} has version {data.get('version')}, expected {self.VERSION}")
+        self._data = data
+
+    @staticmethod
+    def key(*parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode("utf-8")).hexdigest()[:32]
+
+    # --- Tool list ---
+    @property
+    def model(self) -> Optional[str]:
+        """The model the cassette was recorded with."""
+        return self._data["model"]
+
+    @property
+    def tools(self) -> list:
+        if self._data["tools"] is None:
+            raise CassetteMiss(f"Cassette {self.path} has no tool list")
+        return self._data["tools"]
+
+    def record_tools(self, tools: list, model: str) -> None:
+        self._data["tools"] = tools
+        self._data["model"] = model
+
+    # --- Chat completions and tool results ---
+    def record(self, kind: str, key: str, response: Any, seconds: float) -> None:
+        with self._lock:
+            self._data[kind].setdefault(key, []).append({"response": response, "seconds": round(seconds, 4)})
+            self.recorded += 1
+
+    async def replay(self, kind: str, key: str, description: str) -> Any:
+        with self._lock:
+            entries = self._data[kind].get(key)
+            if not entries:
+                raise CassetteMiss(f"No recorded {kind} response for {description} (key {key}) in {self.path}")
+            i = self._cursor.get((kind, key), 0)
+            self._cursor[(kind, key)] = i + 1
+            entry = entries[min(i, len(entries) - 1)]
+            self.hits += 1
+        delay = entry["seconds"] if self.latency == "recorded" else float(self.latency)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return entry["response"]
+
+    def save(self) -> Optional[str]:
+        """Writes a recording atomically; a no-op in replay mode."""
+        if not self.recording:
+            return None
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        opener = gzip.open if self.path.endswith(".gz") else open
+        with self._lock, opener(tmp, "wt", encoding="utf-8") as f:
+            json.dump(self._data, f, separators=(",", ":"))
+        os.replace(tmp, self.path)
+        return self.path
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "path": self.path,
+            "recorded": self.recorded,
+            "replayed": self.hits,
+            "chat_requests": len(self._data["chat"]),
+            "tool_requests": len(self._data["tool"]),
+        }
@@ -0,0 +1,162 @@
+import asyncio
+import contextvars
+import json
+import os
+import signal
+import socket
+import sys
+from typing import Awaitable, Callable, Optional
+
+# Unix socket of the warm worker (python main.py --daemon); main.py forwards single runs to it when it is up
+DAEMON_SOCKET = os.getenv("RML_DAEMON_SOCKET", ".cache/rml-daemon.sock").strip()
+
+# Where print() output of the request running in the current context goes
+_client_output: contextvars.ContextVar = contextvars.ContextVar("daemon_client_output", default=None)
+
+
+class _RoutedOutput:
+    """sys.stdout stand-in: text printed while serving a request goes to that request's client."""
+
+    def __init__(self, fallback):
+        self.fallback = fallback
+
+    def write(self, text: str) -> int:
+        sink = _client_output.get()
+        if sink is None:
+            return self.fallback.write(text)
+        sink(text)
+        return len(text)
+
+    def flush(self) -> None:
+        self.fallback.flush()
+
+    def __getattr__(self, name):
+        return getattr(self.fallback, name)
+
+
+class DaemonServer:
+    """
+    Serves DaemonClient requests on a Unix socket, one JSON object per line.
+
+    `handle(request)` runs in the daemon's event loop, so requests share
+    whatever the daemon keeps loaded and run concurrently. Everything a request
+    prints is forwarded to its client as it happens; handle()'s return value
+    (or {"ok": False, "error": ...} if it raises) is sent last.
+    """
+
+    def __init__(self, path: str, handle: Callable[[dict], Awaitable[dict]]):
+        self.path = path
+        self.handle = handle
+
+    async def serve_forever(self) -> None:
+        """Serves until SIGINT or SIGTERM, then removes the socket."""
+        if DaemonClient(self.path).alive():
+            raise RuntimeError(f"A daemon is already listening on {self.path}")
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Left behind by a daemon that was killed
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stdout = sys.stdout
+        sys.stdout = _RoutedOutput(stdout)
+        server = await asyncio.start_unix_server(self._serve_client, path=self.path)
+        os.chmod(self.path, 0o600)
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        try:
+            async with server:
+                await stop.wait()
+        finally:
+            for sig in (signal.SIGINT, signal.SIGTERM):
+                loop.remove_signal_handler(sig)
+            sys.stdout = stdout
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    async def _run(self, request: dict, send: Callable[[dict], None]) -> None:
+        pending = []
+
+        def forward(text: str) -> None:
+            # print() writes the text and the newline separately; send whole lines
+            pending.append(text)
+            if "\n" in text:
+                send({"output": "".join(pending)})
+                pending.clear()
+
+        token = _client_output.set(forward)
+        try:
+            result = await self.handle(request)
+        except Exception as e:
+            result = {"ok": False, "error": str(e)}
+        finally:
+            _client_output.reset(token)
+        if pending:
+            send({"output": "".join(pending)})
+        send({"result": result})
+
+    async def _serve_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        def send(message: dict) -> None:
+            if not writer.is_closing():
+                writer.write(json.dumps(message).encode("utf-8") + b"\n")
+
+        line = await reader.readline()
+        try:
+            request = json.loads(line) if line.strip() else None  # Empty: an alive() probe
+        except ValueError as e:
+            send({"result": {"ok": False, "error": f"Malformed request: {e}"}})
+        else:
+            if request is not None:
+                await self._run(request, send)
+        try:
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+        except ConnectionError:
+            pass  # The client went away
+
+
+class DaemonClient:
+    """Blocking client for DaemonServer; needs nothing beyond the standard library."""
+
+    def __init__(self, path: str = DAEMON_SOCKET, connect_timeout: float = 0.5):
+        self.path = path
+        self.connect_timeout = connect_timeout
+
+    def _connect(self) -> Optional[socket.socket]:
+        if not hasattr(socket, "AF_UNIX") or not os.path.exists(self.path):
+            return None
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.connect_timeout)
+        try:
+            sock.connect(self.path)
+        except OSError:
+            sock.close()
+            return None
+        sock.settimeout(None)
+        return sock
+
+    def alive(self) -> bool:
+        sock = self._connect()
+        if sock is None:
+            return False
+        sock.close()
+        return True
+
+    def run(self, request: dict, on_output: Optional[Callable[[str], None]] = None) -> Optional[dict]:
+        """Sends request and streams its output to on_output (stdout). Returns the result, or None if no daemon is listening."""
+        on_output = on_output or sys.stdout.write
+        sock = self._connect()
+        if sock is None:
+            return None
+        with sock, sock.makefile("rwb") as stream:
+            stream.write(json.dumps(request).encode("utf-8") + b"\n")
+            stream.flush()
+            for line in stream:
+                message = json.loads(line)
+                if "output" in message:
+                    on_output(message["output"])
+                elif "result" in message:
+                    return message["result"]
+        raise ConnectionError(f"The daemon on {self.path} closed the connection without a result")
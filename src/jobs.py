@@ -0,0 +1,167 @@
+import asyncio
+import hashlib
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+from .metrics import METRICS
+
+
+class QueueFull(RuntimeError):
+    """Raised by JobManager.submit() when the queue is at capacity."""
+
+
+@dataclass
+class Job:
+    """One mapping job: a CSV/TD pair, its state and, once done, its result."""
+    id: str
+    key: str
+    data_file: str
+    td_file: str
+    status: str = "queued"  # queued, running, succeeded, failed or cancelled
+    created: float = field(default_factory=time.time)
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    result: Optional[dict] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    task: Optional[asyncio.Task] = field(default=None, repr=False)
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("succeeded", "failed", "cancelled")
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "status": self.status,
+            "data_file": self.data_file,
+            "td_file": self.td_file,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+def job_key(csv_name: str, csv_bytes: bytes, td_bytes: bytes) -> str:
+    """Identical submissions (same CSV name and contents, same TD) share a key."""
+    digest = hashlib.sha256()
+    for part in (csv_name.encode("utf-8"), csv_bytes, td_bytes):
+        digest.update(hashlib.sha256(part).digest())
+    return digest.hexdigest()
+
+
+class JobManager:
+    """
+    Runs mapping jobs on a bounded pool of `workers` asyncio tasks in this process.
+
+    At most `max_queue` jobs wait; submit() raises QueueFull beyond that, so
+    callers can push back on clients. A submission identical to a queued or
+    running job returns that job instead of a new one. Finished jobs are kept
+    (the most recent `history` of them) so clients can fetch the result.
+    """
+
+    def __init__(self, run: Callable[[Job], Awaitable[dict]], workers: int = 2, max_queue: int = 16, history: int = 1000):
+        self.run = run
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.history = history
+        self.jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._inflight: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+
+    def start(self) -> None:
+        self._queue = asyncio.Queue(maxsize=self.max_queue)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 0.0) -> None:
+        """Stops the workers, after giving queued and running jobs up to `timeout` seconds to finish."""
+        if timeout > 0 and self._queue is not None:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, data_file: str, td_file: str, key: str) -> tuple[Job, bool]:
+        """Queues a job; returns (job, False) when an identical job is already queued or running."""
+        existing = self._inflight.get(key)
+        if existing is not None:
+            METRICS.inc("jobs_deduplicated")
+            return existing, False
+        job = Job(id=uuid.uuid4().hex, key=key, data_file=data_file, td_file=td_file)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            METRICS.inc("jobs_rejected")
+            raise QueueFull(f"{self.max_queue} job(s) already waiting") from None
+        self._inflight[key] = job
+        self.jobs[job.id] = job
+        METRICS.inc("jobs_submitted")
+        self._trim()
+        return job, True
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def cancel(self, job_id: str) -> Optional[Job]:
+        """Cancels a queued or running job. Finished jobs are returned unchanged."""
+        job = self.jobs.get(job_id)
+        if job is None or job.done:
+            return job
+        job.cancel_requested = True
+        if job.task is not None:
+            job.task.cancel()
+        else:
+            # Still queued: the worker that takes it skips it
+            self._finish(job, "cancelled")
+        return job
+
+    def stats(self) -> dict:
+        counts = {}
+        for job in self.jobs.values():
+            counts[job.status] = counts.get(job.status, 0) + 1
+        return {"workers": self.workers, "max_queue": self.max_queue, "queued": self._queue.qsize() if self._queue else 0, "jobs": counts}
+
+    def _finish(self, job: Job, status: str, result: Optional[dict] = None, error: Optional[str] = None) -> None:
+        job.status, job.result, job.error = status, result, error
+        job.finished = time.time()
+        job.task = None
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        METRICS.observe("job_seconds", job.finished - job.created, status=status)
+
+    def _trim(self) -> None:
+        finished = [job_id for job_id, job in self.jobs.items() if job.done]
+        for job_id in finished[:max(0, len(finished) - self.history)]:
+            del self.jobs[job_id]
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                if job.cancel_requested:
+                    continue
+                job.status, job.started = "running", time.time()
+                job.task = asyncio.create_task(self.run(job))
+                try:
+                    self._finish(job, "succeeded", result=await job.task)
+                except asyncio.CancelledError:
+                    if not job.cancel_requested:
+                        # The worker itself is being stopped
+                        job.task.cancel()
+                        self._finish(job, "cancelled", error="server shutting down")
+                        raise
+                    self._finish(job, "cancelled")
+                except Exception as e:
+                    self._finish(job, "failed", error=str(e))
+            finally:
+                self._queue.task_done()
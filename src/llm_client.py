@@ -1,6 +1,8 @@
+import asyncio
 import json
-from typing import List, Dict
-from openai import OpenAI
+import time
+from typing import Callable, List, Dict, Optional, Tuple, Union
+from openai import AsyncOpenAI
 from contextlib import AsyncExitStack
 import httpx
 import logging
@@ -14,6 +16,20 @@ logger = logging.getLogger(__name__)
 
 # Import the tool server for type hinting
 from .tool_server import UniversalToolServer 
+from .cassette import Cassette, CassetteMiss
+from .metrics import METRICS
+from .response_cache import ResponseCache
+from .tool_transport import HttpToolTransport, InProcessToolTransport
+
+
+class StreamAborted(Exception):
+    """Raised by ToolLLM.ask_stream() when the output check rejects a partial response."""
+
+    def __init__(self, reason: str, partial: str):
+        super().__init__(reason)
+        self.reason = reason
+        self.partial = partial
+
 
 class ToolLLM:
     
@@ -21,6 +37,18 @@ class ToolLLM:
     High-level helper that:
       - Brings up a tool server client & OpenAI client in one context
       - Caches the merged tool list
+
+    `tool_server` is either the base URL of a running src/api_server.py or a
+    UniversalToolServer instance, which is then called in-process. Both give
+    the same results; transport_stats() reports the tool call latency.
+
+    The LLM client is asynchronous and runs over its own pooled httpx client, so
+    concurrent ask() calls overlap instead of blocking the event loop. Tool server
+    traffic uses a separate pool and cannot be starved by slow LLM requests.
+
+    With a Cassette every completion and tool call is recorded to, or replayed
+    from, a file (see src/cassette.py); replay needs no LLM and no tool server.
+    The response cache is not used then, so every request reaches the cassette.
     """
 
     def __init__(
@@ -28,99 +56,280 @@ class ToolLLM:
         llm_base_url: str, 
         llm_api_key: str, 
         model: str, 
-        tool_server_base_url: str 
+        tool_server: Union[str, UniversalToolServer],
+        max_connections: int = 20,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        llm_timeout: float = 300.0,
+        tool_timeout: float = 60.0,
+        connect_timeout: float = 10.0,
+        cache: Optional[ResponseCache] = None,
+        max_parallel_tool_calls: int = 4,
+        cassette: Optional[Cassette] = None,
     ):
-        self.llm = OpenAI(base_url=llm_base_url, api_key=llm_api_key, timeout=300.0)
+        limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.llm_http_client = httpx.AsyncClient(
+            limits=limits,
+            timeout=httpx.Timeout(llm_timeout, connect=connect_timeout),
+        )
+        self.llm = AsyncOpenAI(
+            base_url=llm_base_url,
+            api_key=llm_api_key,
+            timeout=httpx.Timeout(llm_timeout, connect=connect_timeout),
+            http_client=self.llm_http_client,
+        )
         self.model = model
-        self.tool_server_base_url = tool_server_base_url 
         self._tools: List[dict] = None
-        self.http_client = httpx.AsyncClient()
+        self._tools_hash = ""
+        self.cassette = cassette
+        self.cache = cache if cassette is None else None
+        # Tool calls of one turn run concurrently, at most this many at once, each within tool_timeout
+        self.tool_timeout = tool_timeout
+        self._tool_semaphore = asyncio.Semaphore(max(1, max_parallel_tool_calls))
+        if isinstance(tool_server, UniversalToolServer):
+            self.http_client = None
+            self.transport = InProcessToolTransport(tool_server)
+        else:
+            self.tool_server_base_url = tool_server
+            self.http_client = httpx.AsyncClient(
+                limits=limits,
+                timeout=httpx.Timeout(tool_timeout, connect=connect_timeout),
+            )
+            self.transport = HttpToolTransport(tool_server, self.http_client)
 
     async def __aenter__(self):
-        # Enter the httpx client context
-        await self.http_client.__aenter__()
-        
-        # Fetch tools from the API server
-        try:
-            logger.info(f"Fetching tools from {self.tool_server_base_url}/tools")
-            response = await self.http_client.get(f"{self.tool_server_base_url}/tools")
-            response.raise_for_status() # Raise an error on a bad response (4xx, 5xx)
-            self._tools = response.json()
-            logger.info(f"Successfully fetched {len(self._tools)} tools.")
-        except httpx.RequestError as e:
-            logger.error(f"Error fetching tools: {e}")
-            # Exit the client if we fail, as we can't proceed
-            await self.http_client.__aexit__(type(e), e, e.__traceback__)
-            raise
+        if self._replaying:
+            # Everything is answered from the recording: no tool server, no network
+            self._tools = self.cassette.tools
+        else:
+            # Fetch the tool list (over HTTP, or straight from the in-process server)
+            self._tools = await self.transport.open()
+            if self.cassette is not None:
+                self.cassette.record_tools(self._tools, self.model)
+        self._tools_hash = ResponseCache.hash_tools(self._tools)
+        logger.info(f"Successfully fetched {len(self._tools)} tools ({self.transport.mode}).")
         return self
 
     async def __aexit__(self, exc_type, exc, tb):
-        # Exit the httpx client context
-        if self.http_client:
-            await self.http_client.__aexit__(exc_type, exc, tb)
+        if self.cassette is not None:
+            self.cassette.save()
+        if not self._replaying:
+            await self.transport.close(exc_type, exc, tb)
+        # Release the pooled LLM connections
+        await self.llm.close()
 
+    def transport_stats(self) -> dict:
+        """Tool call count and latency of the transport in use."""
+        return self.transport.stats()
 
-    async def ask(self, query: str) -> str:
+
+    @property
+    def _replaying(self) -> bool:
+        return self.cassette is not None and self.cassette.replaying
+
+    def _request_key(self, messages: list, kwargs: dict) -> str:
+        """Cassette key of a completion request; streamed and plain requests share it."""
+        options = {k: v for k, v in kwargs.items() if k != "tools"}
+        return Cassette.key(self.model, messages, self._tools_hash if "tools" in kwargs else "", options)
+
+    @staticmethod
+    def _describe(messages: list) -> str:
+        prompt = next((m.get("content") or "" for m in messages if m.get("role") == "user"), "")
+        return f"a completion of {len(messages)} message(s), prompt {prompt.strip()[:80]!r}"
+
+    def _cache_key(self, query: str) -> str:
+        return ResponseCache.make_key(self.model, query, self._tools_hash)
+
+    def cache_response(self, query: str, response: str) -> None:
+        """
+        Stores a response for `query` in the response cache. Call this only once the
+        response has passed validation, so that bad generations are never replayed.
+        """
+        if self.cache is not None and response:
+            self.cache.put(self._cache_key(query), response, model=self.model)
+
+    async def ask(self, query: str, use_cache: bool = True) -> str:
 
         try:
             if self._tools is None:
                 raise RuntimeError("Tools not loaded. Use 'async with ToolLLM(...)'.")
+            if self.cache is not None and use_cache:
+                cached = self.cache.get(self._cache_key(query))
+                if cached is not None:
+                    logger.info("LLM response served from cache.")
+                    METRICS.inc("llm_cache_hits")
+                    return cached
             logger.info(f"Asking LLM: {query}")
             messages = [
                 {"role": "user", "content": query}
             ]
         
-            resp = self.llm.chat.completions.create(
-                model=self.model, 
-                messages=messages,
-                #timeout=60.0,
-                tools=self._tools,
-                tool_choice="auto"  # Let the LLM decide to use tools
-            )
+            msg = await self._chat(messages, tools=self._tools, tool_choice="auto")  # Let the LLM decide to use tools
 
-            msg = resp.choices[0].message
-            
-            if msg.tool_calls:
-                messages.append(msg)
-                for call in msg.tool_calls:
-                    try:
-                        args = json.loads(call.function.arguments)
-                        logger.info(f"LLM requesting tool '{call.function.name}' via API...")
-                        api_payload = {"tool_name": call.function.name, "args": args}
-                        response = await self.http_client.post(
-                            f"{self.tool_server_base_url}/call",
-                            json=api_payload
-                        )
-                        response.raise_for_status()
-                        result = response.json()
-
-                        
-                        messages.append({"role": "tool", "tool_call_id": call.id, "content": json.dumps(result)})
-                    except Exception as e:
-                        error_msg = f"Error calling tool '{call.function.name}': {e}"
-                        logger.error(error_msg)
-                        messages.append({"role": "tool", "tool_call_id": call.id, "content": error_msg})
-
-                        
-                final_resp = self.llm.chat.completions.create(
-                    model=self.model, messages=messages, tool_choice="none"
-                )
-                return final_resp.choices[0].message.content
+            if msg["tool_calls"]:
+                messages.append({"role": "assistant", "content": msg["content"], "tool_calls": msg["tool_calls"]})
+                messages.extend(await self._call_tools([(call["id"], call["function"]["name"], call["function"]["arguments"]) for call in msg["tool_calls"]]))
+
+                final = await self._chat(messages, tool_choice="none")
+                return final["content"]
             else:
-                return msg.content
+                return msg["content"]
             
-        
-        except openai.APITimeoutError as e: # Catch the specific APITimeoutError
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            return self._error_response(e)
+
+    async def _chat(self, messages: list, **kwargs) -> dict:
+        """One plain completion as {"content", "tool_calls"}, from the LLM or the cassette."""
+        key = self._request_key(messages, kwargs) if self.cassette is not None else None
+        start = time.perf_counter()
+        with METRICS.timer("llm_request_seconds", mode="chat"):
+            if self._replaying:
+                return await self.cassette.replay("chat", key, self._describe(messages))
+            resp = await self.llm.chat.completions.create(model=self.model, messages=messages, **kwargs)
+        msg = resp.choices[0].message
+        result = {"content": msg.content, "tool_calls": [call.model_dump() for call in msg.tool_calls or []]}
+        if self.cassette is not None:
+            self.cassette.record("chat", key, result, time.perf_counter() - start)
+        return result
+
+    async def ask_stream(self, query: str, check: Optional[Callable[[str], Optional[str]]] = None, use_cache: bool = True) -> str:
+        """
+        Like ask(), but streams the completion and passes every text chunk to
+        `check`. As soon as `check` returns an error message the stream is closed,
+        so the server stops generating, and StreamAborted is raised with the
+        partial output. Tool calls requested by the model are still executed.
+        """
+        try:
+            if self._tools is None:
+                raise RuntimeError("Tools not loaded. Use 'async with ToolLLM(...)'.")
+            if self.cache is not None and use_cache:
+                cached = self.cache.get(self._cache_key(query))
+                if cached is not None:
+                    logger.info("LLM response served from cache.")
+                    METRICS.inc("llm_cache_hits")
+                    return cached
+            logger.info(f"Asking LLM (streaming): {query}")
+            messages = [
+                {"role": "user", "content": query}
+            ]
+
+            text, tool_calls = await self._stream_completion(messages, check, tools=self._tools, tool_choice="auto")
+            if tool_calls:
+                messages.append({"role": "assistant", "content": text or None, "tool_calls": tool_calls})
+                messages.extend(await self._call_tools([(call["id"], call["function"]["name"], call["function"]["arguments"]) for call in tool_calls]))
+                text, _ = await self._stream_completion(messages, check, tool_choice="none")
+            return text
+
+        except (StreamAborted, CassetteMiss):
+            raise
+        except Exception as e:
+            return self._error_response(e)
+
+    async def _stream_completion(self, messages: list, check, **kwargs) -> Tuple[str, List[dict]]:
+        """Streams one completion; returns its text and any tool calls (assembled from their deltas)."""
+        if self._replaying:
+            return await self._replay_stream(messages, check, kwargs)
+        start = time.perf_counter()
+        stream = await self.llm.chat.completions.create(model=self.model, messages=messages, stream=True, **kwargs)
+        parts = []
+        calls: Dict[int, dict] = {}
+
+        def record():
+            if self.cassette is not None:
+                result = {"content": "".join(parts), "tool_calls": [calls[i] for i in sorted(calls)]}
+                self.cassette.record("chat", self._request_key(messages, kwargs), result, time.perf_counter() - start)
+
+        try:
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    parts.append(delta.content)
+                    reason = check(delta.content) if check else None
+                    if reason:
+                        record()  # The partial answer, which a replay aborts at the same point
+                        raise StreamAborted(reason, "".join(parts))
+                for tc in delta.tool_calls or []:
+                    call = calls.setdefault(tc.index, {"id": "", "type": "function", "function": {"name": "", "arguments": ""}})
+                    if tc.id:
+                        call["id"] = tc.id
+                    if tc.function:
+                        call["function"]["name"] += tc.function.name or ""
+                        call["function"]["arguments"] += tc.function.arguments or ""
+        finally:
+            # Closing the connection early is what stops the server from generating further
+            await stream.close()
+            METRICS.observe("llm_request_seconds", time.perf_counter() - start, mode="stream")
+        record()
+        return "".join(parts), [calls[i] for i in sorted(calls)]
+
+    async def _replay_stream(self, messages: list, check, kwargs: dict) -> Tuple[str, List[dict]]:
+        """Replays a recorded completion through `check` in chunks, as if it were streamed."""
+        with METRICS.timer("llm_request_seconds", mode="stream"):
+            result = await self.cassette.replay("chat", self._request_key(messages, kwargs), self._describe(messages))
+        text = result["content"] or ""
+        for end in range(64, len(text) + 64, 64):
+            reason = check(text[end - 64:end]) if check else None
+            if reason:
+                raise StreamAborted(reason, text[:end])
+        return text, result["tool_calls"]
+
+    async def _call_tools(self, calls: List[Tuple[str, str, str]]) -> List[dict]:
+        """
+        Runs the (id, name, arguments) tool calls of one turn concurrently and
+        returns their 'tool' messages in the original order, so the conversation
+        stays deterministic.
+        """
+        async def run(call_id, name, arguments):
+            async with self._tool_semaphore:
+                return await self._call_tool(call_id, name, arguments)
+
+        return list(await asyncio.gather(*(run(*call) for call in calls)))
+
+    async def _call_tool(self, call_id: str, name: str, arguments: str) -> dict:
+        """Runs one tool call on the tool server and returns the 'tool' message for it."""
+        try:
+            args = json.loads(arguments)
+            if self._replaying:
+                content = await self.cassette.replay("tool", Cassette.key(name, args), f"tool '{name}' with {args}")
+                return {"role": "tool", "tool_call_id": call_id, "content": content}
+            logger.info(f"LLM requesting tool '{name}' via {self.transport.mode}...")
+            start = time.perf_counter()
+            result = await asyncio.wait_for(self.transport.call(name, args), self.tool_timeout)
+            content = json.dumps(result)
+            if self.cassette is not None:
+                self.cassette.record("tool", Cassette.key(name, args), content, time.perf_counter() - start)
+            return {"role": "tool", "tool_call_id": call_id, "content": content}
+        except CassetteMiss:
+            raise
+        except asyncio.TimeoutError:
+            error_msg = f"Error calling tool '{name}': no result within {self.tool_timeout}s"
+            logger.error(error_msg)
+            return {"role": "tool", "tool_call_id": call_id, "content": error_msg}
+        except Exception as e:
+            error_msg = f"Error calling tool '{name}': {e}"
+            logger.error(error_msg)
+            return {"role": "tool", "tool_call_id": call_id, "content": error_msg}
+
+    @staticmethod
+    def _error_response(e: Exception) -> str:
+        """Turns a failed LLM call into the "Error: ..." text callers check for."""
+        METRICS.inc("llm_errors", error=type(e).__name__)
+        if isinstance(e, openai.APITimeoutError): # Catch the specific APITimeoutError
             print(f"LLM API call timed out: {e}")
-            # Handle the timeout appropriately
             return f"Error: LLM API call timed out. Details: {e}"
-            # Or raise a custom exception, return None, etc.
-        except httpx.TimeoutException as e: # Optionally catch the underlying httpx timeout
+        if isinstance(e, httpx.TimeoutException): # Optionally catch the underlying httpx timeout
             print(f"HTTP request timed out: {e}")
             return f"Error: HTTP request timed out. Details: {e}"
-        except openai.APIError as e: # Catch other potential API errors
+        if isinstance(e, openai.APIError): # Catch other potential API errors
             print(f"LLM API error: {e}")
             return f"Error: LLM API error. Details: {e}"
-        except Exception as e: # Catch any other unexpected errors
-            print(f"An unexpected error occurred in LLM client: {e}")
-            return f"Error: Unexpected error in LLM client. Details: {e}"
\ No newline at end of file
+        print(f"An unexpected error occurred in LLM client: {e}")
+        return f"Error: Unexpected error in LLM client. Details: {e}"
\ No newline at end of file
@@ -0,0 +1,101 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Optional, Union
+
+from .metrics import METRICS
+
+if TYPE_CHECKING:
+    from rdflib import Graph
+
+# Relative IRIs (<#SensorTriplesMap>) resolve against this rather than the working directory
+MAPPING_BASE = "http://mapping.local/"
+
+
+class RMLMapping:
+    """
+    One generated RML mapping: the cleaned Turtle text plus its rdflib graph.
+
+    The text is parsed lazily and at most once; the syntax check, the regex
+    checks, SHACL validation and the file writer all read from the same
+    object, so no stage pays the parse cost again for the same content.
+    """
+
+    def __init__(self, text: str):
+        self.text = text
+        self.digest = hashlib.sha256(text.encode("utf-8")).hexdigest()
+        self._graph: Optional["Graph"] = None
+        self._parse_error: Optional[Exception] = None
+        self._parsed = False
+        self._lock = threading.Lock()
+
+    def _parse(self) -> None:
+        with self._lock:
+            if self._parsed:
+                return
+            # rdflib is imported on the first parse; writing a stored mapping does not need it
+            from rdflib import Graph
+
+            start = time.perf_counter()
+            try:
+                graph = Graph()
+                graph.parse(data=self.text, format="turtle", publicID=MAPPING_BASE)
+                self._graph = graph
+            except Exception as e:
+                self._parse_error = e
+            self._parsed = True
+            METRICS.observe("turtle_parse_seconds", time.perf_counter() - start, ok=str(self._parse_error is None).lower())
+
+    @property
+    def parsed(self) -> bool:
+        """Whether the text has been parsed (successfully or not) in this process."""
+        return self._parsed
+
+    @property
+    def parse_error(self) -> Optional[Exception]:
+        """The exception raised while parsing the Turtle, or None if it parsed."""
+        self._parse()
+        return self._parse_error
+
+    @property
+    def graph(self) -> "Graph":
+        """The parsed graph. Raises the original parse error for invalid Turtle. Do not modify it."""
+        self._parse()
+        if self._parse_error is not None:
+            raise self._parse_error
+        return self._graph
+
+    def write(self, path: str) -> str:
+        """Writes the cleaned Turtle text to path, creating parent folders."""
+        output_dir = os.path.dirname(path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.text)
+        return path
+
+
+# Recently parsed mappings, keyed by content hash, so that e.g. the
+# validate_rml_syntax tool and the pipeline share one parse per text
+_MAX_CACHED_MAPPINGS = 64
+_recent: "OrderedDict[str, RMLMapping]" = OrderedDict()
+_recent_lock = threading.Lock()
+
+
+def parse_mapping(content: Union[str, RMLMapping]) -> RMLMapping:
+    """Returns the RMLMapping for content, reusing a recently parsed object for identical text."""
+    if isinstance(content, RMLMapping):
+        return content
+
+    mapping = RMLMapping(content)
+    with _recent_lock:
+        existing = _recent.get(mapping.digest)
+        if existing is not None:
+            _recent.move_to_end(mapping.digest)
+            return existing
+        _recent[mapping.digest] = mapping
+        if len(_recent) > _MAX_CACHED_MAPPINGS:
+            _recent.popitem(last=False)
+    return mapping
@@ -0,0 +1,119 @@
+import csv
+import hashlib
+import json
+import os
+import re
+import time
+from pathlib import Path
+from typing import Optional
+
+from prefixes import PREFIXES
+
+_SOURCE_RE = re.compile(r'(rml:source\s+")((?:[^"\\]|\\.)*)(")')
+
+
+def read_header(csv_file_path: str) -> list:
+    """The CSV header as the mappings reference it (surrounding whitespace stripped)."""
+    with open(csv_file_path, "r", encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f, skipinitialspace=True), [])
+    return [name.strip() for name in header]
+
+
+def schema_fingerprint(csv_file_path: str, td: dict) -> str:
+    """
+    Canonical fingerprint of a CSV/TD pair's structure: the set of CSV column
+    names, the TD title and the name/type/unit of every TD property, plus the
+    prefix set from prefixes.py. Two feeds with equal fingerprints can share
+    one mapping; only the data file name differs.
+    """
+    properties = sorted(
+        (name, str(details.get("type", "")), str(details.get("unit", "")))
+        for name, details in td.get("properties", {}).items()
+        if isinstance(details, dict)
+    )
+    payload = {
+        "columns": sorted(read_header(csv_file_path)),
+        "td_title": td.get("title", ""),
+        "td_properties": properties,
+        "prefixes": sorted(PREFIXES.items()),
+    }
+    return hashlib.sha256(json.dumps(payload, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+
+def rewrite_sources(mapping_text: str, csv_file_path: str) -> str:
+    """Points every rml:source of the mapping at csv_file_path's file name, keeping its directory part."""
+    name = os.path.basename(csv_file_path).replace("\\", "\\\\").replace('"', '\\"')
+
+    def replace(m):
+        directory = m.group(2).rpartition("/")[0]
+        return m.group(1) + (f"{directory}/{name}" if directory else name) + m.group(3)
+
+    return _SOURCE_RE.sub(replace, mapping_text)
+
+
+class MappingStore:
+    """
+    Validated mappings keyed by schema_fingerprint(), one JSON file each under
+    `store_dir`.
+
+    A feed whose header set and TD property shape match an earlier one gets
+    the earlier mapping back with its rml:source rewritten, instead of going
+    through analysis, generation and SHACL validation again. Only mappings
+    that passed validation are stored. Mappings that embed the TD's own id
+    (e.g. a constant sensor IRI) describe one device and are never stored.
+    """
+
+    def __init__(self, store_dir: Path, bypass: bool = False):
+        self.store_dir = Path(store_dir)
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.store_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, fingerprint: str) -> Path:
+        return self.store_dir / f"{fingerprint}.json"
+
+    @staticmethod
+    def is_reusable(mapping_text: str, td: dict) -> bool:
+        td_id = str(td.get("id", "")).rstrip(":/#")
+        if not td_id:
+            return True
+        last = re.split(r"[:/#]", td_id)[-1]
+        return td_id not in mapping_text and not re.search(rf"/{re.escape(last)}>", mapping_text)
+
+    def get(self, fingerprint: str, csv_file_path: str) -> Optional[str]:
+        """Returns the stored mapping rewritten for csv_file_path, or None on a miss."""
+        if self.bypass:
+            self.misses += 1
+            return None
+        try:
+            with open(self._path(fingerprint), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return rewrite_sources(entry["mapping"], csv_file_path)
+
+    def put(self, fingerprint: str, mapping_text: str, td: dict, source: str = "") -> bool:
+        """Stores a validated mapping. Returns False if it is specific to one device."""
+        if not self.is_reusable(mapping_text, td):
+            return False
+        entry = {"created": time.time(), "source": source, "mapping": mapping_text}
+        path = self._path(fingerprint)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self.stores += 1
+        return True
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+        }
@@ -0,0 +1,154 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+# Upper bounds (seconds) of the Prometheus histogram buckets, from tool calls (~ms) to LLM calls (minutes)
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+_PREFIX = "rml_"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _percentile(sorted_values, q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(math.ceil(q * len(sorted_values))) - 1)] if sorted_values else 0.0
+
+
+class Metrics:
+    """
+    Counters and latency histograms for the pipeline stages, labelled like
+    Prometheus series (name plus key/value labels). Safe to use from threads.
+
+    Every inc()/observe() is also appended to an event log that write_jsonl()
+    saves per run. Histograms keep their last SAMPLE_LIMIT values so summary()
+    can report exact p50/p95; render_prometheus() exports the bucket counts.
+    """
+
+    SAMPLE_LIMIT = 10000
+    EVENT_LIMIT = 100000
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._counters: Dict[tuple, float] = {}
+        self._histograms: Dict[tuple, dict] = {}
+        self._events = deque(maxlen=self.EVENT_LIMIT)
+
+    @staticmethod
+    def _key(name: str, labels: dict) -> tuple:
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        """Adds value to the counter `name` (exported as rml_<name>_total)."""
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+            self._events.append({"ts": round(time.time(), 3), "metric": name, "value": value, "labels": dict(key[1])})
+
+    def observe(self, name: str, value: float, **labels) -> None:
+        """Records one value (usually seconds) in the histogram `name`."""
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = {
+                    "buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0,
+                    "samples": deque(maxlen=self.SAMPLE_LIMIT),
+                }
+            i = bisect.bisect_left(self.buckets, value)
+            if i < len(self.buckets):
+                hist["buckets"][i] += 1
+            hist["sum"] += value
+            hist["count"] += 1
+            hist["samples"].append(value)
+            self._events.append({"ts": round(time.time(), 3), "metric": name, "value": round(value, 6), "labels": dict(key[1])})
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        """Observes the wall time of the with-block in the histogram `name`, also when it raises."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    def summary(self) -> dict:
+        """{"counters": {...}, "histograms": {...}} with count/sum/p50/p95/max per labelled series."""
+        with self._lock:
+            counters = {self._series(name, labels): value for (name, labels), value in self._counters.items()}
+            histograms = {}
+            for (name, labels), hist in self._histograms.items():
+                values = sorted(hist["samples"])
+                histograms[self._series(name, labels)] = {
+                    "count": hist["count"],
+                    "sum": round(hist["sum"], 4),
+                    "p50": round(_percentile(values, 0.50), 4),
+                    "p95": round(_percentile(values, 0.95), 4),
+                    "max": round(values[-1], 4) if values else 0.0,
+                }
+        return {"counters": counters, "histograms": histograms}
+
+    @staticmethod
+    def _series(name: str, labels: tuple) -> str:
+        if not labels:
+            return name
+        return name + "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels) + "}"
+
+    def write_jsonl(self, path: str, run_id: Optional[str] = None) -> str:
+        """Writes the event log (one JSON object per line) plus a closing summary line, then clears the log."""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            events = list(self._events)
+            self._events.clear()
+        with open(path, "w", encoding="utf-8") as f:
+            for event in events:
+                f.write(json.dumps(dict(event, run=run_id) if run_id else event) + "\n")
+            f.write(json.dumps({"run": run_id, "summary": self.summary()}) + "\n")
+        return path
+
+    def render_prometheus(self) -> str:
+        """The counters and histograms in the Prometheus text exposition format (version 0.0.4)."""
+        lines = []
+        with self._lock:
+            counters = sorted(self._counters.items())
+            histograms = sorted(self._histograms.items(), key=lambda item: item[0])
+            seen = set()
+            for (name, labels), value in counters:
+                metric = f"{_PREFIX}{name}_total"
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f"# TYPE {metric} counter")
+                lines.append(f"{self._series(metric, labels)} {value:g}")
+            for (name, labels), hist in histograms:
+                metric = f"{_PREFIX}{name}"
+                if metric not in seen:
+                    seen.add(metric)
+                    lines.append(f"# TYPE {metric} histogram")
+                cumulative = 0
+                for bound, count in zip(self.buckets, hist["buckets"]):
+                    cumulative += count
+                    lines.append(f"{self._series(metric + '_bucket', labels + (('le', f'{bound:g}'),))} {cumulative}")
+                lines.append(f"{self._series(metric + '_bucket', labels + (('le', '+Inf'),))} {hist['count']}")
+                lines.append(f"{self._series(metric + '_sum', labels)} {hist['sum']:.6f}")
+                lines.append(f"{self._series(metric + '_count', labels)} {hist['count']}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+            self._events.clear()
+
+
+# Process-wide registry shared by the pipeline, the LLM client and the tool server
+METRICS = Metrics()
@@ -0,0 +1,769 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import math
+import os
+import re
+import csv
+import time
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+# openai, rdflib and pyshacl (and the modules using them) are imported where they are needed
+from .cassette import Cassette, CassetteMiss
+from .stages import Stage, run_stages
+from .response_cache import ResponseCache
+from .mapping import RMLMapping, parse_mapping
+from .mapping_store import MappingStore, schema_fingerprint
+from .metrics import METRICS
+from .validation_pool import shacl_report, syntax_error, validation_pool
+
+if TYPE_CHECKING:
+    from .llm_client import ToolLLM
+
+from tools.data_analyzer import cached_profile, construct_data_prompt
+from tools.td_analyzer import construct_td_prompt, read_td
+from tools.rml_generator import construct_combined_rml_prompt
+from tools.rule_based_generator import align_columns, generate_rule_based_rml
+from prefixes import PREFIXES
+from tools.error_handler import FORBIDDEN_TERMS, IncrementalTurtleChecker, create_refinement_prompt, create_fragment_refinement_prompt, detect_rml_syntax_errors
+from tools.token_budget import estimate_tokens
+
+
+# --- Configuration ---
+TOOL_SERVER_URL = os.getenv("TOOL_SERVER_URL", "http://127.0.0.1:8000").strip()
+
+# "inprocess" runs the tools inside this process; "http" uses the src/api_server.py running at TOOL_SERVER_URL
+TOOL_TRANSPORT = os.getenv("TOOL_TRANSPORT", "inprocess").strip().lower()
+
+MAX_RETRIES = 3
+
+# Rule-based generation: skip the LLM when every column maps by rule (RULE_GENERATION=0 disables it)
+RULE_GENERATION = os.getenv("RULE_GENERATION", "1").lower() not in ("0", "false", "no")
+# Below this share of rule-resolved columns the LLM generates the whole mapping
+RULE_MIN_CONFIDENCE = float(os.getenv("RULE_MIN_CONFIDENCE", "0.5"))
+
+# Stream RML generation and stop it as soon as the partial Turtle is clearly broken (RML_STREAMING=0 disables it)
+RML_STREAMING = os.getenv("RML_STREAMING", "1").lower() not in ("0", "false", "no")
+
+# Mechanical fixes applied by auto_repair() and the LLM refinement rounds they made unnecessary
+AUTO_REPAIR_STATS = {"mappings_repaired": 0, "fixes": 0, "refinements_saved": 0}
+
+# Estimated prompt/answer tokens per pipeline stage (see tools/token_budget.py)
+TOKEN_STATS = {}
+
+# Per-run JSON-lines export of src/metrics.py (set METRICS_DIR to an empty string to disable)
+METRICS_DIR = os.getenv("METRICS_DIR", ".cache/metrics").strip()
+
+# How often a mapping that fails SHACL is repaired statement by statement before giving up
+SHACL_REFINEMENT_ATTEMPTS = int(os.getenv("SHACL_REFINEMENT_ATTEMPTS", "2"))
+
+def make_response_cache(bypass: bool = False):
+    """
+    Builds the on-disk LLM response cache from environment variables.
+    Set LLM_CACHE_DIR to an empty string to disable caching.
+    """
+    cache_dir = os.getenv("LLM_CACHE_DIR", ".cache/llm").strip()
+    if not cache_dir:
+        return None
+    return ResponseCache(
+        cache_dir,
+        max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024),
+        max_age_seconds=float(os.getenv("LLM_CACHE_MAX_AGE_DAYS", "7")) * 24 * 3600,
+        bypass=bypass or os.getenv("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"),
+    )
+
+def make_mapping_store(bypass: bool = False):
+    """
+    Builds the store of validated mappings reused across feeds with the same schema.
+    Set MAPPING_STORE_DIR to an empty string to disable reuse.
+    """
+    store_dir = os.getenv("MAPPING_STORE_DIR", ".cache/mappings").strip()
+    if not store_dir:
+        return None
+    return MappingStore(store_dir, bypass=bypass or os.getenv("MAPPING_STORE_BYPASS", "").lower() in ("1", "true", "yes"))
+
+def print_mapping_store_stats(mapping_store) -> None:
+    if mapping_store is not None:
+        stats = mapping_store.stats()
+        print(f"♻️  Mapping store: {stats['hits']} reused, {stats['misses']} generated, "
+              f"hit rate {stats['hit_rate']:.0%}, {stats['stores']} stored")
+
+def print_cache_stats(tool_llm) -> None:
+    if tool_llm.cache is not None:
+        stats = tool_llm.cache.stats()
+        print(f"🗄️  LLM cache: {stats['hits']} hit(s), {stats['misses']} miss(es), "
+              f"hit rate {stats['hit_rate']:.0%}, {stats['evictions']} eviction(s)")
+
+def print_auto_repair_stats() -> None:
+    if AUTO_REPAIR_STATS["mappings_repaired"]:
+        print(f"🔧 Auto-repair: {AUTO_REPAIR_STATS['fixes']} fix(es) in {AUTO_REPAIR_STATS['mappings_repaired']} mapping(s), "
+              f"{AUTO_REPAIR_STATS['refinements_saved']} LLM refinement call(s) saved")
+
+def stage_label(step_name: str) -> str:
+    """The step name without its "[item] " tag, so metrics of all items share one series."""
+    return re.sub(r"^\[[^\]]*\] ", "", step_name)
+
+def log_tokens(step_name: str, prompt: str, response: str) -> None:
+    """Prints and accumulates the estimated tokens of one LLM call."""
+    tokens_in, tokens_out = estimate_tokens(prompt), estimate_tokens(response or "")
+    print(f"   📏 {step_name}: ~{tokens_in} tokens in, ~{tokens_out} out")
+    METRICS.inc("llm_tokens", tokens_in, stage=stage_label(step_name), direction="in")
+    METRICS.inc("llm_tokens", tokens_out, stage=stage_label(step_name), direction="out")
+    stats = TOKEN_STATS.setdefault(stage_label(step_name), {"calls": 0, "tokens_in": 0, "tokens_out": 0})
+    stats["calls"] += 1
+    stats["tokens_in"] += tokens_in
+    stats["tokens_out"] += tokens_out
+
+def print_token_stats() -> None:
+    for stage, stats in TOKEN_STATS.items():
+        print(f"📏 {stage}: {stats['calls']} call(s), ~{stats['tokens_in']} tokens in, ~{stats['tokens_out']} out")
+
+def print_stage_latency() -> None:
+    histograms = METRICS.summary()["histograms"]
+    for series, stats in histograms.items():
+        if series.startswith(("stage_seconds", "llm_call_seconds", "shacl_validation_seconds")):
+            print(f"⏱️  {series}: {stats['count']}×, p50 {stats['p50']}s, p95 {stats['p95']}s, max {stats['max']}s")
+
+def write_run_metrics() -> str | None:
+    """Saves this run's metric events as JSON lines under METRICS_DIR."""
+    if not METRICS_DIR:
+        return None
+    run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+    path = METRICS.write_jsonl(os.path.join(METRICS_DIR, f"run-{run_id}.jsonl"), run_id)
+    print(f"📈 Metrics written to: {path}")
+    return path
+
+def print_shapes_stats() -> None:
+    from .shapes import shapes_load_stats
+
+    for stats in shapes_load_stats().values():
+        print(f"📐 SHACL shapes {stats['path']}: {stats['triples']} triples loaded from {stats['source']} "
+              f"in {stats['load_time_s'] * 1000:.1f} ms")
+
+def print_transport_stats(tool_llm) -> None:
+    stats = tool_llm.transport_stats()
+    if stats["calls"]:
+        print(f"🔌 Tool transport ({stats['mode']}): {stats['calls']} call(s), {stats['mean_ms']:.2f} ms mean")
+
+def make_tool_server():
+    """The tool server ToolLLM talks to: a URL in http mode, an in-process UniversalToolServer otherwise."""
+    if TOOL_TRANSPORT == "http":
+        return TOOL_SERVER_URL
+    from .tool_server import UniversalToolServer
+
+    return UniversalToolServer(root_path=Path(__file__).resolve().parent.parent)
+
+def make_tool_llm(bypass_cache: bool = False, cassette: Cassette | None = None, tool_server=None) -> ToolLLM:
+    """
+    Builds a ToolLLM from the LLM_BASE_URL / OPENAI_API_KEY / model environment variables.
+    A replayed cassette needs none of them: it never reaches the LLM.
+    `tool_server` overrides make_tool_server(), e.g. to share the api_server's instance.
+    """
+    from .llm_client import ToolLLM
+
+    tool_server = tool_server if tool_server is not None else make_tool_server()
+    if cassette is not None and cassette.replaying:
+        return ToolLLM(
+            (os.getenv("LLM_BASE_URL") or "http://replay.invalid/v1").strip(),
+            (os.getenv("OPENAI_API_KEY") or "replay").strip(),
+            (os.getenv("model") or cassette.model or "replay").strip(),
+            tool_server,
+            cassette=cassette,
+            **llm_pool_settings(),
+        )
+    return ToolLLM(
+        os.getenv("LLM_BASE_URL").strip(),
+        os.getenv("OPENAI_API_KEY").strip(),
+        os.getenv("model").strip(),
+        tool_server,
+        cache=make_response_cache(bypass_cache),
+        cassette=cassette,
+        **llm_pool_settings(),
+    )
+
+def make_cassette(record: str | None = None, replay: str | None = None) -> Cassette | None:
+    """
+    The LLM cassette of this run: --record / --replay, else LLM_CASSETTE in
+    LLM_CASSETTE_MODE (record or replay, default replay). None without either.
+    Replayed answers arrive after LLM_CASSETTE_LATENCY seconds ("recorded" for the original timing).
+    """
+    if record or replay:
+        path, mode = (record, "record") if record else (replay, "replay")
+    else:
+        path = os.getenv("LLM_CASSETTE", "").strip()
+        if not path:
+            return None
+        mode = os.getenv("LLM_CASSETTE_MODE", "replay").strip().lower()
+    latency = os.getenv("LLM_CASSETTE_LATENCY", "0").strip().lower()
+    return Cassette(path, mode, latency if latency == "recorded" else float(latency))
+
+def print_cassette_stats(cassette) -> None:
+    if cassette is not None:
+        stats = cassette.stats()
+        if cassette.recording:
+            print(f"📼 Cassette recorded to {stats['path']}: {stats['recorded']} answer(s)")
+        else:
+            print(f"📼 Cassette replayed from {stats['path']}: {stats['replayed']} answer(s)")
+
+def llm_pool_settings() -> dict:
+    """Connection pool settings for ToolLLM, tunable via environment variables."""
+    return {
+        "max_connections": int(os.getenv("LLM_MAX_CONNECTIONS", "20")),
+        "max_keepalive_connections": int(os.getenv("LLM_MAX_KEEPALIVE", "10")),
+        "keepalive_expiry": float(os.getenv("LLM_KEEPALIVE_EXPIRY", "30")),
+        "llm_timeout": float(os.getenv("LLM_TIMEOUT", "300")),
+        "tool_timeout": float(os.getenv("TOOL_TIMEOUT", "60")),
+        "max_parallel_tool_calls": int(os.getenv("TOOL_MAX_PARALLEL", "4")),
+    }
+  
+
+# --- Enhanced Sanitization ---
+def extract_turtle(text: str) -> str:
+    if not text:
+        return ""
+    # Remove Python byte-string artifacts: b'...', b"..."
+    text = re.sub(r"^b[\"'](.*)[\"']$", r"\1", text.strip(), flags=re.DOTALL)
+    text = re.sub(r"\\n", "\n", text)  # unescape newlines
+    text = re.sub(r"\\\"", "\"", text)  # unescape quotes
+    # Remove markdown fences
+    m = re.search(r"```(?:turtle|ttl)?\n(.*?)```", text, re.DOTALL | re.IGNORECASE)
+    if m:
+        return m.group(1).strip()
+    # Find Turtle start
+    m2 = re.search(r"(@prefix|@base|rml:|ql:|ex:|dct:|saref:)", text, re.IGNORECASE)
+    if m2:
+        return text[m2.start():].strip()
+    return text.strip()
+
+def is_valid_prefix_usage(turtle_str: str) -> bool:
+    allowed_prefixes = { "rml", "ql", "ex", "dct", "saref"}
+    # Find all qnames like dct:title
+    qnames = re.findall(r"\b([a-z]+):[a-zA-Z_][a-zA-Z0-9_]*", turtle_str)
+    return all(prefix in allowed_prefixes for prefix in qnames)
+
+def is_function_call_response(text: str) -> bool:
+    """Check if LLM returned a function call JSON instead of plain text."""
+    text = text.strip()
+    if text.startswith("{") and '"name":' in text and '"parameters":' in text:
+        try:
+            import json
+            obj = json.loads(text)
+            # Check if it's a function call
+            return "name" in obj and "parameters" in obj
+        except:
+            return False
+    return False
+
+def extract_content_from_function_call(text: str) -> str:
+    """Try to extract meaningful content from function call response."""
+    if is_function_call_response(text):
+        try:
+            import json
+            obj = json.loads(text)
+            params = obj.get("parameters", {})
+            
+            # If it's a CSV analysis call, try to extract the CSV file info
+            if obj.get("name") == "csv_structure_analysis":
+                csv_file = params.get("csv_file", "unknown.csv")
+                # Return a plain text summary
+                return f"CSV file: {csv_file}\nColumns: {read_csv_headers(csv_file)}"
+            
+            # If it's a TD analysis call
+            elif obj.get("name") == "semantic_analysis":
+                return f"TD ID: {params.get('td_id', 'unknown')}\nTD Title: {params.get('td_title', 'unknown')}\nProperties: {params.get('td_properties', 'unknown')}"
+            
+            # Otherwise, return the original text
+            return str(params)
+        except:
+            return text
+    return text
+
+def extract_plain_text_from_llm_response(text: str) -> str:
+    """Extract plain text from LLM response, handling function calls."""
+    if is_function_call_response(text):
+        return extract_content_from_function_call(text)
+    return text
+
+def read_csv_headers(path):
+    """Reads the first row of a CSV file to get column headers."""
+    with open(path, "r", encoding="utf-8") as f:
+        reader = csv.reader(f)
+        headers = next(reader) # Get the first row (headers)
+    return headers 
+
+# --- Validate Turtle Syntax ---
+def validate_turtle_syntax(content: str | RMLMapping) -> tuple[bool, str]:
+    error = syntax_error(content)
+    return error is None, error or ""
+
+
+# --- Validate RML Semantics with SHACL ---
+def validate_rml_shacl(rml_content: str | RMLMapping, shacl_path: str) -> tuple[bool, str]:
+    conforms, report, _ = validate_rml_shacl_report(rml_content, shacl_path)
+    return conforms, report
+
+def validate_rml_shacl_report(rml_content: str | RMLMapping, shacl_path: str) -> tuple[bool, str, list]:
+    """
+    Like validate_rml_shacl, plus the (sh:focusNode, message) pairs of the failed results.
+    Runs in the calling thread; the pipeline validates through validation_pool() instead.
+    """
+    try:
+        return shacl_report(rml_content, shacl_path)
+    except Exception as e:
+        return False, f"SHACL validation failed: {e}", []
+
+async def robust_llm_call(tool_llm, prompt: str, step_name: str, max_retries: int = 3, allow_function_calls: bool = True) -> str:
+    """Call LLM with retries and better error handling."""
+    for attempt in range(1, max_retries + 1):
+        try:
+            print(f"   🔄 {step_name} – Attempt {attempt}/{max_retries}")
+            if attempt > 1:
+                METRICS.inc("llm_retries", stage=stage_label(step_name))
+            # Retries must reach the model: a cached answer would just fail the same way again
+            with METRICS.timer("llm_call_seconds", stage=stage_label(step_name)):
+                response = await tool_llm.ask(prompt, use_cache=(attempt == 1))
+            log_tokens(step_name, prompt, response)
+            response = extract_plain_text_from_llm_response(response)
+            
+            if not response or "Error:" in response or "LLM API call timed out" in response:
+                print(f"   ❌ {step_name} failed: {response[:100]}...")
+                if attempt == max_retries:
+                    raise RuntimeError(f"{step_name} failed after {max_retries} attempts")
+                await asyncio.sleep(1)  # Brief backoff
+                continue
+            
+            # Only check for function calls if not allowed
+            if not allow_function_calls and is_function_call_response(response):
+                print(f"   ❌ {step_name} returned function call instead of plain text.")
+                if attempt == max_retries:
+                    raise RuntimeError(f"{step_name} returned invalid format")
+                await asyncio.sleep(1)
+                continue
+
+            print(f"   ✅ {step_name} succeeded.")
+            tool_llm.cache_response(prompt, response)
+            return response
+
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            print(f"   ❌ {step_name} exception: {e}")
+            if attempt == max_retries:
+                raise RuntimeError(f"{step_name} failed after {max_retries} attempts: {e}")
+            await asyncio.sleep(1)
+    
+    raise RuntimeError(f"{step_name} failed after {max_retries} attempts")
+
+
+
+async def refine_fragments(tool_llm, text: str, problems: list, step_name: str) -> str | None:
+    """
+    Regenerates only the statements named in `problems` (a list of (Fragment, error))
+    and splices the answers back into the mapping text. Statements are fixed
+    concurrently. Returns the new mapping text, or None if any answer was unusable.
+    """
+    from tools.fragment_refiner import extract_fragment, split_statements, splice_fragments
+
+    grouped = {}
+    for fragment, error in problems:
+        grouped.setdefault(fragment.start, (fragment, []))[1].append(error)
+    directives, statements = split_statements(text)
+    prefix_declarations = "\n".join(d.text for d in directives)
+
+    async def fix(fragment, errors):
+        others = [st.subject for st in statements if st.start != fragment.start]
+        fragment_prompt = create_fragment_refinement_prompt(fragment.text, "\n".join(dict.fromkeys(errors)), prefix_declarations, others)
+        METRICS.inc("refinements", stage=stage_label(step_name), scope="fragment")
+        with METRICS.timer("llm_call_seconds", stage=stage_label(step_name)):
+            answer = await tool_llm.ask(fragment_prompt, use_cache=False) or ""
+        log_tokens(step_name, fragment_prompt, answer)
+        answer = extract_plain_text_from_llm_response(answer)
+        if answer.startswith("Error:") or is_function_call_response(answer):
+            return None
+        answer = extract_fragment(answer)
+        return (fragment, answer) if answer else None
+
+    fragment_chars = sum(len(f.text) for f, _ in grouped.values())
+    print(f"   🩹 {step_name}: regenerating {len(grouped)} of {len(statements)} statement(s) "
+          f"({fragment_chars} of {len(text)} characters)")
+    replacements = await asyncio.gather(*(fix(fragment, errors) for fragment, errors in grouped.values()))
+    if any(r is None for r in replacements):
+        return None
+    return splice_fragments(text, replacements)
+
+
+async def generate_and_refine_rml(tool_llm, csv_file_path, csv_analysis, td_analysis, max_refinement_attempts=3, step_name="RML Generation",
+                                  partial_mapping=None, unresolved_columns=None):
+    """Generate RML and refine it based on validation errors. Returns the syntax-checked RMLMapping."""
+    from .llm_client import StreamAborted
+    from tools.auto_repair import REPAIRABLE_TERMS
+    from tools.fragment_refiner import fragment_at, locate_parse_error
+
+    # Parsing, repair and syntax checks run in the validation pool, off the event loop
+    validation = validation_pool()
+    current_prompt = construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis, partial_mapping, unresolved_columns)
+    spliced = None  # Mapping text repaired by refine_fragments(), checked on the next attempt
+
+    async def refine(mapping, fragment, error_msg, error_type):
+        # Fix just the offending statement when it can be located, else ask for the whole mapping again
+        nonlocal spliced, current_prompt
+        if fragment is not None:
+            spliced = await refine_fragments(tool_llm, mapping.text, [(fragment, error_msg)], step_name)
+        if spliced is None:
+            METRICS.inc("refinements", stage=stage_label(step_name), scope="full")
+            current_prompt = create_refinement_prompt(mapping.text, error_msg, error_type)
+
+    for attempt in range(1, max_refinement_attempts + 1):
+        print(f"   🔄 {step_name} – Attempt {attempt}/{max_refinement_attempts}")
+        
+        try:
+            mapping = None
+            if spliced is not None:
+                mapping, spliced = parse_mapping(spliced), None
+            elif RML_STREAMING:
+                # Whatever auto_repair() can fix is no reason to stop the stream
+                checker = IncrementalTurtleChecker(
+                    forbidden_terms={t: v for t, v in FORBIDDEN_TERMS.items() if t not in REPAIRABLE_TERMS},
+                    implicit_prefixes=PREFIXES,
+                )
+                try:
+                    with METRICS.timer("llm_call_seconds", stage=stage_label(step_name)):
+                        rml_output = await tool_llm.ask_stream(current_prompt, checker.feed, use_cache=(attempt == 1))
+                    # The last characters, and anything left open, can only be checked once the stream has ended
+                    reason = checker.finish()
+                    if reason:
+                        raise StreamAborted(reason, rml_output)
+                except StreamAborted as aborted:
+                    log_tokens(step_name, current_prompt, aborted.partial)
+                    print(f"   ✂️  Generation stopped after {checker.chars_seen} characters: {aborted.reason[:200]}")
+                    if attempt == max_refinement_attempts:
+                        raise RuntimeError(f"RML generation failed after {max_refinement_attempts} attempts: {aborted.reason}")
+                    METRICS.inc("refinements", stage=stage_label(step_name), scope="full")
+                    current_prompt = create_refinement_prompt(aborted.partial, aborted.reason, checker.error_type)
+                    continue
+            else:
+                with METRICS.timer("llm_call_seconds", stage=stage_label(step_name)):
+                    rml_output = await tool_llm.ask(current_prompt, use_cache=(attempt == 1))
+            if mapping is None:
+                log_tokens(step_name, current_prompt, rml_output)
+                rml_output = extract_plain_text_from_llm_response(rml_output)
+
+                if is_function_call_response(rml_output):
+                    raise ValueError("RML generation returned function call instead of Turtle")
+
+                # Clean once; every check below reads (and parses) this one object
+                mapping = parse_mapping(extract_turtle(rml_output))
+            if not mapping.text:
+                raise ValueError("Empty RML output")
+
+            # Mechanical fixes first; each one that makes the mapping pass saves a refinement call
+            repaired_text, fixes = await validation.auto_repair(mapping.text)
+            if fixes:
+                needed_refinement = await validation.syntax_error(mapping) is not None or not detect_rml_syntax_errors(mapping.text)[0]
+                mapping = parse_mapping(repaired_text)
+                print(f"   🔧 Auto-repaired: {', '.join(dict.fromkeys(fixes))}")
+                AUTO_REPAIR_STATS["mappings_repaired"] += 1
+                AUTO_REPAIR_STATS["fixes"] += len(fixes)
+                if needed_refinement and await validation.syntax_error(mapping) is None and detect_rml_syntax_errors(mapping.text)[0]:
+                    AUTO_REPAIR_STATS["refinements_saved"] += 1
+            
+            # Check for common RML semantic errors first
+            if "parentTriplesMap" in mapping.text and "childTriplesMap" in mapping.text:
+                # Check if they're in objectMap (which is wrong)
+                pattern = r'rml:objectMap\s*\[\s*[^]]*rml:parentTriplesMap\s*[^]]*rml:childTriplesMap'
+                match = re.search(pattern, mapping.text, re.DOTALL)
+                if match:
+                    error_msg = "Invalid RML: rml:parentTriplesMap and rml:childTriplesMap used in rml:objectMap. This is incorrect syntax for linking resources."
+                    print(f"   ❌ RML semantic error: {error_msg[:200]}")
+                    if attempt == max_refinement_attempts:
+                        raise RuntimeError(f"RML semantic error after {max_refinement_attempts} attempts: {error_msg}")
+                    await refine(mapping, fragment_at(mapping.text, match.start()), error_msg, "rml_semantic")
+                    continue
+            
+            # Validate syntax
+            syntax_problem = await validation.syntax_error(mapping)
+            if syntax_problem is not None:
+                error_msg = f"Turtle syntax error: {syntax_problem}"
+                print(f"   ❌ Syntax error: {error_msg[:200]}")
+                if attempt == max_refinement_attempts:
+                    raise RuntimeError(f"RML syntax failed after {max_refinement_attempts} attempts: {error_msg}")
+                await refine(mapping, locate_parse_error(mapping.text, syntax_problem), error_msg, "syntax")
+                continue
+
+            # Known RML mistakes auto_repair() could not fix
+            is_rml_valid, rml_error = detect_rml_syntax_errors(mapping.text)
+            if not is_rml_valid:
+                print(f"   ❌ RML error: {rml_error[:200]}")
+                if attempt == max_refinement_attempts:
+                    raise RuntimeError(f"RML errors remain after {max_refinement_attempts} attempts: {rml_error}")
+                await refine(mapping, None, rml_error, "rml_syntax")
+                continue
+
+            return mapping
+
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            error_msg = str(e)
+            print(f"   ❌ RML generation error: {error_msg}")
+            if attempt == max_refinement_attempts:
+                raise RuntimeError(f"RML generation failed after {max_refinement_attempts} attempts: {error_msg}")
+            METRICS.inc("refinements", stage=stage_label(step_name), scope="full")
+            current_prompt = create_refinement_prompt("", error_msg, "generation")
+            await asyncio.sleep(1)
+
+    raise RuntimeError("RML refinement failed")
+
+
+def pipeline_stages(csv_analysis, td_analysis, rml, shacl) -> list[Stage]:
+    """
+    Dependency graph of the mapping pipeline. Stages without a path between them
+    (here: the CSV and TD analyses) are scheduled concurrently by run_stages().
+    Rule-based generation (csv_analysis/td_analysis None) needs no LLM analyses.
+    """
+    if csv_analysis is None or td_analysis is None:
+        return [
+            Stage("rml", rml),
+            Stage("shacl", shacl, depends_on=("rml",)),
+        ]
+    return [
+        Stage("csv_analysis", csv_analysis),
+        Stage("td_analysis", td_analysis),
+        Stage("rml", rml, depends_on=("csv_analysis", "td_analysis")),
+        Stage("shacl", shacl, depends_on=("csv_analysis", "td_analysis", "rml")),
+    ]
+
+
+def choose_generation_path(alignment) -> str:
+    """
+    'rules' when every column is covered by the local rules, 'hybrid' when enough are
+    that the LLM only has to add the rest, otherwise 'llm'.
+    """
+    if alignment is None or alignment["confidence"] == 0:
+        return "llm"
+    if not alignment["unresolved"]:
+        return "rules"
+    if alignment["confidence"] >= RULE_MIN_CONFIDENCE:
+        return "hybrid"
+    return "llm"
+
+
+def reuse_stored_mapping(mapping_store, data_file, td_file, output_file, tag=""):
+    """
+    Writes the stored mapping of a feed with the same schema to output_file and returns
+    run_pipeline()'s result for it, or None if there is none. Needs no LLM client.
+    """
+    if mapping_store is None:
+        return None
+    fingerprint = schema_fingerprint(data_file, read_td(td_file))
+    reused = mapping_store.get(fingerprint, data_file)
+    if reused is None:
+        return None
+    print(f"{tag}♻️  Reusing the validated mapping of a feed with the same schema ({fingerprint[:12]})")
+    return {"output_file": RMLMapping(reused).write(output_file), "generation_path": "reused", "unresolved_columns": []}
+
+
+async def run_pipeline(tool_llm, data_file, td_file, shacl_path, output_file, label="", use_rules=None, mapping_store=None, reuse=True):
+    """
+    Runs the full analysis → RML generation → SHACL pipeline for one CSV/TD pair
+    and writes the validated mapping to output_file. Raises on any failure.
+
+    Returns {"output_file", "generation_path", "unresolved_columns"}, where the
+    generation path is 'reused' (taken from mapping_store), 'rules' (no LLM call),
+    'hybrid' or 'llm'. With reuse=False the mapping store is not consulted
+    (the caller already did, see reuse_stored_mapping()), but still gets the result.
+    """
+    tag = f"[{label}] " if label else ""
+    use_rules = RULE_GENERATION if use_rules is None else use_rules
+
+    if not os.path.exists(td_file):
+        raise FileNotFoundError(f"TD file not found: {td_file}")
+    if not os.path.exists(data_file):
+        raise FileNotFoundError(f"Data file (CSV) not found: {data_file}")
+    if not os.path.exists(shacl_path):
+        raise FileNotFoundError(f"SHACL shape file not found: {shacl_path}")
+
+    fingerprint = None
+    if mapping_store is not None:
+        reused = reuse_stored_mapping(mapping_store, data_file, td_file, output_file, tag) if reuse else None
+        if reused is not None:
+            return reused
+        td = read_td(td_file)
+        fingerprint = schema_fingerprint(data_file, td)
+
+    def remember(mapping):
+        if fingerprint is not None:
+            mapping_store.put(fingerprint, mapping.text, td, source=data_file)
+
+    # Started here so its workers load the shapes while the analyses wait for the LLM
+    validation = validation_pool(shacl_path)
+
+    # Profiled once, off the event loop, for both the rule alignment and the CSV analysis prompt
+    profile = await asyncio.to_thread(cached_profile, data_file)
+
+    alignment = None
+    if use_rules:
+        try:
+            alignment = align_columns(data_file, td_file, profile=profile)
+        except Exception as e:
+            print(f"{tag}⚠️  Rule-based alignment failed, using the LLM: {e}")
+    path = choose_generation_path(alignment)
+    unresolved = alignment["unresolved"] if alignment else []
+    partial_mapping = None
+    if path != "llm":
+        partial_mapping = generate_rule_based_rml(data_file, alignment)
+        print(f"{tag}🧭 Generation path: {path} ({alignment['confidence']:.0%} of columns resolved by rules"
+              + (f"; LLM fills in {unresolved})" if unresolved else ")"))
+
+    async def shacl(rml, csv_analysis=None, td_analysis=None):
+        # Final validation (SHACL only, since syntax should be fixed)
+        for attempt in range(SHACL_REFINEMENT_ATTEMPTS + 1):
+            # Failed focus nodes come back as the TriplesMaps (statements) owning them
+            is_shacl_valid, shacl_errors, located = await validation.shacl(rml, shacl_path)
+            if is_shacl_valid:
+                break
+            # Repair just those TriplesMaps (not for the rules path: it falls back to the LLM)
+            problems = located if csv_analysis is not None and attempt < SHACL_REFINEMENT_ATTEMPTS else []
+            spliced = await refine_fragments(tool_llm, rml.text, problems, f"{tag}SHACL Refinement") if problems else None
+            if spliced is None:
+                raise RuntimeError(f"SHACL validation failed:\n{shacl_errors}")
+            candidate = parse_mapping((await validation.auto_repair(spliced))[0])
+            error = await validation.syntax_error(candidate)
+            if error is not None:
+                raise RuntimeError(f"SHACL refinement produced invalid Turtle: {error}")
+            rml = candidate
+        # Only a fully validated mapping is cached, under the original generation prompt
+        if csv_analysis is not None:
+            tool_llm.cache_response(construct_combined_rml_prompt(data_file, csv_analysis, td_analysis, partial_mapping, unresolved), rml.text)
+        return rml
+
+    if path == "rules":
+        async def rules_rml():
+            mapping = parse_mapping(partial_mapping)
+            error = await validation.syntax_error(mapping)
+            if error is not None:
+                raise RuntimeError(error)
+            return mapping
+
+        try:
+            results = await run_stages(pipeline_stages(None, None, rules_rml, shacl))
+            remember(results["shacl"])
+            return {"output_file": results["shacl"].write(output_file), "generation_path": "rules", "unresolved_columns": []}
+        except Exception as e:
+            print(f"{tag}⚠️  Rule-based mapping did not validate, falling back to the LLM: {e}")
+            path, partial_mapping = "llm", None
+
+    async def csv_analysis():
+        data_prompt = construct_data_prompt(data_file, profile=profile)
+        result = await robust_llm_call(tool_llm, data_prompt, f"{tag}CSV Analysis", 3, allow_function_calls=True)
+        print(f"{tag}data_Analysis:", result)
+        return result
+
+    async def td_analysis():
+        # Large TDs are cut down to the properties of this CSV's columns
+        td_prompt = construct_td_prompt(td_file, data_file)
+        result = await robust_llm_call(tool_llm, td_prompt, f"{tag}TD Analysis", 3, allow_function_calls=True)
+        print(f"{tag}td_Analysis:", result)
+        return result
+
+    async def rml(csv_analysis, td_analysis):
+        print(f"{tag}✅ Both analyses completed successfully.")
+        return await generate_and_refine_rml(tool_llm, data_file, csv_analysis, td_analysis, 3, step_name=f"{tag}RML Generation",
+                                             partial_mapping=partial_mapping, unresolved_columns=unresolved if partial_mapping else None)
+
+    # The two analyses are independent, so they run concurrently;
+    # see pipeline_stages() for the dependency graph.
+    results = await run_stages(pipeline_stages(csv_analysis, td_analysis, rml, shacl))
+    remember(results["shacl"])
+    # Save result
+    return {
+        "output_file": results["shacl"].write(output_file),
+        "generation_path": path,
+        "unresolved_columns": unresolved if path == "hybrid" else [],
+    }
+
+
+# --- Batch Mode ---
+def load_manifest(manifest_path: str) -> list[dict]:
+    """
+    Reads a batch manifest: a JSON list of {"data_file", "td_file", "output_file"} objects.
+    Relative paths are resolved against the manifest's directory.
+    """
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        entries = json.load(f)
+    if not isinstance(entries, list):
+        raise ValueError("Batch manifest must be a JSON list of items.")
+
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    items = []
+    for i, entry in enumerate(entries):
+        missing = [k for k in ("data_file", "td_file", "output_file") if not entry.get(k)]
+        if missing:
+            raise ValueError(f"Manifest item {i} is missing: {', '.join(missing)}")
+        items.append({
+            "id": entry.get("id") or os.path.splitext(os.path.basename(entry["data_file"]))[0],
+            **{k: os.path.join(base_dir, entry[k]) for k in ("data_file", "td_file", "output_file")},
+        })
+    return items
+
+def _percentile(values: list[float], pct: float) -> float:
+    """Nearest-rank percentile of a list of numbers (0.0 for an empty list)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+def summarize_batch(results: list[dict], wall_time: float) -> dict:
+    """Aggregates per-item results into throughput and latency figures."""
+    latencies = [r["latency_s"] for r in results]
+    succeeded = [r for r in results if r["status"] == "success"]
+    paths = {}
+    for r in succeeded:
+        paths[r["generation_path"]] = paths.get(r["generation_path"], 0) + 1
+    return {
+        "items": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "generation_paths": paths,
+        "wall_time_s": round(wall_time, 3),
+        "throughput_items_per_min": round(len(results) / wall_time * 60, 3) if wall_time > 0 else 0.0,
+        "latency_s": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(_percentile(latencies, 50), 3),
+            "p95": round(_percentile(latencies, 95), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "results": results,
+    }
+
+async def run_batch(tool_llm, items: list[dict], shacl_path: str, concurrency: int = 4, mapping_store=None) -> dict:
+    """Runs the pipeline for every manifest item over one shared ToolLLM, at most `concurrency` at a time."""
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_item(item):
+        async with semaphore:
+            start = time.perf_counter()
+            generation_path = None
+            try:
+                result = await run_pipeline(tool_llm, item["data_file"], item["td_file"], shacl_path, item["output_file"],
+                                            label=item["id"], mapping_store=mapping_store)
+                status, error, generation_path = "success", None, result["generation_path"]
+                print(f"   ✅ [{item['id']}] mapping saved to: {item['output_file']}")
+            except Exception as e:
+                status, error = "failed", str(e)
+                print(f"   ❌ [{item['id']}] failed: {e}")
+            return {
+                "id": item["id"],
+                "output_file": item["output_file"],
+                "status": status,
+                "error": error,
+                "generation_path": generation_path,
+                "latency_s": round(time.perf_counter() - start, 3),
+            }
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(run_item(item) for item in items))
+    return summarize_batch(list(results), time.perf_counter() - start)
@@ -0,0 +1,143 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import List, Optional
+
+
+class ResponseCache:
+    """
+    Persistent, content-addressed cache for LLM responses.
+
+    Entries are keyed by sha256(model, prompt, tool list hash) and stored as one
+    JSON file each under `cache_dir`. Entries stored more than `max_age_seconds`
+    ago are dropped, however often they are hit, and the least recently used
+    entries (file mtime, touched on every hit) are evicted once the directory
+    grows past `max_bytes`.
+
+    The cache never stores anything on its own: callers put() a response only
+    after it has passed validation, so bad generations are never replayed.
+    With `bypass=True` lookups always miss, but validated responses are still
+    written (useful to refresh stale entries).
+    """
+
+    def __init__(
+        self,
+        cache_dir: Path,
+        max_bytes: int = 100 * 1024 * 1024,
+        max_age_seconds: float = 7 * 24 * 3600,
+        bypass: bool = False,
+    ):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        # (file name, inode) -> the entry's "created" time, so evict() reads each file once
+        self._created_at = {}
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def hash_tools(tools: Optional[List[dict]]) -> str:
+        """Stable hash of a tool list, so a changed tool schema invalidates old entries."""
+        return hashlib.sha256(json.dumps(tools or [], sort_keys=True).encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, tools_hash: str) -> str:
+        payload = json.dumps([model, prompt, tools_hash], ensure_ascii=False)
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for key, or None on a miss."""
+        if self.bypass:
+            self.misses += 1
+            return None
+
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            created = float(entry.get("created", path.stat().st_mtime))
+        except (OSError, ValueError, TypeError):
+            self.misses += 1
+            return None
+        if time.time() - created > self.max_age_seconds:
+            path.unlink(missing_ok=True)
+            self.evictions += 1
+            self.misses += 1
+            return None
+
+        # Touch the file so size-based eviction drops least recently used entries first
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        self.hits += 1
+        return entry.get("response")
+
+    def put(self, key: str, response: str, model: str = "") -> None:
+        """Stores a validated response and enforces the size/age limits."""
+        entry = {"model": model, "created": time.time(), "response": response}
+        path = self._path(key)
+        tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, path)  # atomic, so concurrent readers never see half an entry
+        self.stores += 1
+        self.evict()
+
+    def _created(self, path: Path, st: os.stat_result) -> float:
+        """When the entry at path was stored; a replaced file has a new inode, so it is read again."""
+        memo_key = (path.name, st.st_ino)
+        created = self._created_at.get(memo_key)
+        if created is None:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    created = float(json.load(f).get("created", st.st_mtime))
+            except (OSError, ValueError, TypeError, AttributeError):
+                created = st.st_mtime
+            self._created_at[memo_key] = created
+        return created
+
+    def evict(self) -> None:
+        """Removes expired entries, then least recently used ones until under max_bytes."""
+        now = time.time()
+        entries, seen = [], set()
+        for path in self.cache_dir.glob("*.json"):
+            try:
+                st = path.stat()
+            except OSError:
+                continue
+            # A file is never touched before it is stored, so an old mtime means an old entry
+            if now - st.st_mtime > self.max_age_seconds or now - self._created(path, st) > self.max_age_seconds:
+                path.unlink(missing_ok=True)
+                self.evictions += 1
+            else:
+                seen.add((path.name, st.st_ino))
+                entries.append((st.st_mtime, st.st_size, path))
+        self._created_at = {k: v for k, v in self._created_at.items() if k in seen}
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            self.evictions += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "stores": self.stores,
+            "evictions": self.evictions,
+        }
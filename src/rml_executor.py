@@ -0,0 +1,440 @@
+"""
+Streaming RML executor: materializes RDF from a generated mapping and its CSV source.
+
+Supports the subset of RML the generator emits: logical sources over CSV files,
+subject/predicate/object maps built from rml:template, rml:reference and
+rml:constant, rml:class, rml:datatype, rml:language and rml:termType, plus
+rml:parentTriplesMap references to a parent map over the same source (no join
+conditions). Output is N-Triples or Turtle, written in batches so memory stays
+bounded by the batch size no matter how large the CSV is.
+
+Usage:
+    python -m src.rml_executor output/workstation_mapping.ttl --source-dir Data -o output/workstation.nt
+"""
+
+import argparse
+import csv
+import hashlib
+import itertools
+import os
+import re
+import sys
+import time
+from typing import Callable, Dict, List, Optional, TextIO, Tuple, Union
+from urllib.parse import quote
+
+from rdflib import Graph, Literal, URIRef
+from rdflib.namespace import RDF
+
+from prefixes import PREFIXES
+
+from .mapping import RMLMapping
+
+# Generated mappings use the W3C namespace; core.ttl and newer tooling use w3id.org
+RML_NAMESPACES = ("http://www.w3.org/ns/rml#", "http://w3id.org/rml/")
+QL_CSV = ("http://www.w3.org/ns/rml/ql#CSV", "http://semweb.mmlab.be/ns/ql#CSV", "http://w3id.org/rml/CSV")
+XSD_STRING = "http://www.w3.org/2001/XMLSchema#string"
+
+DEFAULT_BATCH_SIZE = 10_000
+
+# A compiled term map: CSV row -> serialized N-Triples term, or None when a referenced value is empty
+TermFn = Callable[[List[str]], Optional[str]]
+
+
+class RMLExecutionError(Exception):
+    """Raised when a mapping uses a construct the executor does not support, or references unknown columns."""
+
+
+# --- Term serialization ---
+_IRI_UNSAFE = re.compile(r"[^A-Za-z0-9\-._~]+")
+_LITERAL_SPECIAL = re.compile(r'[\\"\n\r]')
+
+def _encode_iri_value(value: str) -> str:
+    """Percent-encodes a template value for use inside an IRI (R2RML IRI-safe form)."""
+    return _IRI_UNSAFE.sub(lambda m: quote(m.group(), safe=""), value)
+
+def _escape_literal(value: str) -> str:
+    if not _LITERAL_SPECIAL.search(value):
+        return value
+    return (value.replace("\\", "\\\\").replace('"', '\\"')
+                 .replace("\n", "\\n").replace("\r", "\\r"))
+
+def _iri(value: str) -> str:
+    return f"<{value}>"
+
+def _literal(value: str, datatype: Optional[str], language: Optional[str]) -> str:
+    if language:
+        return f'"{_escape_literal(value)}"@{language}'
+    if datatype and datatype != XSD_STRING:
+        return f'"{_escape_literal(value)}"^^<{datatype}>'
+    return f'"{_escape_literal(value)}"'
+
+def _blank(value: str) -> str:
+    return "_:b" + hashlib.md5(value.encode("utf-8")).hexdigest()
+
+def _constant(term: str) -> TermFn:
+    """A term map that ignores the row; tagged so the executor can pre-render it once."""
+    fn = lambda row: term
+    fn.constant = term
+    return fn
+
+
+# --- Mapping graph helpers ---
+def _values(graph: Graph, node, local_name: str) -> list:
+    return [o for ns in RML_NAMESPACES for o in graph.objects(node, URIRef(ns + local_name))]
+
+def _value(graph: Graph, node, local_name: str):
+    values = _values(graph, node, local_name)
+    return values[0] if values else None
+
+def _local_name(term) -> str:
+    text = str(term)
+    return text.rsplit("#", 1)[-1].rsplit("/", 1)[-1]
+
+
+class _Template:
+    """An rml:template split once into literal text and column indexes."""
+
+    def __init__(self, template: str, columns: Dict[str, int], encode: bool):
+        self.parts: List[Union[str, int]] = []
+        buf, i = "", 0
+        while i < len(template):
+            ch = template[i]
+            if ch == "\\" and i + 1 < len(template):
+                buf += template[i + 1]
+                i += 2
+                continue
+            if ch == "{":
+                end = template.find("}", i)
+                if end == -1:
+                    raise RMLExecutionError(f"Unbalanced '{{' in rml:template '{template}'")
+                if buf:
+                    self.parts.append(buf)
+                    buf = ""
+                self.parts.append(_column_index(columns, template[i + 1:end]))
+                i = end + 1
+                continue
+            buf += ch
+            i += 1
+        if buf:
+            self.parts.append(buf)
+        self.encode = encode
+
+    def render(self, row: List[str]) -> Optional[str]:
+        out = []
+        for part in self.parts:
+            if isinstance(part, int):
+                value = row[part] if part < len(row) else ""
+                if value == "":
+                    return None
+                out.append(_encode_iri_value(value) if self.encode else value)
+            else:
+                out.append(part)
+        return "".join(out)
+
+
+def _column_index(columns: Dict[str, int], name: str) -> int:
+    try:
+        return columns[name.strip()]
+    except KeyError:
+        raise RMLExecutionError(f"Column '{name}' is not in the CSV header {list(columns)}")
+
+
+class RMLExecutor:
+    """
+    Executes the TriplesMaps of one mapping graph.
+
+    TriplesMaps that share a source file are evaluated in one pass over it,
+    and output is flushed every `batch_size` rows. With `strict=True`, any
+    reference to a column missing from the CSV header is an error.
+    """
+
+    def __init__(self, mapping: Union[Graph, RMLMapping, str], source_dir: Optional[str] = None,
+                 base_iri: str = "http://example.org/", batch_size: int = DEFAULT_BATCH_SIZE,
+                 strict: bool = False):
+        if isinstance(mapping, str):
+            mapping = RMLMapping(mapping)
+        self.graph = mapping.graph if isinstance(mapping, RMLMapping) else mapping
+        self.source_dir = source_dir
+        self.base_iri = base_iri
+        self.batch_size = batch_size
+        self.strict = strict
+        # Turtle output abbreviates with the project's prefixes (rdflib's defaults clash, e.g. geo:)
+        self.prefixes = {ns: prefix for prefix, ns in PREFIXES.items() if ns not in RML_NAMESPACES and prefix != "ql"}
+        self.triples_maps = self._find_triples_maps()
+
+    def _find_triples_maps(self) -> list:
+        maps = {s for ns in RML_NAMESPACES for s in self.graph.subjects(URIRef(ns + "logicalSource"), None)}
+        if not maps:
+            raise RMLExecutionError("Mapping has no TriplesMap with a rml:logicalSource")
+        return sorted(maps, key=str)
+
+    # --- Compilation ---
+    def _source_of(self, triples_map) -> str:
+        logical_source = _value(self.graph, triples_map, "logicalSource")
+        source = _value(self.graph, logical_source, "source")
+        if not isinstance(source, Literal):
+            raise RMLExecutionError(f"{triples_map}: only file-path rml:source literals are supported")
+        formulation = _value(self.graph, logical_source, "referenceFormulation")
+        if formulation is not None and str(formulation) not in QL_CSV:
+            raise RMLExecutionError(f"{triples_map}: unsupported reference formulation {formulation}")
+        path = str(source)
+        if not os.path.isabs(path) and self.source_dir:
+            path = os.path.join(self.source_dir, path)
+        return path
+
+    def _absolute(self, iri: str) -> str:
+        return iri if ":" in iri else self.base_iri + iri
+
+    def _compile_term_map(self, term_map, columns: Dict[str, int], position: str) -> TermFn:
+        """Compiles a subject/predicate/object map node into a row -> term function."""
+        g = self.graph
+        constant = _value(g, term_map, "constant")
+        template = _value(g, term_map, "template")
+        reference = _value(g, term_map, "reference")
+        datatype = _value(g, term_map, "datatype")
+        language = _value(g, term_map, "language")
+        term_type = _value(g, term_map, "termType")
+
+        if term_type is not None:
+            kind = _local_name(term_type)
+        elif position != "object" or template is not None or (constant is not None and not isinstance(constant, Literal)):
+            kind = "IRI"
+        elif datatype is not None or language is not None or reference is not None or constant is not None:
+            kind = "Literal"
+        else:
+            kind = "IRI"
+        datatype = str(datatype) if datatype is not None else None
+        language = str(language) if language is not None else None
+
+        def make_term(value: str) -> str:
+            if kind == "IRI":
+                return _iri(self._absolute(value))
+            if kind == "BlankNode":
+                return _blank(value)
+            return _literal(value, datatype, language)
+
+        if constant is not None:
+            return _constant(make_term(str(constant)))
+
+        if template is not None:
+            render = _Template(str(template), columns, encode=(kind == "IRI")).render
+            if kind == "IRI":
+                # Resolve relative templates against the base IRI once, not per row
+                prefix = "<" if ":" in str(template).split("{", 1)[0] else "<" + self.base_iri
+
+                def template_iri(row):
+                    value = render(row)
+                    return None if value is None else f"{prefix}{value}>"
+                return template_iri
+
+            def template_term(row):
+                value = render(row)
+                return None if value is None else make_term(value)
+            return template_term
+
+        if reference is not None:
+            index = _column_index(columns, str(reference))
+            if kind == "Literal" and not language and (not datatype or datatype == XSD_STRING):
+                return lambda row: (None if index >= len(row) or row[index] == "" else f'"{_escape_literal(row[index])}"')
+            return lambda row: (None if index >= len(row) or row[index] == "" else make_term(row[index]))
+
+        if kind == "BlankNode":
+            counter = itertools.count()
+            return lambda row: f"_:r{next(counter)}"
+        raise RMLExecutionError(f"Term map {term_map} has no rml:constant, rml:template or rml:reference")
+
+    def _compile_pom(self, triples_map, pom, columns: Dict[str, int]) -> List[Tuple[TermFn, TermFn]]:
+        g = self.graph
+        predicate_fns = [_constant(_iri(str(p))) for p in _values(g, pom, "predicate")]
+        predicate_fns += [self._compile_term_map(pm, columns, "predicate") for pm in _values(g, pom, "predicateMap")]
+        object_fns = []
+        for obj in _values(g, pom, "object"):
+            term = _iri(str(obj)) if isinstance(obj, URIRef) else _literal(str(obj), None, None)
+            object_fns.append(_constant(term))
+        for om in _values(g, pom, "objectMap"):
+            parent = _value(g, om, "parentTriplesMap")
+            if parent is not None:
+                if _values(g, om, "joinCondition"):
+                    raise RMLExecutionError(f"{triples_map}: rml:joinCondition is not supported")
+                parent_subject = _value(g, parent, "subjectMap")
+                object_fns.append(self._compile_term_map(parent_subject, columns, "subject"))
+            else:
+                object_fns.append(self._compile_term_map(om, columns, "object"))
+        if not predicate_fns or not object_fns:
+            raise RMLExecutionError(f"{triples_map}: predicateObjectMap needs a predicate and an object")
+        return [(p, o) for p in predicate_fns for o in object_fns]
+
+    def _compile_triples_map(self, triples_map, columns: Dict[str, int]) -> Optional[Tuple[TermFn, List[Tuple[TermFn, TermFn]]]]:
+        """
+        Returns (subject fn, [(predicate fn, object fn), ...]) for one TriplesMap.
+        Outside strict mode, maps that reference unknown columns are skipped with a warning.
+        """
+        g = self.graph
+        subject_map = _value(g, triples_map, "subjectMap")
+        try:
+            if subject_map is not None:
+                subject_fn = self._compile_term_map(subject_map, columns, "subject")
+            else:
+                constant_subject = _value(g, triples_map, "subject")
+                if constant_subject is None:
+                    raise RMLExecutionError(f"{triples_map} has no rml:subjectMap")
+                subject_fn = _constant(_iri(str(constant_subject)))
+        except RMLExecutionError as e:
+            if self.strict:
+                raise
+            print(f"⚠️  Skipping {triples_map}: {e}", file=sys.stderr)
+            return None
+
+        pairs = []
+        type_term = _iri(str(RDF.type))
+        for cls in _values(g, subject_map, "class") if subject_map is not None else []:
+            pairs.append((_constant(type_term), _constant(_iri(str(cls)))))
+
+        for pom in _values(g, triples_map, "predicateObjectMap"):
+            try:
+                pairs.extend(self._compile_pom(triples_map, pom, columns))
+            except RMLExecutionError as e:
+                if self.strict:
+                    raise
+                print(f"⚠️  Skipping a predicateObjectMap of {triples_map}: {e}", file=sys.stderr)
+
+        return subject_fn, pairs
+
+    # --- Execution ---
+    def run(self, out: TextIO, fmt: str = "nt") -> dict:
+        """Streams all triples to `out` in 'nt' or 'turtle' format and returns row/triple counts and timing."""
+        if fmt not in ("nt", "turtle"):
+            raise ValueError(f"Unsupported output format: {fmt}")
+        start = time.perf_counter()
+        stats = {"rows": 0, "triples": 0}
+
+        if fmt == "turtle":
+            out.write("".join(f"@prefix {p}: <{ns}> .\n" for ns, p in sorted(self.prefixes.items(), key=lambda kv: kv[1])) + "\n")
+
+        by_source: Dict[str, list] = {}
+        for triples_map in self.triples_maps:
+            by_source.setdefault(self._source_of(triples_map), []).append(triples_map)
+
+        for path, maps in by_source.items():
+            self._run_source(path, maps, out, fmt, stats)
+
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    def _run_source(self, path: str, maps: list, out: TextIO, fmt: str, stats: dict) -> None:
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            # skipinitialspace handles "a, b, c" style headers like Data/workstation.csv
+            reader = csv.reader(f, skipinitialspace=True)
+            header = next(reader, None)
+            if header is None:
+                return
+            columns = {name.strip(): i for i, name in enumerate(header)}
+            compiled = [c for c in (self._compile_triples_map(m, columns) for m in maps) if c is not None]
+            turtle = fmt == "turtle"
+            shorten = self._shorten
+
+            # Split each map into predicate/object pairs that are constant (rendered once
+            # here) and pairs that depend on the row
+            plans = []
+            for subject_fn, pairs in compiled:
+                static, dynamic = [], []
+                for predicate_fn, object_fn in pairs:
+                    p_const, o_const = getattr(predicate_fn, "constant", None), getattr(object_fn, "constant", None)
+                    if p_const is not None and o_const is not None:
+                        static.append(f"{shorten(p_const, True)} {shorten(o_const)}" if turtle else f" {p_const} {o_const} .\n")
+                    else:
+                        dynamic.append((predicate_fn, object_fn))
+                plans.append((subject_fn, static, dynamic))
+
+            while True:
+                batch = list(itertools.islice(reader, self.batch_size))
+                if not batch:
+                    break
+                lines = []
+                append = lines.append
+                triples = 0
+                for row in batch:
+                    for subject_fn, static, dynamic in plans:
+                        subject = subject_fn(row)
+                        if subject is None:
+                            continue
+                        if not turtle:
+                            for po in static:
+                                append(subject + po)
+                            triples += len(static)
+                            for predicate_fn, object_fn in dynamic:
+                                predicate, obj = predicate_fn(row), object_fn(row)
+                                if predicate is not None and obj is not None:
+                                    append(f"{subject} {predicate} {obj} .\n")
+                                    triples += 1
+                        else:
+                            po = list(static)
+                            for predicate_fn, object_fn in dynamic:
+                                predicate, obj = predicate_fn(row), object_fn(row)
+                                if predicate is not None and obj is not None:
+                                    po.append(f"{shorten(predicate, True)} {shorten(obj)}")
+                            if po:
+                                append(f"{shorten(subject)} " + " ;\n    ".join(po) + " .\n")
+                                triples += len(po)
+                out.write("".join(lines))
+                stats["rows"] += len(batch)
+                stats["triples"] += triples
+
+    _SAFE_LOCAL = frozenset("abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_-")
+
+    def _shorten(self, term: str, is_predicate: bool = False) -> str:
+        """Abbreviates an IRI term with a declared prefix when the local part is a plain name."""
+        if is_predicate and term == "<http://www.w3.org/1999/02/22-rdf-syntax-ns#type>":
+            return "a"
+        if not term.startswith("<"):
+            return term
+        iri = term[1:-1]
+        for ns, prefix in self.prefixes.items():
+            if iri.startswith(ns):
+                local = iri[len(ns):]
+                if local and local[0].isalpha() and all(c in self._SAFE_LOCAL for c in local):
+                    return f"{prefix}:{local}"
+        return term
+
+
+def execute_mapping(mapping: Union[Graph, RMLMapping, str], output_path: str, fmt: str = "nt",
+                    source_dir: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                    strict: bool = False) -> dict:
+    """Runs a mapping and writes the materialized RDF to output_path."""
+    executor = RMLExecutor(mapping, source_dir=source_dir, batch_size=batch_size, strict=strict)
+    output_dir = os.path.dirname(output_path)
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    with open(output_path, "w", encoding="utf-8", buffering=1024 * 1024) as out:
+        return executor.run(out, fmt)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Materialize RDF from an RML mapping over its CSV source.")
+    parser.add_argument("mapping", help="RML mapping in Turtle")
+    parser.add_argument("--source-dir", help="Directory used to resolve relative rml:source paths (default: the mapping's folder)")
+    parser.add_argument("-o", "--output", help="Output file (default: stdout)")
+    parser.add_argument("--format", choices=("nt", "turtle"), default="nt")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--strict", action="store_true", help="Fail on references to columns missing from the CSV")
+    args = parser.parse_args(argv)
+
+    with open(args.mapping, "r", encoding="utf-8") as f:
+        mapping = RMLMapping(f.read())
+    source_dir = args.source_dir or os.path.dirname(os.path.abspath(args.mapping))
+
+    try:
+        if args.output:
+            stats = execute_mapping(mapping, args.output, args.format, source_dir, args.batch_size, args.strict)
+        else:
+            executor = RMLExecutor(mapping, source_dir=source_dir, batch_size=args.batch_size, strict=args.strict)
+            stats = executor.run(sys.stdout, args.format)
+    except RMLExecutionError as e:
+        print(f"❌ {e}", file=sys.stderr)
+        sys.exit(1)
+    print(f"✅ {stats['triples']} triples from {stats['rows']} rows in {stats['seconds']}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
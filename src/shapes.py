@@ -0,0 +1,105 @@
+import gc
+import hashlib
+import os
+import pickle
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from rdflib import Graph
+
+# Where pickled snapshots of parsed shapes graphs are kept
+SNAPSHOT_DIR = Path(os.getenv("SHAPES_SNAPSHOT_DIR", ".cache/shapes"))
+
+# shacl_path -> ((mtime_ns, size), parsed graph)
+_loaded: Dict[str, Tuple[Tuple[int, int], Graph]] = {}
+_load_stats: Dict[str, dict] = {}
+_lock = threading.Lock()
+
+
+def _snapshot_path(shacl_path: str, digest: str, snapshot_dir: Path) -> Path:
+    return snapshot_dir / f"{Path(shacl_path).stem}-{digest[:16]}.pickle"
+
+
+def _load_from_disk(shacl_path: str, snapshot_dir: Path) -> Tuple[Graph, str]:
+    """Loads the shapes graph from its snapshot, or parses the Turtle and writes one."""
+    with open(shacl_path, "rb") as f:
+        content = f.read()
+    snapshot = _snapshot_path(shacl_path, hashlib.sha256(content).hexdigest(), snapshot_dir)
+
+    try:
+        with open(snapshot, "rb") as f:
+            data = f.read()
+        # Unpickling creates thousands of small objects; keep the cyclic GC out of the way
+        gc_was_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            graph = pickle.loads(data)
+            if not isinstance(graph, Graph):
+                raise TypeError(f"{snapshot} does not hold a Graph")
+            return graph, "snapshot"
+        finally:
+            if gc_was_enabled:
+                gc.enable()
+    except OSError:
+        pass  # No snapshot yet
+    except Exception:
+        # Corrupt, or written by another rdflib/pyshacl version: discard it and re-parse
+        try:
+            snapshot.unlink(missing_ok=True)
+        except OSError:
+            pass
+
+    graph = Graph()
+    graph.parse(data=content, format="turtle")
+    try:
+        snapshot_dir.mkdir(parents=True, exist_ok=True)
+        tmp_path = snapshot.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(graph, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, snapshot)
+        # Snapshots of older versions of this file can never be hit again
+        for stale in snapshot_dir.glob(f"{Path(shacl_path).stem}-*.pickle"):
+            if stale != snapshot:
+                stale.unlink(missing_ok=True)
+    except OSError:
+        pass  # A missing snapshot only costs a re-parse next time
+    return graph, "turtle"
+
+
+def load_shapes_graph(shacl_path: str, snapshot_dir: Optional[Path] = None) -> Graph:
+    """
+    Returns the parsed SHACL shapes graph for shacl_path, loaded once per process.
+
+    The in-memory copy is reused until the file's mtime or size changes. A cold
+    load first tries a pickled snapshot named after the file's sha256, which is
+    several times faster than parsing Turtle; edited shapes get a new hash and
+    therefore a fresh parse. The returned graph is shared: do not modify it
+    (pyshacl itself only adds a couple of idempotent RDFS schema triples).
+    """
+    key = os.path.abspath(shacl_path)
+    st = os.stat(key)
+    signature = (st.st_mtime_ns, st.st_size)
+
+    with _lock:
+        cached = _loaded.get(key)
+        if cached and cached[0] == signature:
+            return cached[1]
+
+        start = time.perf_counter()
+        graph, source = _load_from_disk(key, snapshot_dir or SNAPSHOT_DIR)
+        _loaded[key] = (signature, graph)
+        _load_stats[key] = {
+            "path": shacl_path,
+            "source": source,
+            "triples": len(graph),
+            "load_time_s": round(time.perf_counter() - start, 4),
+        }
+        return graph
+
+
+def shapes_load_stats() -> Dict[str, dict]:
+    """Load source ('snapshot' or 'turtle'), size and load time of every shapes graph loaded so far."""
+    with _lock:
+        return {path: dict(stats) for path, stats in _load_stats.items()}
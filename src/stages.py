@@ -0,0 +1,101 @@
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from .metrics import METRICS
+
+
+@dataclass
+class Stage:
+    """
+    One step of the mapping pipeline.
+
+    `run` is called with the results of the stages listed in `depends_on`
+    as keyword arguments (keyed by stage name), so stage names must be
+    valid Python identifiers.
+    """
+    name: str
+    run: Callable[..., Awaitable[Any]]
+    depends_on: Tuple[str, ...] = ()
+
+
+class StageError(RuntimeError):
+    """Raised when one or more stages fail. Holds the error of every failed stage."""
+
+    def __init__(self, failures: Dict[str, BaseException], skipped: List[str]):
+        self.failures = failures
+        self.skipped = skipped
+        lines = [f"{name}: {error}" for name, error in failures.items()]
+        if skipped:
+            lines.append(f"skipped (upstream failure): {', '.join(skipped)}")
+        super().__init__("Stage(s) failed – " + "; ".join(lines))
+
+
+def _check_graph(stages: List[Stage]) -> None:
+    """Rejects duplicate names, unknown dependencies and cycles."""
+    by_name = {}
+    for stage in stages:
+        if stage.name in by_name:
+            raise ValueError(f"Duplicate stage name: {stage.name}")
+        by_name[stage.name] = stage
+
+    for stage in stages:
+        for dep in stage.depends_on:
+            if dep not in by_name:
+                raise ValueError(f"Stage '{stage.name}' depends on unknown stage '{dep}'")
+
+    visiting, done = set(), set()
+
+    def visit(name):
+        if name in done:
+            return
+        if name in visiting:
+            raise ValueError(f"Stage dependency cycle through '{name}'")
+        visiting.add(name)
+        for dep in by_name[name].depends_on:
+            visit(dep)
+        visiting.discard(name)
+        done.add(name)
+
+    for stage in stages:
+        visit(stage.name)
+
+
+async def run_stages(stages: List[Stage]) -> Dict[str, Any]:
+    """
+    Runs every stage as soon as all of its dependencies have finished, so
+    independent stages execute concurrently. Returns {stage name: result}.
+
+    A failing stage does not cancel its siblings; stages downstream of it are
+    skipped, and a StageError listing every failure is raised at the end.
+    """
+    _check_graph(stages)
+
+    results: Dict[str, Any] = {}
+    failures: Dict[str, BaseException] = {}
+    skipped: List[str] = []
+    tasks: Dict[str, asyncio.Task] = {}
+
+    async def run_one(stage: Stage):
+        if stage.depends_on:
+            await asyncio.gather(*(tasks[dep] for dep in stage.depends_on))
+        if any(dep in failures or dep in skipped for dep in stage.depends_on):
+            skipped.append(stage.name)
+            return
+        start = time.perf_counter()
+        try:
+            results[stage.name] = await stage.run(**{dep: results[dep] for dep in stage.depends_on})
+            status = "ok"
+        except Exception as e:
+            failures[stage.name] = e
+            status = "error"
+        METRICS.observe("stage_seconds", time.perf_counter() - start, stage=stage.name, status=status)
+
+    for stage in stages:
+        tasks[stage.name] = asyncio.create_task(run_one(stage))
+    await asyncio.gather(*tasks.values())
+
+    if failures:
+        raise StageError(failures, skipped)
+    return results
@@ -1,17 +1,76 @@
+import asyncio
+import hashlib
 import json
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, List, Dict, Any, Optional
 from pathlib import Path
 
+from tools.data_analyzer import cached_profile, construct_data_prompt
+from tools.td_analyzer import construct_td_prompt
+from tools.rml_generator import construct_combined_rml_prompt
+from tools.error_handler import create_refinement_prompt
+from .mapping import parse_mapping
+from .metrics import METRICS
+
+
+@dataclass
+class ToolSpec:
+    """One registered tool: its MCP schema parts and the method that runs it."""
+    name: str
+    description: str
+    parameters: dict
+    handler: Callable
+    # Argument naming the input file; results are cached per (path, mtime, size)
+    file_arg: Optional[str] = None
+
+    def schema(self) -> dict:
+        return {
+            "type": "function",
+            "function": {"name": self.name, "description": self.description, "parameters": self.parameters},
+        }
+
+
+_REGISTRY: Dict[str, ToolSpec] = {}
+
+
+def tool(name: str, description: str, properties: Optional[dict] = None, required=(), file_arg: Optional[str] = None):
+    """Registers a UniversalToolServer method as the tool `name`."""
+    def register(handler):
+        parameters = {"type": "object", "properties": properties or {}}
+        if required:
+            parameters["required"] = list(required)
+        _REGISTRY[name] = ToolSpec(name, description, parameters, handler, file_arg)
+        return handler
+    return register
+
+
 class UniversalToolServer:
     """
     This class defines available tools for semantic web operations
     and handles the logic for calling them.
+
+    Tools register themselves with @tool; the schema list (and its ETag) is
+    built once. Results of tools that analyze a file are kept in an LRU cache
+    keyed by the file's path, mtime and size, so an unchanged file is not
+    read and parsed again. Cached results are shared: do not modify them.
     """
-    
+
+    # Cached results of file-analysis tools (TOOL_RESULT_CACHE_SIZE=0 disables the cache)
+    RESULT_CACHE_SIZE = int(os.getenv("TOOL_RESULT_CACHE_SIZE", "128"))
+
     # We keep the root_path in case future tools need it
     def __init__(self, root_path: Path):
         self.root_path = root_path
+        self._tools = [spec.schema() for spec in _REGISTRY.values()]
+        self.tools_etag = hashlib.sha256(json.dumps(self._tools, sort_keys=True).encode("utf-8")).hexdigest()[:32]
+        self._results: "OrderedDict[tuple, Dict]" = OrderedDict()
+        self._results_lock = threading.Lock()
+        self.cache_hits = 0
+        self.cache_misses = 0
         print(f"Tool server initialized with root: {self.root_path}")
 
     async def __aenter__(self):
@@ -23,128 +82,99 @@ class UniversalToolServer:
 
     async def get_mcp_tools(self) -> List[dict]:
         """Defines the functions the LLM can use for RML generation."""
-        return [
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_csv_structure",
-                "description": "Analyzes the structure of a CSV file to identify columns, data types, and semantic meanings.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "csv_file_path": {"type": "string", "description": "Path to the CSV file to analyze"}
-                    },
-                    "required": ["csv_file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "analyze_thing_description",
-                "description": "Analyzes a Thing Description JSON to extract semantic context, properties, and vocabulary mappings.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "td_file_path": {"type": "string", "description": "Path to the TD JSON file to analyze"}
-                    },
-                    "required": ["td_file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_rml_prefixes",
-                "description": "Returns standard RML prefixes for Turtle files.",
-                "parameters": {"type": "object", "properties": {}},
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "generate_rml_mapping",
-                "description": "Generates RML mapping based on CSV analysis and TD analysis.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "csv_analysis": {"type": "string", "description": "Analysis of CSV structure"},
-                        "td_analysis": {"type": "string", "description": "Analysis of Thing Description"},
-                        "csv_file_path": {"type": "string", "description": "Path to the original CSV file"}
-                    },
-                    "required": ["csv_analysis", "td_analysis", "csv_file_path"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "validate_rml_syntax",
-                "description": "Validates the syntax of RML Turtle content.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "rml_content": {"type": "string", "description": "The RML Turtle content to validate"}
-                    },
-                    "required": ["rml_content"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "refine_rml_with_error",
-                "description": "Refines RML content based on an error message.",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "previous_rml": {"type": "string", "description": "The RML content that had errors"},
-                        "error_message": {"type": "string", "description": "The error message to fix"},
-                        "error_type": {"type": "string", "description": "Type of error: 'syntax', 'rml_semantic', 'rml_syntax'"}
-                    },
-                    "required": ["previous_rml", "error_message", "error_type"],
-                },
-            },
-        },
-    ]
+        return self._tools
+
+    def cache_stats(self) -> dict:
+        with self._results_lock:
+            return {"hits": self.cache_hits, "misses": self.cache_misses, "entries": len(self._results)}
+
+    @staticmethod
+    def _timed(tool_name: str, start: float, cache: str, result: Dict) -> Dict:
+        METRICS.observe("tool_server_call_seconds", time.perf_counter() - start, tool=tool_name, cache=cache)
+        return result
 
     async def call_tool(self, tool_name: str, args: dict) -> Dict:
-        """Executes the actual command."""
+        """Executes the actual command in a worker thread, so the server's event loop stays free."""
+        return await asyncio.to_thread(self.dispatch, tool_name, args)
+
+    def dispatch(self, tool_name: str, args: dict) -> Dict:
+        """call_tool() without the coroutine: the handlers are synchronous, so threads can call this directly."""
         print(f"Executing tool '{tool_name}' with arguments: {args}")
-        
-        # --- 1. TOOL: analyze_csv_structure ---
-        if tool_name == "analyze_csv_structure":
-            csv_file_path = args.get("csv_file_path")
-            if not csv_file_path or not os.path.exists(csv_file_path):
-                return {"error": f"CSV file not found: {csv_file_path}"}
-            
-            try:
-                from tools.data_analyzer import construct_data_prompt
-                prompt = construct_data_prompt(csv_file_path)
-                # If you want to execute the analysis immediately:
-                # response = await self.ask(prompt)  # Assuming you have self.ask method
-                # return {"status": "success", "result": response}
-                # OR return the prompt for the LLM to see:
-                return {"status": "success", "result": prompt}
-            except Exception as e:
-                return {"error": f"Failed to analyze CSV: {str(e)}"}
-
-        # --- 2. TOOL: analyze_thing_description ---
-        if tool_name == "analyze_thing_description":
-            td_file_path = args.get("td_file_path")
-            if not td_file_path or not os.path.exists(td_file_path):
-                return {"error": f"TD file not found: {td_file_path}"}
-            
-            try:
-                from tools.td_analyzer import construct_td_prompt
-                prompt = construct_td_prompt(td_file_path)
-                return {"status": "success", "result": prompt}
-            except Exception as e:
-                return {"error": f"Failed to analyze TD: {str(e)}"}
-
-        # --- 3. TOOL: get_rml_prefixes ---
-        if tool_name == "get_rml_prefixes":
-            prefixes = """
+
+        spec = _REGISTRY.get(tool_name)
+        if spec is None:
+            return {"error": f"Unknown tool: {tool_name}"}
+        start = time.perf_counter()
+        if spec.file_arg is None:
+            return self._timed(tool_name, start, "none", spec.handler(self, args))
+
+        path = args.get(spec.file_arg)
+        try:
+            st = os.stat(path)
+        except (OSError, TypeError):
+            # Not cacheable; the handler reports the missing file
+            return self._timed(tool_name, start, "none", spec.handler(self, args))
+        key = (tool_name, os.path.abspath(path), st.st_mtime_ns, st.st_size)
+        with self._results_lock:
+            cached = self._results.get(key)
+            if cached is not None:
+                self._results.move_to_end(key)
+                self.cache_hits += 1
+                return self._timed(tool_name, start, "hit", cached)
+            self.cache_misses += 1
+
+        result = self._timed(tool_name, start, "miss", spec.handler(self, args))
+        if "error" not in result and self.RESULT_CACHE_SIZE > 0:
+            with self._results_lock:
+                self._results[key] = result
+                while len(self._results) > self.RESULT_CACHE_SIZE:
+                    self._results.popitem(last=False)
+        return result
+
+    # --- 1. TOOL: analyze_csv_structure ---
+    @tool(
+        "analyze_csv_structure",
+        "Analyzes the structure of a CSV file to identify columns, data types, and semantic meanings. Returns a measured column profile (types, null rates, cardinality, candidate keys, timestamp/geo columns).",
+        {"csv_file_path": {"type": "string", "description": "Path to the CSV file to analyze"}},
+        required=["csv_file_path"],
+        file_arg="csv_file_path",
+    )
+    def _analyze_csv_structure(self, args: dict) -> Dict:
+        csv_file_path = args.get("csv_file_path")
+        if not csv_file_path or not os.path.exists(csv_file_path):
+            return {"error": f"CSV file not found: {csv_file_path}"}
+
+        try:
+            profile = cached_profile(csv_file_path)
+            prompt = construct_data_prompt(csv_file_path, profile=profile)
+            # Return the prompt for the LLM to see, plus the measured profile
+            return {"status": "success", "result": prompt, "profile": profile}
+        except Exception as e:
+            return {"error": f"Failed to analyze CSV: {str(e)}"}
+
+    # --- 2. TOOL: analyze_thing_description ---
+    @tool(
+        "analyze_thing_description",
+        "Analyzes a Thing Description JSON to extract semantic context, properties, and vocabulary mappings.",
+        {"td_file_path": {"type": "string", "description": "Path to the TD JSON file to analyze"}},
+        required=["td_file_path"],
+        file_arg="td_file_path",
+    )
+    def _analyze_thing_description(self, args: dict) -> Dict:
+        td_file_path = args.get("td_file_path")
+        if not td_file_path or not os.path.exists(td_file_path):
+            return {"error": f"TD file not found: {td_file_path}"}
+
+        try:
+            prompt = construct_td_prompt(td_file_path)
+            return {"status": "success", "result": prompt}
+        except Exception as e:
+            return {"error": f"Failed to analyze TD: {str(e)}"}
+
+    # --- 3. TOOL: get_rml_prefixes ---
+    @tool("get_rml_prefixes", "Returns standard RML prefixes for Turtle files.")
+    def _get_rml_prefixes(self, args: dict) -> Dict:
+        prefixes = """
     @prefix rml: <http://www.w3.org/ns/rml#> .
     @prefix ql: <http://www.w3.org/ns/rml/ql#> .
     @prefix ex: <http://example.org/> .
@@ -154,52 +184,72 @@ class UniversalToolServer:
     @prefix xsd: <http://www.w3.org/2001/XMLSchema#> .
     @prefix schema: <https://schema.org/> .
     """
-            return {"status": "success", "result": prefixes.strip()}
-
-        # --- 4. TOOL: generate_rml_mapping ---
-        if tool_name == "generate_rml_mapping":
-            csv_analysis = args.get("csv_analysis", "")
-            td_analysis = args.get("td_analysis", "")
-            csv_file_path = args.get("csv_file_path", "")
-            
-            if not csv_analysis or not td_analysis or not csv_file_path:
-                return {"error": "Missing required arguments: csv_analysis, td_analysis, csv_file_path"}
-            
-            try:
-                from tools.rml_generator import construct_combined_rml_prompt
-                prompt = construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis)
-                return {"status": "success", "result": prompt}
-            except Exception as e:
-                return {"error": f"Failed to generate RML mapping prompt: {str(e)}"}
-
-        # --- 5. TOOL: validate_rml_syntax ---
-        if tool_name == "validate_rml_syntax":
-            rml_content = args.get("rml_content", "")
-            if not rml_content.strip():
-                return {"error": "RML content is empty."}
-            
-            try:
-                from rdflib import Graph
-                g = Graph()
-                g.parse(data=rml_content, format="turtle")
-                return {"status": "success", "message": "RML syntax is valid."}
-            except Exception as e:
-                return {"status": "error", "message": f"RML syntax error: {str(e)}"}
-
-        # --- 6. TOOL: refine_rml_with_error ---
-        if tool_name == "refine_rml_with_error":
-            previous_rml = args.get("previous_rml", "")
-            error_message = args.get("error_message", "")
-            error_type = args.get("error_type", "syntax")
-            
-            if not previous_rml or not error_message:
-                return {"error": "Missing required arguments: previous_rml, error_message"}
-            
-            try:
-                from tools.error_handler import create_refinement_prompt
-                prompt = create_refinement_prompt(previous_rml, error_message, error_type)
-                return {"status": "success", "result": prompt}
-            except Exception as e:
-                return {"error": f"Failed to create refinement prompt: {str(e)}"}
-
-        return {"error": f"Unknown tool: {tool_name}"}
\ No newline at end of file
+        return {"status": "success", "result": prefixes.strip()}
+
+    # --- 4. TOOL: generate_rml_mapping ---
+    @tool(
+        "generate_rml_mapping",
+        "Generates RML mapping based on CSV analysis and TD analysis.",
+        {
+            "csv_analysis": {"type": "string", "description": "Analysis of CSV structure"},
+            "td_analysis": {"type": "string", "description": "Analysis of Thing Description"},
+            "csv_file_path": {"type": "string", "description": "Path to the original CSV file"},
+        },
+        required=["csv_analysis", "td_analysis", "csv_file_path"],
+    )
+    def _generate_rml_mapping(self, args: dict) -> Dict:
+        csv_analysis = args.get("csv_analysis", "")
+        td_analysis = args.get("td_analysis", "")
+        csv_file_path = args.get("csv_file_path", "")
+
+        if not csv_analysis or not td_analysis or not csv_file_path:
+            return {"error": "Missing required arguments: csv_analysis, td_analysis, csv_file_path"}
+
+        try:
+            prompt = construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis)
+            return {"status": "success", "result": prompt}
+        except Exception as e:
+            return {"error": f"Failed to generate RML mapping prompt: {str(e)}"}
+
+    # --- 5. TOOL: validate_rml_syntax ---
+    @tool(
+        "validate_rml_syntax",
+        "Validates the syntax of RML Turtle content.",
+        {"rml_content": {"type": "string", "description": "The RML Turtle content to validate"}},
+        required=["rml_content"],
+    )
+    def _validate_rml_syntax(self, args: dict) -> Dict:
+        rml_content = args.get("rml_content", "")
+        if not rml_content.strip():
+            return {"error": "RML content is empty."}
+
+        # Shares parses with the pipeline when both run in one process
+        error = parse_mapping(rml_content).parse_error
+        if error is None:
+            return {"status": "success", "message": "RML syntax is valid."}
+        return {"status": "error", "message": f"RML syntax error: {str(error)}"}
+
+    # --- 6. TOOL: refine_rml_with_error ---
+    @tool(
+        "refine_rml_with_error",
+        "Refines RML content based on an error message.",
+        {
+            "previous_rml": {"type": "string", "description": "The RML content that had errors"},
+            "error_message": {"type": "string", "description": "The error message to fix"},
+            "error_type": {"type": "string", "description": "Type of error: 'syntax', 'rml_semantic', 'rml_syntax'"},
+        },
+        required=["previous_rml", "error_message", "error_type"],
+    )
+    def _refine_rml_with_error(self, args: dict) -> Dict:
+        previous_rml = args.get("previous_rml", "")
+        error_message = args.get("error_message", "")
+        error_type = args.get("error_type", "syntax")
+
+        if not previous_rml or not error_message:
+            return {"error": "Missing required arguments: previous_rml, error_message"}
+
+        try:
+            prompt = create_refinement_prompt(previous_rml, error_message, error_type)
+            return {"status": "success", "result": prompt}
+        except Exception as e:
+            return {"error": f"Failed to create refinement prompt: {str(e)}"}
@@ -0,0 +1,121 @@
+import asyncio
+import logging
+import time
+from typing import Dict, List
+
+import httpx
+
+from .metrics import METRICS
+from .tool_server import UniversalToolServer
+
+logger = logging.getLogger(__name__)
+
+
+class ToolTransport:
+    """
+    How ToolLLM reaches its tools. open() returns the tool list, call() runs
+    one tool and returns its JSON-compatible result. Every call is timed, so
+    the transports can be compared with stats().
+    """
+
+    mode = ""
+
+    def __init__(self):
+        self.calls = 0
+        self.total_seconds = 0.0
+
+    async def open(self) -> List[dict]:
+        raise NotImplementedError
+
+    async def _call(self, tool_name: str, args: dict) -> Dict:
+        raise NotImplementedError
+
+    async def close(self, exc_type=None, exc=None, tb=None) -> None:
+        pass
+
+    async def call(self, tool_name: str, args: dict) -> Dict:
+        start = time.perf_counter()
+        try:
+            return await self._call(tool_name, args)
+        finally:
+            elapsed = time.perf_counter() - start
+            self.calls += 1
+            self.total_seconds += elapsed
+            METRICS.observe("tool_call_seconds", elapsed, tool=tool_name, transport=self.mode)
+
+    def stats(self) -> dict:
+        return {
+            "mode": self.mode,
+            "calls": self.calls,
+            "total_s": round(self.total_seconds, 4),
+            "mean_ms": round(self.total_seconds / self.calls * 1000, 3) if self.calls else 0.0,
+        }
+
+
+# base_url -> (ETag, tool list) of the last /tools response, shared by all clients in this process
+_tool_lists: Dict[str, tuple] = {}
+
+
+class HttpToolTransport(ToolTransport):
+    """
+    Tools served by src/api_server.py: GET /tools once, then POST /call per tool call.
+    The tool list is revalidated with its ETag, so later clients skip the download.
+    """
+
+    mode = "http"
+
+    def __init__(self, base_url: str, http_client: httpx.AsyncClient):
+        super().__init__()
+        self.base_url = base_url
+        self.http_client = http_client
+
+    async def open(self) -> List[dict]:
+        # Enter the httpx client context
+        await self.http_client.__aenter__()
+        try:
+            logger.info(f"Fetching tools from {self.base_url}/tools")
+            known = _tool_lists.get(self.base_url)
+            headers = {"If-None-Match": known[0]} if known else {}
+            response = await self.http_client.get(f"{self.base_url}/tools", headers=headers)
+            if response.status_code == 304 and known:
+                return known[1]
+            response.raise_for_status() # Raise an error on a bad response (4xx, 5xx)
+            tools = response.json()
+            if response.headers.get("ETag"):
+                _tool_lists[self.base_url] = (response.headers["ETag"], tools)
+            return tools
+        except httpx.RequestError as e:
+            logger.error(f"Error fetching tools: {e}")
+            # Exit the client if we fail, as we can't proceed
+            await self.http_client.__aexit__(type(e), e, e.__traceback__)
+            raise
+
+    async def _call(self, tool_name: str, args: dict) -> Dict:
+        response = await self.http_client.post(f"{self.base_url}/call", json={"tool_name": tool_name, "args": args})
+        response.raise_for_status()
+        return response.json()
+
+    async def close(self, exc_type=None, exc=None, tb=None) -> None:
+        await self.http_client.__aexit__(exc_type, exc, tb)
+
+
+class InProcessToolTransport(ToolTransport):
+    """Calls a UniversalToolServer in this process: no second process, socket or JSON encoding."""
+
+    mode = "inprocess"
+
+    def __init__(self, server: UniversalToolServer):
+        super().__init__()
+        self.server = server
+
+    async def open(self) -> List[dict]:
+        await self.server.__aenter__()
+        return await self.server.get_mcp_tools()
+
+    async def _call(self, tool_name: str, args: dict) -> Dict:
+        # The tools do their file parsing synchronously; a thread keeps the loop free
+        # and lets the caller's timeout fire (~0.3 ms overhead)
+        return await asyncio.to_thread(self.server.dispatch, tool_name, args)
+
+    async def close(self, exc_type=None, exc=None, tb=None) -> None:
+        await self.server.__aexit__(exc_type, exc, tb)
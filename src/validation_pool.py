@@ -0,0 +1,196 @@
+import asyncio
+import multiprocessing
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional, Sequence
+
+from .mapping import RMLMapping, parse_mapping
+from .metrics import METRICS
+
+# Processes that validate mappings off the event loop (default: one per spare core, at most 4).
+# 0 validates in the event loop's thread, as the pipeline did before the pool existed.
+VALIDATION_WORKERS = int(os.getenv("VALIDATION_WORKERS", str(max(0, min(4, (os.cpu_count() or 1) - 1)))))
+
+# Worker syntax results a pool remembers
+_MAX_SYNTAX_RESULTS = 256
+
+
+def syntax_error(content) -> Optional[str]:
+    """The Turtle syntax error of a mapping (text or RMLMapping) as a message, or None if it parses."""
+    from rdflib.exceptions import ParserError
+
+    error = parse_mapping(content).parse_error
+    if error is None:
+        return None
+    if isinstance(error, ParserError):
+        return f"Turtle syntax error: {error}"
+    return f"Unexpected error: {error}"
+
+
+def shacl_report(content, shacl_path: str) -> tuple[bool, str, list]:
+    """
+    SHACL-validates a mapping (text or RMLMapping) against the shapes at shacl_path,
+    loaded once per process. Returns (conforms, report text, [(sh:focusNode, message)]).
+    """
+    from pyshacl import validate
+    from rdflib import RDF
+    from rdflib.namespace import SH
+    from .shapes import load_shapes_graph
+
+    # Reuses the graph parsed by the syntax check (pyshacl validates a copy)
+    data_graph = parse_mapping(content).graph
+    shacl_graph = load_shapes_graph(shacl_path)
+    with METRICS.timer("shacl_validation_seconds"):
+        conforms, report_graph, _ = validate(data_graph, shacl_graph=shacl_graph, inference="rdfs", debug=False)
+    if conforms:
+        return True, "", []
+    report, focus = "", []
+    for result in report_graph.subjects(RDF.type, SH.ValidationResult):
+        messages = [str(m).strip() for m in report_graph.objects(result, SH.resultMessage)]
+        for message in messages:
+            report += f"- {message}\n"
+        focus_node = report_graph.value(result, SH.focusNode)
+        if focus_node is not None:
+            focus.append((focus_node, " ".join(messages) or "SHACL constraint violated"))
+    return False, report.strip(), focus
+
+
+def located_shacl_report(content, shacl_path: str) -> tuple[bool, str, list]:
+    """
+    Like shacl_report(), but each failed focus node comes back as the statement
+    (tools.fragment_refiner.Fragment) that defines it, so the result is small and
+    needs no graph to use: (conforms, report text, [(Fragment, message)]).
+    """
+    from tools.fragment_refiner import focus_owner, locate_subject
+
+    mapping = parse_mapping(content)
+    try:
+        conforms, report, focus = shacl_report(mapping, shacl_path)
+    except Exception as e:
+        return False, f"SHACL validation failed: {e}", []
+    problems = []
+    for focus_node, message in focus:
+        owner = focus_owner(mapping.graph, focus_node)
+        fragment = locate_subject(mapping.text, owner) if owner is not None else None
+        if fragment is not None:
+            problems.append((fragment, message))
+    return conforms, report, problems
+
+
+def _repair(text: str) -> tuple[str, list, dict]:
+    """auto_repair() in a worker, plus the syntax results of the texts it parsed there."""
+    from tools.auto_repair import auto_repair
+
+    repaired, fixes = auto_repair(text)
+    parsed = [m for m in (parse_mapping(text), parse_mapping(repaired)) if m.parsed]
+    return repaired, fixes, {m.digest: syntax_error(m) for m in parsed}
+
+
+def _init_worker(shacl_paths: Sequence[str]) -> None:
+    """Loads pyshacl and the shapes graphs when a worker starts, not on its first job."""
+    import pyshacl  # noqa: F401
+    from .shapes import load_shapes_graph
+
+    for path in shacl_paths:
+        load_shapes_graph(path)
+
+
+def _ready() -> bool:
+    return True
+
+
+class ValidationPool:
+    """
+    Turtle syntax checks, auto_repair() and SHACL validation for the async pipeline.
+
+    With workers > 0 they run in a process pool, so validation overlaps with LLM
+    I/O instead of blocking the event loop, and concurrent pipelines validate on
+    separate cores. Workers preload pyshacl and the shapes graphs, and only text,
+    messages and statement spans cross the process boundary. With workers == 0
+    everything runs inline and reuses the graph parsed in this process.
+    """
+
+    def __init__(self, workers: int = VALIDATION_WORKERS, shacl_paths: Sequence[str] = ()):
+        self.workers = max(0, workers)
+        self._executor = None
+        # Worker syntax results by mapping digest: the pipeline checks the same text more than once
+        self._syntax: "OrderedDict[str, Optional[str]]" = OrderedDict()
+        if self.workers:
+            # spawn: the pipeline process has threads (HTTP pool, tool calls) that fork would copy mid-flight
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                                 initializer=_init_worker, initargs=(tuple(shacl_paths),))
+            # Start every worker now, so they warm up while the first LLM calls run
+            for _ in range(self.workers):
+                self._executor.submit(_ready)
+
+    @property
+    def mode(self) -> str:
+        return "process" if self._executor is not None else "inline"
+
+    async def _run(self, task: str, fn, *args):
+        start = time.perf_counter()
+        try:
+            if self._executor is not None:
+                try:
+                    return await asyncio.wrap_future(self._executor.submit(fn, *args))
+                except BrokenProcessPool as e:
+                    # A worker died (killed, out of memory, or a script without a __main__ guard under spawn)
+                    executor, self._executor = self._executor, None
+                    if executor is not None:  # Concurrent checks fail together; report it once
+                        print(f"⚠️  Validation pool broken ({e}); validating inline from now on")
+                        executor.shutdown(wait=False, cancel_futures=True)
+            return fn(*args)
+        finally:
+            METRICS.observe("validation_seconds", time.perf_counter() - start, task=task, mode=self.mode)
+
+    async def syntax_error(self, mapping: RMLMapping) -> Optional[str]:
+        """syntax_error() of the mapping; answered here if the mapping is parsed in this process already."""
+        if self._executor is None or mapping.parsed:
+            return syntax_error(mapping)
+        if mapping.digest in self._syntax:
+            return self._syntax[mapping.digest]
+        error = await self._run("syntax", syntax_error, mapping.text)
+        self._remember({mapping.digest: error})
+        return error
+
+    def _remember(self, results: dict) -> None:
+        self._syntax.update(results)
+        while len(self._syntax) > _MAX_SYNTAX_RESULTS:
+            self._syntax.popitem(last=False)
+
+    async def auto_repair(self, text: str) -> tuple[str, list]:
+        from tools.auto_repair import auto_repair
+
+        if self._executor is None:
+            return await self._run("auto_repair", auto_repair, text)
+        repaired, fixes, syntax = await self._run("auto_repair", _repair, text)
+        self._remember(syntax)
+        return repaired, fixes
+
+    async def shacl(self, mapping: RMLMapping, shacl_path: str) -> tuple[bool, str, list]:
+        """located_shacl_report() of the mapping."""
+        if self._executor is None:
+            return await self._run("shacl", located_shacl_report, mapping, shacl_path)
+        return await self._run("shacl", located_shacl_report, mapping.text, os.path.abspath(shacl_path))
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+
+_pool: Optional[ValidationPool] = None
+_pool_lock = threading.Lock()
+
+
+def validation_pool(shacl_path: Optional[str] = None) -> ValidationPool:
+    """The process-wide ValidationPool, started on first use with shacl_path preloaded in its workers."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ValidationPool(VALIDATION_WORKERS, [os.path.abspath(shacl_path)] if shacl_path else [])
+        return _pool
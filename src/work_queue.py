@@ -0,0 +1,214 @@
+import hashlib
+import json
+import os
+import re
+import socket
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+
+def _safe_id(item_id: str) -> str:
+    """
+    Item ids become file names; keep them portable. A short hash of the raw id
+    keeps ids that sanitize alike (e.g. "a/b" and "a_b") apart.
+    """
+    digest = hashlib.sha256(item_id.encode("utf-8")).hexdigest()[:10]
+    return f"{re.sub(r'[^A-Za-z0-9._-]', '_', item_id)}-{digest}"
+
+
+def _write_json_atomic(path: Path, data: dict) -> None:
+    tmp_path = path.with_name(f".{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path: Path) -> Optional[dict]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class FileWorkQueue:
+    """
+    A work queue kept entirely in a directory, so any number of processes on
+    one or several hosts (sharing the directory) can drain it together:
+
+        items/<id>.json   – the work item, written once by enqueue()
+        leases/<id>.json  – claimed by a worker until `expires`
+        done/<id>.json    – checkpoint of a successful item
+        failed/<id>.json  – checkpoint of a failed item
+
+    Claims link a fully written lease file into place (os.link fails if the
+    lease exists), so exactly one worker wins an item. Workers renew their
+    lease while they work by rewriting the lease file they verified in place,
+    so it never disappears; a lease that expires (worker crashed) can be
+    taken over by anyone. Items with a done/ or failed/ checkpoint are
+    never handed out again, which is what makes a restarted run resume.
+    Lease expiry compares wall clocks, so hosts should be NTP-synchronized.
+    """
+
+    def __init__(self, queue_dir: str, lease_seconds: float = 600.0):
+        self.root = Path(queue_dir)
+        self.lease_seconds = lease_seconds
+        self.items_dir = self.root / "items"
+        self.leases_dir = self.root / "leases"
+        self.done_dir = self.root / "done"
+        self.failed_dir = self.root / "failed"
+        for d in (self.items_dir, self.leases_dir, self.done_dir, self.failed_dir):
+            d.mkdir(parents=True, exist_ok=True)
+
+    @staticmethod
+    def worker_id() -> str:
+        return f"{socket.gethostname()}-{os.getpid()}"
+
+    def enqueue(self, items: List[dict]) -> int:
+        """Adds items (each with an "id") that are not queued yet. Returns how many were new."""
+        added = 0
+        for item in items:
+            path = self.items_dir / f"{_safe_id(item['id'])}.json"
+            if path.exists():
+                continue
+            _write_json_atomic(path, item)
+            added += 1
+        return added
+
+    def _lease_path(self, key: str) -> Path:
+        return self.leases_dir / f"{key}.json"
+
+    def _is_finished(self, key: str) -> bool:
+        return (self.done_dir / f"{key}.json").exists() or (self.failed_dir / f"{key}.json").exists()
+
+    def _lease_expired(self, lease_path: Path, lease: Optional[dict]) -> bool:
+        if lease is not None:
+            return lease.get("expires", 0) <= time.time()
+        # Unreadable (corrupt): held until it is older than a lease would be
+        try:
+            return lease_path.stat().st_mtime + self.lease_seconds <= time.time()
+        except OSError:
+            return True
+
+    def _try_lease(self, key: str, worker_id: str) -> bool:
+        lease_path = self._lease_path(key)
+        claim_path = lease_path.with_name(f".{key}.{_safe_id(worker_id)}.claim")
+        with open(claim_path, "w", encoding="utf-8") as f:
+            json.dump({"worker": worker_id, "expires": time.time() + self.lease_seconds}, f)
+        try:
+            os.link(claim_path, lease_path)
+        except FileExistsError:
+            if not self._lease_expired(lease_path, _read_json(lease_path)):
+                return False
+            # Expired lease: exactly one worker wins the rename
+            stale_path = lease_path.with_name(f".{key}.{_safe_id(worker_id)}.stale")
+            try:
+                os.rename(lease_path, stale_path)
+            except OSError:
+                return False
+            if not self._lease_expired(stale_path, _read_json(stale_path)):
+                # Renewed or re-leased between our read and rename: put it back
+                try:
+                    os.link(stale_path, lease_path)
+                except OSError:
+                    pass
+                stale_path.unlink(missing_ok=True)
+                return False
+            stale_path.unlink(missing_ok=True)
+            return self._try_lease(key, worker_id)
+        finally:
+            claim_path.unlink(missing_ok=True)
+        return True
+
+    def claim(self, worker_id: str) -> Optional[dict]:
+        """Leases the next unfinished, unleased item for worker_id, or returns None."""
+        for path in sorted(self.items_dir.glob("*.json")):
+            key = path.stem
+            if self._is_finished(key) or not self._try_lease(key, worker_id):
+                continue
+            # It may have been completed between the check and the lease
+            if self._is_finished(key):
+                self.release(key, worker_id)
+                continue
+            item = _read_json(path)
+            if item is None:
+                self.release(key, worker_id)
+                continue
+            return item
+        return None
+
+    def renew(self, item_id: str, worker_id: str) -> bool:
+        """Extends the lease; returns False if the worker no longer holds it."""
+        lease_path = self._lease_path(_safe_id(item_id))
+        try:
+            with open(lease_path, "r+", encoding="utf-8") as f:
+                try:
+                    current = json.load(f)
+                except ValueError:
+                    return False
+                if not isinstance(current, dict) or current.get("worker") != worker_id:
+                    return False
+                # Rewritten in place, so the lease never disappears; a reader that catches it
+                # half-written sees a fresh mtime and treats it as held (see _lease_expired)
+                f.seek(0)
+                f.truncate()
+                json.dump({"worker": worker_id, "expires": time.time() + self.lease_seconds}, f)
+                f.flush()
+                # A worker taking over an expired lease renames it aside first; then this file is no longer the lease
+                return os.fstat(f.fileno()).st_ino == os.stat(lease_path).st_ino
+        except OSError:
+            return False
+
+    def release(self, item_id: str, worker_id: str) -> None:
+        key = _safe_id(item_id)
+        lease_path = self._lease_path(key)
+        current = _read_json(lease_path)
+        if current is not None and current.get("worker") == worker_id:
+            lease_path.unlink(missing_ok=True)
+
+    def complete(self, item_id: str, worker_id: str, record: dict) -> None:
+        """Checkpoints a successful item and drops its lease."""
+        _write_json_atomic(self.done_dir / f"{_safe_id(item_id)}.json", {**record, "worker": worker_id, "finished_at": time.time()})
+        self.release(item_id, worker_id)
+
+    def fail(self, item_id: str, worker_id: str, record: dict) -> None:
+        """Checkpoints a failed item (skipped on restart unless requeue_failed() is called)."""
+        _write_json_atomic(self.failed_dir / f"{_safe_id(item_id)}.json", {**record, "worker": worker_id, "finished_at": time.time()})
+        self.release(item_id, worker_id)
+
+    def requeue_failed(self) -> int:
+        """Makes failed items claimable again. Returns how many were requeued."""
+        count = 0
+        for path in self.failed_dir.glob("*.json"):
+            path.unlink(missing_ok=True)
+            count += 1
+        return count
+
+    def counts(self) -> Dict[str, int]:
+        total = len(list(self.items_dir.glob("*.json")))
+        done = len(list(self.done_dir.glob("*.json")))
+        failed = len(list(self.failed_dir.glob("*.json")))
+        now = time.time()
+        leased = 0
+        for path in self.leases_dir.glob("*.json"):
+            lease = _read_json(path)
+            if lease is not None and lease.get("expires", 0) > now:
+                leased += 1
+        return {
+            "total": total,
+            "done": done,
+            "failed": failed,
+            "leased": leased,
+            "pending": max(0, total - done - failed - leased),
+        }
+
+    def records(self) -> List[dict]:
+        """All done and failed checkpoints."""
+        out = []
+        for d in (self.done_dir, self.failed_dir):
+            for path in sorted(d.glob("*.json")):
+                record = _read_json(path)
+                if record is not None:
+                    out.append(record)
+        return out
@@ -0,0 +1,104 @@
+import re
+
+from rdflib import Graph, Namespace, URIRef
+
+from prefixes import PREFIXES
+from src.mapping import MAPPING_BASE, parse_mapping
+
+# Both RML vocabularies in use: the one the prompts ask for and the one of the SHACL shapes
+RML_NAMESPACES = (Namespace("http://www.w3.org/ns/rml#"), Namespace("http://w3id.org/rml/"))
+
+# Wrong unit IRIs the model tends to produce -> the QUDT unit the prompt asks for
+UNIT_FIXES = {
+    "http://www.w3.org/2009/08/skos-reference/skos.html#Celsius": URIRef("http://qudt.org/vocab/unit/DEG_C"),
+    "http://www.w3.org/2009/08/skos-reference/skos.html#Percent": URIRef("http://qudt.org/vocab/unit/PERCENT"),
+}
+
+# Terms auto_repair() removes or rewrites, so nothing upstream needs to reject them
+REPAIRABLE_TERMS = {"rml:iterator", "rml:classifier", "rml:column"}
+
+_IGNORED_RE = re.compile(r'"""[\s\S]*?"""|\'\'\'[\s\S]*?\'\'\'|"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|<[^>\s]*>|#[^\n]*')
+_QNAME_PREFIX_RE = re.compile(r"(?<![\w@:.-])([A-Za-z][\w-]*):(?=[A-Za-z_\d])")
+_PREFIX_LINE_RE = re.compile(r"^[ \t]*@prefix\s+([A-Za-z0-9_.-]*):\s*<[^>]*>\s*\.[ \t]*$", re.MULTILINE)
+_DECLARED_RE = re.compile(r"(?:@prefix|PREFIX)\s+([A-Za-z0-9_.-]*):", re.IGNORECASE)
+
+
+def add_missing_prefixes(text: str) -> tuple[str, list]:
+    """Declares every prefix that is used but not declared and is known in prefixes.PREFIXES."""
+    declared = set(_DECLARED_RE.findall(text))
+    used = set(_QNAME_PREFIX_RE.findall(_IGNORED_RE.sub(" ", text)))
+    missing = sorted(p for p in used - declared if p in PREFIXES)
+    if not missing:
+        return text, []
+    declarations = "\n".join(f"@prefix {p}: <{PREFIXES[p]}> ." for p in missing)
+    return f"{declarations}\n{text}", [f"declared prefix {p}:" for p in missing]
+
+
+def _graph_fixes(graph: Graph) -> list:
+    """
+    The mechanical fixes a parsed mapping needs, as (triples to remove, triples to add,
+    description). Only reads the graph, which may be the shared one of an RMLMapping.
+    """
+    fixes = []
+    for rml in RML_NAMESPACES:
+        for wrong, right in ((rml.classifier, rml["class"]), (rml.column, rml.reference)):
+            for s, o in graph.subject_objects(wrong):
+                fixes.append(([(s, wrong, o)], [(s, right, o)],
+                              f"rml:{wrong.split('/')[-1].split('#')[-1]} → rml:{right.split('/')[-1].split('#')[-1]}"))
+
+        for source, iterator in graph.subject_objects(rml.iterator):
+            formulation = graph.value(source, rml.referenceFormulation)
+            if formulation is None or str(formulation).endswith("CSV"):
+                fixes.append(([(source, rml.iterator, iterator)], [], "removed rml:iterator from a CSV source"))
+
+        for pom in set(graph.subjects(rml.objectMap, None)):
+            objects = list(graph.triples((pom, rml.object, None)))
+            if objects:
+                fixes.append((objects, [], "removed rml:object next to rml:objectMap"))
+
+    for s, p, o in graph:
+        if isinstance(o, URIRef) and str(o) in UNIT_FIXES:
+            fixes.append(([(s, p, o)], [(s, p, UNIT_FIXES[str(o)])], f"unit <{o}> → <{UNIT_FIXES[str(o)]}>"))
+    return fixes
+
+
+def auto_repair(text: str) -> tuple[str, list]:
+    """
+    Fixes the known, mechanical mistakes in a generated mapping without an LLM call:
+    undeclared prefixes from prefixes.PREFIXES, rml:classifier and rml:column,
+    rml:iterator on CSV sources, rml:object next to rml:objectMap, and wrong
+    unit IRIs (the issues detect_rml_syntax_errors reports).
+
+    Returns (text, fixes). Prefix fixes are text edits. The graph is the one
+    parse_mapping() caches for the text (so the pipeline parses each candidate
+    once), and it is copied and re-serialized only when a graph fix applies;
+    unparseable text just gets the prefix fixes.
+    """
+    text, fixes = add_missing_prefixes(text)
+    mapping = parse_mapping(text)
+    if mapping.parse_error is not None:
+        return text, fixes
+
+    graph_fixes = _graph_fixes(mapping.graph)
+    if not graph_fixes:
+        return text, fixes
+
+    graph = Graph()
+    graph += mapping.graph
+    for removed, added, _ in graph_fixes:
+        for triple in removed:
+            graph.remove(triple)
+        for triple in added:
+            graph.add(triple)
+    for prefix, uri in mapping.graph.namespaces():
+        graph.bind(prefix, uri)
+    for prefix, uri in PREFIXES.items():
+        graph.bind(prefix, uri, override=True, replace=True)
+    out = graph.serialize(format="turtle", base=MAPPING_BASE)
+    out = re.sub(r"^@base <[^>]*> \.\n", "", out, flags=re.MULTILINE).replace(f"<{MAPPING_BASE}", "<")
+    # The serializer only declares prefixes it uses; keep the mapping's other declarations
+    declared = set(_DECLARED_RE.findall(out))
+    kept = [m.group(0) for m in _PREFIX_LINE_RE.finditer(text) if m.group(1) not in declared]
+    if kept:
+        out = "\n".join(kept) + "\n" + out
+    return out, fixes + [description for _, _, description in graph_fixes]
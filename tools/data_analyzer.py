@@ -1,5 +1,20 @@
 import csv
+import hashlib
+import math
 import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+# Default cap on how much of a CSV is profiled for the analysis prompt (0 = whole file)
+PROFILE_BYTE_BUDGET = int(os.getenv("CSV_PROFILE_BYTE_BUDGET", str(4 * 1024 * 1024)))
+
+# Profiles of recently seen CSVs, keyed by (abspath, mtime_ns, size, byte_budget)
+_MAX_CACHED_PROFILES = 64
+_profiles = OrderedDict()
+_profiles_lock = threading.Lock()
 
 def read_csv_headers(path: str) -> list[str]:
     """Reads the first row of a CSV file to get column headers."""
@@ -8,11 +23,279 @@ def read_csv_headers(path: str) -> list[str]:
         headers = next(reader)  # Get the first row (headers)
     return headers
 
-def construct_data_prompt(csv_file_path: str) -> str:
+# --- Streaming CSV profiler ---
+class HyperLogLog:
+    """Fixed-size distinct-count sketch (2**p registers, ~1.04/sqrt(2**p) relative error)."""
+
+    def __init__(self, p: int = 12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add(self, value: str) -> None:
+        x = int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+        index = x >> (64 - self.p)
+        rest = x & ((1 << (64 - self.p)) - 1)
+        rank = (64 - self.p) - rest.bit_length() + 1
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def estimate(self) -> int:
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        raw = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if raw <= 2.5 * self.m and zeros:
+            return round(self.m * math.log(self.m / zeros))  # linear counting for small sets
+        return round(raw)
+
+
+_INT_RE = re.compile(r"^[+-]?\d+$")
+_FLOAT_RE = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+_BOOL_VALUES = {"true", "false", "yes", "no", "0", "1"}
+_DATE_RE = re.compile(r"^\d{4}-\d{2}-\d{2}([T ]\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:?\d{2})?)?$")
+_NULL_VALUES = {"", "null", "none", "na", "n/a", "nan"}
+_LAT_NAMES = {"lat", "latitude"}
+_LON_NAMES = {"lon", "lng", "long", "longitude"}
+
+# Type candidates from most to least specific; a column keeps every type all its values fit.
+# integer precedes boolean, so 0/1 columns are inferred as integers
+_TYPE_ORDER = ("integer", "float", "boolean", "datetime", "string")
+_XSD = {"integer": "xsd:integer", "float": "xsd:float", "boolean": "xsd:boolean", "datetime": "xsd:dateTime", "string": "xsd:string"}
+
+
+def _is_datetime(value: str) -> bool:
+    if not _DATE_RE.match(value):
+        return False
+    try:
+        datetime.fromisoformat(value.replace("Z", "+00:00"))
+        return True
+    except ValueError:
+        return False
+
+
+class _ColumnProfile:
+    # Exact distinct values are tracked up to this many; beyond it only the sketch is used
+    EXACT_LIMIT = 10_000
+
+    def __init__(self, name: str):
+        self.name = name
+        self.count = 0
+        self.nulls = 0
+        self.types = set(_TYPE_ORDER)
+        self.minimum = None
+        self.maximum = None
+        self.sketch = HyperLogLog()
+        self.exact = set()
+
+    def add(self, value: str) -> None:
+        self.count += 1
+        if value.lower() in _NULL_VALUES:
+            self.nulls += 1
+            return
+        if self.exact is not None:
+            if value in self.exact:
+                return  # Already typed and ranged when first seen
+            self.exact.add(value)
+            if len(self.exact) > self.EXACT_LIMIT:
+                # Switch to the constant-memory sketch from here on
+                for seen in self.exact:
+                    self.sketch.add(seen)
+                self.exact = None
+        else:
+            self.sketch.add(value)
+
+        types = self.types
+        if len(types) == 1:
+            return  # Only "string" left
+        if "integer" in types and not _INT_RE.match(value):
+            types.discard("integer")
+        if "float" in types:
+            if _FLOAT_RE.match(value):
+                number = float(value)
+                if self.minimum is None or number < self.minimum:
+                    self.minimum = number
+                if self.maximum is None or number > self.maximum:
+                    self.maximum = number
+            else:
+                types.discard("float")
+        if "boolean" in types and value.lower() not in _BOOL_VALUES:
+            types.discard("boolean")
+        if "datetime" in types and not _is_datetime(value):
+            types.discard("datetime")
+
+    def summary(self, sample: list) -> dict:
+        non_null = self.count - self.nulls
+        inferred = next(t for t in _TYPE_ORDER if t in self.types) if non_null else "string"
+        distinct = len(self.exact) if self.exact is not None else self.sketch.estimate()
+
+        lowered = self.name.strip().lower()
+        geo = None
+        if inferred in ("integer", "float") and self.minimum is not None:
+            if lowered in _LAT_NAMES and -90 <= self.minimum and self.maximum <= 90:
+                geo = "latitude"
+            elif lowered in _LON_NAMES and -180 <= self.minimum and self.maximum <= 180:
+                geo = "longitude"
+
+        minimum, maximum = self.minimum, self.maximum
+        if inferred == "integer" and minimum is not None:
+            minimum, maximum = int(minimum), int(maximum)
+
+        return {
+            "name": self.name,
+            "type": inferred,
+            "xsd_datatype": _XSD[inferred],
+            "null_rate": round(self.nulls / self.count, 4) if self.count else 0.0,
+            "distinct_estimate": distinct,
+            "distinct_exact": self.exact is not None,
+            "min": minimum if inferred in ("integer", "float") else None,
+            "max": maximum if inferred in ("integer", "float") else None,
+            "is_timestamp": inferred == "datetime",
+            "geo": geo,
+            "sample_values": sample,
+        }
+
+
+class _BudgetedLines:
+    """
+    The lines of a file that fit in its first `byte_budget` bytes, decoded one at a
+    time, so memory stays bounded by the longest line. `covered` counts the bytes read.
+    """
+
+    def __init__(self, path: str, byte_budget: int):
+        self.file = open(path, "rb")
+        self.byte_budget = byte_budget
+        self.covered = 0
+
+    def __iter__(self):
+        for line in self.file:
+            if self.covered + len(line) > self.byte_budget:
+                break
+            self.covered += len(line)
+            yield line.decode("utf-8", errors="replace")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.file.close()
+
+
+def _open_rows(csv_file_path: str, byte_budget: int):
+    """
+    Returns (line stream, truncated flag, file size). With a byte budget smaller than
+    the file, only the lines within the first `byte_budget` bytes are read.
+    """
+    size = os.path.getsize(csv_file_path)
+    if byte_budget and size > byte_budget:
+        return _BudgetedLines(csv_file_path, byte_budget), True, size
+    return open(csv_file_path, "r", encoding="utf-8", newline=""), False, size
+
+
+def profile_csv(csv_file_path: str, byte_budget: int = 0, sample_size: int = 5, seed: int = 0) -> dict:
+    """
+    Profiles a CSV in one streaming pass and constant memory: per-column type,
+    null rate, distinct-count estimate (HyperLogLog), numeric range, timestamp
+    and geo detection, candidate keys, and a reservoir sample of values.
+
+    byte_budget > 0 profiles only the lines in the first byte_budget bytes and
+    extrapolates the row count. The fixed seed keeps the sample, and therefore
+    prompts built from it, identical between runs.
+    """
+    stream, truncated, size = _open_rows(csv_file_path, byte_budget)
+    with stream:
+        reader = csv.reader(stream, skipinitialspace=True)
+        header = [h.strip() for h in next(reader, [])]
+        columns = [_ColumnProfile(h) for h in header]
+        rng = random.Random(seed)
+        reservoir = []
+        rows = 0
+        # Algorithm L reservoir sampling: random numbers are drawn only when a row is kept
+        weight = math.exp(math.log(rng.random()) / sample_size)
+        next_pick = sample_size + math.floor(math.log(rng.random()) / math.log(1 - weight)) + 1
+        for row in reader:
+            if not row:
+                continue
+            rows += 1
+            for col, value in zip(columns, row):
+                col.add(value.strip())
+            if rows <= sample_size:
+                reservoir.append(row)
+            elif rows == next_pick:
+                reservoir[rng.randrange(sample_size)] = row
+                weight *= math.exp(math.log(rng.random()) / sample_size)
+                next_pick += math.floor(math.log(rng.random()) / math.log(1 - weight)) + 1
+
+    summaries = []
+    for i, col in enumerate(columns):
+        sample = [r[i].strip() for r in reservoir if i < len(r)]
+        summaries.append(col.summary(sample))
+
+    # Measurements can be unique by accident; only identifier-like types count as keys
+    candidate_keys = [
+        c["name"] for c in summaries
+        if rows and c["type"] in ("integer", "string", "datetime") and c["null_rate"] == 0 and c["distinct_estimate"] >= rows * (1.0 if c["distinct_exact"] else 0.97)
+    ]
+    return {
+        "file": os.path.basename(csv_file_path),
+        "rows": rows if not truncated else round(rows * size / max(stream.covered, 1)),
+        "rows_profiled": rows,
+        "truncated": truncated,
+        "columns": summaries,
+        "candidate_keys": candidate_keys,
+        "timestamp_columns": [c["name"] for c in summaries if c["is_timestamp"]],
+        "geo_columns": {c["name"]: c["geo"] for c in summaries if c["geo"]},
+    }
+
+
+def cached_profile(csv_file_path: str, byte_budget: int = None) -> dict:
+    """
+    profile_csv() with the default budget, memoized per file until its mtime or
+    size changes. The returned dict is shared: do not modify it.
+    """
+    budget = PROFILE_BYTE_BUDGET if byte_budget is None else byte_budget
+    path = os.path.abspath(csv_file_path)
+    st = os.stat(path)
+    key = (path, st.st_mtime_ns, st.st_size, budget)
+    with _profiles_lock:
+        if key in _profiles:
+            _profiles.move_to_end(key)
+            return _profiles[key]
+    # Profiled outside the lock; two threads racing on the same new file both compute it
+    profile = profile_csv(path, byte_budget=budget)
+    with _profiles_lock:
+        _profiles[key] = profile
+        while len(_profiles) > _MAX_CACHED_PROFILES:
+            _profiles.popitem(last=False)
+    return profile
+
+
+def format_profile(profile: dict) -> str:
+    """Renders a profile as compact plain text for prompts."""
+    approx = "~" if profile["truncated"] else ""
+    lines = [f"Rows: {approx}{profile['rows']} (profiled {profile['rows_profiled']})"]
+    for c in profile["columns"]:
+        details = [c["type"], f"suggested {c['xsd_datatype']}", f"nulls {c['null_rate']:.1%}",
+                   f"distinct {'' if c['distinct_exact'] else '~'}{c['distinct_estimate']}"]
+        if c["min"] is not None:
+            details.append(f"range {c['min']}..{c['max']}")
+        if c["geo"]:
+            details.append(c["geo"])
+        lines.append(f"- {c['name']}: {', '.join(details)}; e.g. {c['sample_values'][:3]}")
+    lines.append(f"Candidate keys: {profile['candidate_keys'] or 'none'}")
+    lines.append(f"Timestamp columns: {profile['timestamp_columns'] or 'none'}")
+    lines.append(f"Geo columns: {profile['geo_columns'] or 'none'}")
+    return "\n".join(lines)
+
+
+def construct_data_prompt(csv_file_path: str, profile: dict = None) -> str:
     """
     Constructs a prompt focused on CSV data structure analysis.
+    The column profile (measured types, keys, timestamp/geo columns) is included
+    so the LLM does not have to guess them from the header names.
     """
     csv_headers = read_csv_headers(csv_file_path)
+    if profile is None:
+        profile = cached_profile(csv_file_path)
     
     data_prompt = f"""
 You are a data structure analyzer. Provide only plain text analysis of the following CSV file. DO NOT return any JSON, function calls, or structured responses. Just plain text.
@@ -20,10 +303,13 @@ You are a data structure analyzer. Provide only plain text analysis of the follo
 ### CSV File: {os.path.basename(csv_file_path)}
 ### Column Headers: {csv_headers}
 
+### Column Profile (measured from the data):
+{format_profile(profile)}
+
 Analyze the CSV structure and provide:
 1. A list of each column with its likely semantic meaning
 2. Identification of potential key columns (IDs, names, etc.)
-3. Notes on data types and potential mapping candidates
+3. Notes on data types and potential mapping candidates (use the measured types for rml:datatype)
 4. Any special data types like geospatial or temporal
 
 Plain text analysis:
@@ -1,11 +1,38 @@
-def create_refinement_prompt(previous_output: str, error_message: str, error_type: str) -> str:
-    """Create a prompt that asks the LLM to fix its previous output based on an error."""
+import re
+
+from tools.token_budget import PROMPT_TOKEN_BUDGET, compact_passages, estimate_tokens, name_terms
+
+
+def create_refinement_prompt(previous_output: str, error_message: str, error_type: str, token_budget=None) -> str:
+    """
+    Create a prompt that asks the LLM to fix its previous output based on an error.
+    The previous output is included; if the prompt would exceed token_budget
+    (default PROMPT_TOKEN_BUDGET), only its statements most related to the error are kept.
+    """
+    budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    if not (previous_output or "").strip():
+        return _render_refinement_prompt("", error_message, error_type)
+    fixed = estimate_tokens(_render_refinement_prompt(_previous_output_section(""), error_message, error_type))
+    previous_output = compact_passages(previous_output.strip(), name_terms(error_message), max(budget - fixed, 0), topic="the error")
+    return _render_refinement_prompt(_previous_output_section(previous_output), error_message, error_type)
+
+
+def _previous_output_section(previous_output: str) -> str:
+    return f"""
+### YOUR PREVIOUS OUTPUT (keep everything that is not wrong, output the COMPLETE corrected mapping):
+```turtle
+{previous_output}
+```
+"""
+
+
+def _render_refinement_prompt(previous_section: str, error_message: str, error_type: str) -> str:
     if error_type == "syntax":
         return f"""
 Your previous RML output had a Turtle syntax error:
 
 ERROR: {error_message}
-
+{previous_section}
 COMMON CAUSES:
 - Using a prefix (like 'schema:', 'xsd:') without declaring it with @prefix
 - Missing period (.) at the end of statements
@@ -26,7 +53,7 @@ Fix the error and output the corrected RML now:
 Your previous RML output had a semantic error:
 
 ERROR: {error_message}
-
+{previous_section}
 CRITICAL RML SYNTAX RULES:
 - NEVER use rml:parentTriplesMap and rml:childTriplesMap inside rml:objectMap
 - rml:parentTriplesMap/rml:childTriplesMap are for JOINING data sources, not for linking subjects
@@ -64,7 +91,7 @@ Fix the RML syntax and output the corrected version:
 Your RML output has syntax errors:
 
 ERROR: {error_message}
-
+{previous_section}
 CRITICAL RML SYNTAX RULES:
 - NEVER use rml:iterator for CSV files (only use rml:referenceFormulation ql:CSV)
 - NEVER use rml:object (always use rml:objectMap with nested properties)
@@ -94,10 +121,40 @@ Fix the RML syntax and output the corrected version:
 Your previous output was invalid:
 
 ERROR: {error_message}
-
+{previous_section}
 Fix this and output ONLY valid Turtle RML with proper prefix declarations.
 """
 
+def create_fragment_refinement_prompt(fragment: str, error_message: str, prefix_declarations: str, other_subjects: list) -> str:
+    """
+    Asks the LLM to fix one statement (usually one TriplesMap) of a mapping.
+    The answer is spliced back in place of `fragment`, so only that statement is regenerated.
+    """
+    others = ", ".join(other_subjects) if other_subjects else "(none)"
+    return f"""
+One statement of an RML mapping (Turtle) is invalid. Fix ONLY this statement.
+
+ERROR: {error_message}
+
+### PREFIXES ALREADY DECLARED IN THE MAPPING:
+{prefix_declarations}
+
+### OTHER STATEMENTS IN THE MAPPING (unchanged, you may reference them):
+{others}
+
+### STATEMENT TO FIX:
+{fragment}
+
+RULES:
+- Keep the same subject ({fragment.split(None, 1)[0] if fragment.strip() else ""}) and everything that is not wrong
+- Use rml:reference (not rml:column) for CSV column names and rml:referenceFormulation ql:CSV (no rml:iterator)
+- Declare a prefix with @prefix ONLY if it is not in the list above
+- End the statement with a period (.)
+- Output ONLY the corrected statement in Turtle. NO explanations, NO other statements.
+
+Corrected statement:
+"""
+
 def detect_rml_syntax_errors(rml_output: str) -> tuple[bool, str]:
     """Detect common RML syntax errors in LLM output."""
     
@@ -124,3 +181,200 @@ def detect_rml_syntax_errors(rml_output: str) -> tuple[bool, str]:
     
     return True, ""
 
+
+
+
+# Terms that are never valid in the CSV mappings we generate -> (refinement type, message)
+FORBIDDEN_TERMS = {
+    "rml:iterator": ("rml_syntax", "Invalid RML: Use rml:referenceFormulation ql:CSV for CSV files, not rml:iterator"),
+    "rml:classifier": ("rml_syntax", "Invalid RML: rml:classifier should be rml:class"),
+}
+
+_NUMBER_RE = re.compile(r"[+-]?(\d+\.?\d*|\.\d+)([eE][+-]?\d+)?$")
+_BARE_KEYWORDS = {"a", "true", "false", "PREFIX", "BASE", "prefix", "base"}
+_DELIMITERS = set(" \t\r\n;,^")
+_OPENING = {"[": "]", "(": ")"}
+_CLOSING = {"]": "[", ")": "("}
+# Prose before the Turtle starts is tolerated (extract_turtle strips it), but not forever
+_MAX_PREAMBLE_CHARS = 4000
+# A line starting with a subject: a qname, a relative or absolute IRI, or a blank node
+_SUBJECT_START_RE = re.compile(r"^[ \t]*(?:<(?:#|[^\s<>]*:)[^\s<>]*>|\[[ \t\r\n\]]|([A-Za-z][\w-]*):[A-Za-z_])", re.MULTILINE)
+
+
+class IncrementalTurtleChecker:
+    """
+    Checks Turtle while it is still being generated, so a streaming LLM call can
+    be cancelled as soon as the output is clearly unusable.
+
+    feed() takes the next chunk and returns an error message (or None). It
+    flags function-call JSON instead of Turtle, prefixes used before their
+    @prefix declaration, unbalanced brackets, unterminated strings or IRIs,
+    stray prose inside the Turtle, and FORBIDDEN_TERMS. A leading explanation
+    or a markdown fence is tolerated, because extract_turtle() removes it.
+    After an error, `error_type` holds the create_refinement_prompt() type.
+
+    Problems that a later pass fixes mechanically need not stop generation:
+    pass the terms to reject as `forbidden_terms`, and the prefixes that may be
+    used undeclared as `implicit_prefixes`. With implicit prefixes, Turtle that
+    leaves out the prefix block is recognized from its first subject.
+    Call finish() once the stream has ended to check the last characters.
+    """
+
+    def __init__(self, forbidden_terms: dict = None, implicit_prefixes=()):
+        self.forbidden_terms = FORBIDDEN_TERMS if forbidden_terms is None else forbidden_terms
+        self.error = None
+        self.error_type = None
+        self.implicit_prefixes = frozenset(implicit_prefixes)
+        self.declared = set(self.implicit_prefixes)
+        self.chars_seen = 0
+        self._pending = ""
+        self._mode = "preamble"  # preamble, turtle, iri, string, comment, done
+        self._quote = ""
+        self._token = ""
+        self._expect_prefix_name = False
+        self._brackets = []
+
+    def _fail(self, error_type: str, message: str) -> str:
+        self.error_type, self.error = error_type, message
+        self._mode = "done"
+        return message
+
+    def feed(self, chunk: str) -> str | None:
+        if self.error or self._mode == "done":
+            return self.error
+        self.chars_seen += len(chunk)
+        self._pending += chunk
+        # Keep two characters back so quotes ('"""') and dots can look ahead
+        self._process(final=False)
+        return self.error
+
+    def finish(self) -> str | None:
+        """Checks what is left once the stream has ended."""
+        if self.error or self._mode == "done":
+            return self.error
+        self._process(final=True)
+        if self.error:
+            return self.error
+        if self._mode in ("iri", "string"):
+            return self._fail("syntax", f"Unterminated {'IRI' if self._mode == 'iri' else 'string literal'} at end of output")
+        self._end_token()
+        if self.error:
+            return self.error
+        if self._mode == "turtle" and self._brackets:
+            return self._fail("syntax", f"Unbalanced brackets: '{self._brackets[-1]}' is never closed")
+        return None
+
+    def _start_turtle(self) -> bool:
+        text = self._pending
+        stripped = text.lstrip()
+        if stripped.startswith("{"):
+            if '"name"' in stripped or len(stripped) > 200:
+                self._fail("generation", "RML generation returned a function call instead of Turtle")
+            return False
+        fence = text.find("```")
+        if fence != -1:
+            line_end = text.find("\n", fence)
+            if line_end == -1:
+                return False
+            self._pending = text[line_end + 1:]
+            self._mode = "turtle"
+            return True
+        m = re.search(r"@prefix|@base|^\s*PREFIX\s", text, re.IGNORECASE | re.MULTILINE)
+        if m is None and self.implicit_prefixes:
+            m = next((s for s in _SUBJECT_START_RE.finditer(text) if s.group(1) is None or s.group(1) in self.implicit_prefixes), None)
+        if m:
+            self._pending = text[m.start():]
+            self._mode = "turtle"
+            return True
+        if len(text) > _MAX_PREAMBLE_CHARS:
+            self._fail("generation", "No Turtle found in the first {} characters of output".format(_MAX_PREAMBLE_CHARS))
+        return False
+
+    def _end_token(self) -> None:
+        token, self._token = self._token, ""
+        if not token:
+            return
+        if self._expect_prefix_name:
+            self._expect_prefix_name = False
+            if not token.endswith(":"):
+                self._fail("syntax", f"Malformed prefix declaration near '{token}'")
+            else:
+                self.declared.add(token[:-1])
+            return
+        if token.lower() in ("@prefix", "prefix"):
+            self._expect_prefix_name = True
+            return
+        if token.startswith("@") or token in _BARE_KEYWORDS or token.startswith("_:") or _NUMBER_RE.match(token):
+            return
+        if ":" in token:
+            prefix = token.split(":", 1)[0]
+            if prefix not in self.declared:
+                self._fail("syntax", f"Prefix '{prefix}:' is used in '{token}' before it is declared with @prefix")
+            elif token in self.forbidden_terms:
+                self._fail(*self.forbidden_terms[token])
+            return
+        self._fail("syntax", f"Unexpected text '{token[:40]}' in Turtle output")
+
+    def _process(self, final: bool) -> None:
+        if self._mode == "preamble" and not self._start_turtle():
+            return
+        text = self._pending
+        end = len(text) if final else len(text) - 2
+        i = 0
+        while i < end and not self.error and self._mode != "done":
+            c = text[i]
+            mode = self._mode
+            if mode == "comment":
+                if c == "\n":
+                    self._mode = "turtle"
+            elif mode == "iri":
+                if c == ">":
+                    self._mode = "turtle"
+                elif c in " \t\r\n":
+                    self._fail("syntax", "Whitespace inside an IRI (<...>)")
+            elif mode == "string":
+                if c == "\\":
+                    i += 1
+                elif len(self._quote) == 1:
+                    if c == self._quote:
+                        self._mode = "turtle"
+                    elif c == "\n":
+                        self._fail("syntax", "Line break inside a single-quoted string literal")
+                elif text.startswith(self._quote, i):
+                    i += 2
+                    self._mode = "turtle"
+            elif c == "." and self._token and i + 1 < len(text) and text[i + 1] not in " \t\r\n":
+                self._token += c  # Inside a number or local name, not the end of a statement
+            elif c in _DELIMITERS or c == ".":
+                self._end_token()
+            elif c == "#":
+                self._end_token()
+                self._mode = "comment"
+            elif c == "<":
+                self._end_token()
+                self._mode = "iri"
+            elif c in "\"'":
+                self._end_token()
+                self._quote = c * 3 if text.startswith(c * 3, i) else c
+                i += len(self._quote) - 1
+                self._mode = "string"
+            elif c in _OPENING:
+                self._end_token()
+                self._brackets.append(c)
+            elif c in _CLOSING:
+                self._end_token()
+                if not self._brackets or self._brackets[-1] != _CLOSING[c]:
+                    self._fail("syntax", f"Unbalanced brackets: unexpected '{c}'")
+                else:
+                    self._brackets.pop()
+            elif c == "`":
+                # Closing markdown fence: whatever follows is not Turtle
+                self._end_token()
+                if not self.error:
+                    self._mode = "done"
+            elif c in "{}":
+                self._fail("syntax", f"Unexpected '{c}' in Turtle output")
+            else:
+                self._token += c
+            i += 1
+        self._pending = text[i:] if self._mode != "done" else ""
@@ -0,0 +1,176 @@
+import re
+from dataclasses import dataclass
+
+from rdflib import BNode, Graph
+
+from src.mapping import MAPPING_BASE
+
+_DIRECTIVE_RE = re.compile(r"\s*(@prefix|@base|PREFIX\s|BASE\s)", re.IGNORECASE)
+_PREFIX_NAME_RE = re.compile(r"(?:@prefix|PREFIX)\s+([A-Za-z0-9_.-]*):", re.IGNORECASE)
+
+
+@dataclass
+class Fragment:
+    """One top-level Turtle statement (usually a whole TriplesMap) and its span in the mapping text."""
+    start: int
+    end: int
+    text: str
+
+    @property
+    def subject(self) -> str:
+        return self.text.split(None, 1)[0] if self.text.strip() else ""
+
+
+def split_statements(text: str) -> tuple[list[Fragment], list[Fragment]]:
+    """
+    Splits Turtle into top-level statements. Returns (directives, statements),
+    where directives are the @prefix/@base lines.
+
+    A statement ends at a '.' that closes its line (outside strings, IRIs and
+    comments). Bracket depth is deliberately ignored so that a mapping with an
+    unbalanced bracket still splits into the TriplesMaps the model meant.
+    """
+    directives, statements = [], []
+    i, n = 0, len(text)
+    start = None
+    while i < n:
+        c = text[i]
+        if start is None:
+            if c.isspace():
+                i += 1
+                continue
+            if c == "#":
+                i = _line_end(text, i)
+                continue
+            start = i
+            if re.match(r"(PREFIX|BASE)\s", text[i:i + 7], re.IGNORECASE):
+                # SPARQL-style directives have no closing '.'
+                end = _line_end(text, i)
+                directives.append(Fragment(start, end, text[start:end]))
+                start, i = None, end
+                continue
+        if c == "#":
+            i = _line_end(text, i)
+        elif c == "<":
+            close = text.find(">", i)
+            i = n if close == -1 else close + 1
+        elif c in "\"'":
+            quote = c * 3 if text.startswith(c * 3, i) else c
+            j = i + len(quote)
+            while j < n and not text.startswith(quote, j):
+                j += 2 if text[j] == "\\" else 1
+            i = j + len(quote)
+        elif c == "." and _rest_of_line_blank(text, i + 1):
+            fragment = Fragment(start, i + 1, text[start:i + 1])
+            (directives if _DIRECTIVE_RE.match(fragment.text) else statements).append(fragment)
+            start, i = None, i + 1
+        else:
+            i += 1
+    if start is not None and text[start:].strip():
+        # Unterminated last statement
+        statements.append(Fragment(start, n, text[start:n].rstrip()))
+    return directives, statements
+
+
+def _line_end(text: str, i: int) -> int:
+    end = text.find("\n", i)
+    return len(text) if end == -1 else end
+
+
+def _rest_of_line_blank(text: str, i: int) -> bool:
+    rest = text[i:_line_end(text, i)]
+    return not rest.strip() or rest.strip().startswith("#")
+
+
+def fragment_at(text: str, offset: int) -> Fragment | None:
+    """The statement containing character `offset` (or the closest one before it)."""
+    _, statements = split_statements(text)
+    best = None
+    for fragment in statements:
+        if fragment.start <= offset:
+            best = fragment
+        if fragment.start <= offset < fragment.end:
+            return fragment
+    return best
+
+
+def locate_parse_error(text: str, error) -> Fragment | None:
+    """Finds the statement a Turtle parse error points at ("at line N" in rdflib's message)."""
+    m = re.search(r"at line (\d+)", str(error))
+    if not m:
+        return None
+    line = int(m.group(1))
+    offset = 0
+    for _ in range(line - 1):
+        next_line = text.find("\n", offset)
+        if next_line == -1:
+            break
+        offset = next_line + 1
+    return fragment_at(text, offset)
+
+
+def locate_focus_node(text: str, graph: Graph, focus_node) -> Fragment | None:
+    """
+    Finds the statement that defines a SHACL focus node. Blank nodes (object
+    maps, logical sources, ...) are traced up to the named node that owns them,
+    usually the TriplesMap.
+    """
+    owner = focus_owner(graph, focus_node)
+    return locate_subject(text, owner) if owner is not None else None
+
+
+def focus_owner(graph: Graph, focus_node):
+    """The named node a focus node belongs to (itself unless it is a blank node), or None."""
+    owner, seen = focus_node, set()
+    while isinstance(owner, BNode) and owner not in seen:
+        seen.add(owner)
+        parent = next(graph.subjects(None, owner), None)
+        if parent is None:
+            break
+        owner = parent
+    return None if isinstance(owner, BNode) else owner
+
+
+def locate_subject(text: str, owner) -> Fragment | None:
+    """Finds the statement whose subject is the named node owner."""
+    directives, statements = split_statements(text)
+    prologue = "\n".join(d.text for d in directives)
+    for fragment in statements:
+        try:
+            fragment_graph = Graph().parse(data=f"{prologue}\n{fragment.text}", format="turtle", publicID=MAPPING_BASE)
+        except Exception:
+            continue
+        if (owner, None, None) in fragment_graph:
+            return fragment
+    return None
+
+
+def extract_fragment(text: str) -> str:
+    """The Turtle of a fragment answer: the fenced block if there is one, else the text itself."""
+    m = re.search(r"```(?:turtle|ttl)?\n(.*?)```", text or "", re.DOTALL | re.IGNORECASE)
+    return (m.group(1) if m else text or "").strip()
+
+
+def splice_fragments(text: str, replacements: list) -> str:
+    """
+    Replaces each (Fragment, new_text) in the mapping text. Prefix
+    declarations inside a new fragment are moved to the top of the mapping
+    unless that prefix is already declared.
+    """
+    declared = set(_PREFIX_NAME_RE.findall(text))
+    new_directives = []
+    for fragment, new_text in sorted(replacements, key=lambda r: r[0].start, reverse=True):
+        directives, _ = split_statements(new_text)
+        for d in reversed(directives):
+            m = _PREFIX_NAME_RE.match(d.text.strip())
+            if m and m.group(1) not in declared:
+                declared.add(m.group(1))
+                new_directives.append(d.text.strip())
+            new_text = new_text[:d.start] + new_text[d.end:]
+        new_text = new_text.strip()
+        if not new_text.endswith("."):
+            new_text += " ."
+        text = text[:fragment.start] + new_text + text[fragment.end:]
+    if new_directives:
+        text = "\n".join(new_directives) + "\n" + text
+    return text
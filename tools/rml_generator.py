@@ -1,14 +1,52 @@
 import os
 from prefixes import get_prefix_declarations  
+from tools.data_analyzer import read_csv_headers
+from tools.token_budget import PROMPT_TOKEN_BUDGET, compact_passages, estimate_tokens, header_terms
 
-def construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis):
+def construct_combined_rml_prompt(csv_file_path, csv_analysis, td_analysis, partial_mapping=None, unresolved_columns=None, token_budget=None):
     """
     Combines CSV and TD analyses to generate a final RML mapping prompt.
+    With a partial_mapping (from the rule-based generator), the LLM only has to
+    add mappings for the unresolved_columns and keep the rest unchanged.
+
+    If the prompt exceeds token_budget (default PROMPT_TOKEN_BUDGET), the two
+    analyses are cut down to their passages about the CSV's columns.
     """
     # Get prefixes as a string
     prefix_declarations = get_prefix_declarations()
+    budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+
+    partial_section = ""
+    if partial_mapping:
+        partial_section = f"""
+### PARTIAL MAPPING (ALREADY VALIDATED – KEEP EVERY LINE OF IT UNCHANGED):
+{partial_mapping}
 
-    combined_prompt = f"""
+### YOUR PART:
+Add mappings ONLY for these CSV columns, which the partial mapping does not cover yet: {unresolved_columns}
+Follow the rules above, then output the COMPLETE mapping (the partial mapping plus your additions).
+"""
+
+    combined_prompt = _render_combined_prompt(csv_file_path, csv_analysis, td_analysis, prefix_declarations, partial_section)
+    total = estimate_tokens(combined_prompt)
+    if total <= budget:
+        return combined_prompt
+
+    # Everything but the analyses is fixed; split what is left between them
+    csv_tokens, td_tokens = estimate_tokens(csv_analysis), estimate_tokens(td_analysis)
+    available = max(budget - (total - csv_tokens - td_tokens), 0)
+    csv_share = min(csv_tokens, max(available // 2, available - td_tokens))
+    try:
+        terms = header_terms(read_csv_headers(csv_file_path))
+    except (OSError, StopIteration):
+        terms = set()
+    csv_analysis = compact_passages(csv_analysis, terms, csv_share)
+    td_analysis = compact_passages(td_analysis, terms, available - estimate_tokens(csv_analysis))
+    return _render_combined_prompt(csv_file_path, csv_analysis, td_analysis, prefix_declarations, partial_section)
+
+
+def _render_combined_prompt(csv_file_path, csv_analysis, td_analysis, prefix_declarations, partial_section):
+    return f"""
 You are an expert RML (RDF Mapping Language) generator for sensor data in smart factories. 
 Your task is to generate ONLY valid, syntactically correct, and semantically accurate RML mapping rules using **SOSA (Sensor, Observation, Sample, and Actuator Ontology)** and **QUDT**.
 
@@ -80,7 +118,6 @@ Generate RML mapping with:
 4. All values from CSV columns must be mapped using rml:reference.
 5. All units must be expressed as qudt:unit triples.
 6. All observed properties must be linked to QUDT quantitykind IRIs.
-
+{partial_section}
 ### OUTPUT THE TURTLE NOW (NOTHING ELSE):
 """
-    return combined_prompt
\ No newline at end of file
@@ -0,0 +1,204 @@
+import os
+import re
+
+from prefixes import get_prefix_declarations
+from tools.data_analyzer import cached_profile
+from tools.td_analyzer import read_td
+
+# --- Alignment rules (mirrors the RML STRUCTURE RULES in construct_combined_rml_prompt) ---
+
+# Normalized column name -> (predicate, default datatype) for properties of the sensor itself
+SENSOR_PROPERTIES = {
+    "name": ("schema:name", "xsd:string"),
+    "title": ("schema:name", "xsd:string"),
+    "floor": ("ex:floor", "xsd:integer"),
+    "level": ("ex:floor", "xsd:integer"),
+    "lat": ("geo:lat", "xsd:float"),
+    "latitude": ("geo:lat", "xsd:float"),
+    "lon": ("geo:long", "xsd:float"),
+    "lng": ("geo:long", "xsd:float"),
+    "long": ("geo:long", "xsd:float"),
+    "longitude": ("geo:long", "xsd:float"),
+    "description": ("dct:description", "xsd:string"),
+    "desc": ("dct:description", "xsd:string"),
+}
+
+# Normalized column name -> (QUDT quantity kind, default unit, observation IRI abbreviation)
+MEASUREMENTS = {
+    "temperature": ("Temperature", "DEG_C", "temp"),
+    "temp": ("Temperature", "DEG_C", "temp"),
+    "humidity": ("DimensionlessRatio", "PERCENT", "hum"),
+    "hum": ("DimensionlessRatio", "PERCENT", "hum"),
+    "relativehumidity": ("DimensionlessRatio", "PERCENT", "hum"),
+    "pressure": ("Pressure", "PA", "pres"),
+}
+
+# Free-text units as they appear in Thing Descriptions -> QUDT unit local name
+UNIT_ALIASES = {
+    "degreecelsius": "DEG_C", "celsius": "DEG_C", "°c": "DEG_C", "degc": "DEG_C", "deg_c": "DEG_C",
+    "degreefahrenheit": "DEG_F", "fahrenheit": "DEG_F", "°f": "DEG_F",
+    "kelvin": "K", "k": "K",
+    "percent": "PERCENT", "percentage": "PERCENT", "%": "PERCENT",
+    "pascal": "PA", "pa": "PA",
+    "hectopascal": "HectoPA", "hpa": "HectoPA",
+}
+
+QUDT_UNIT_NS = "http://qudt.org/vocab/unit/"
+QUDT_QUANTITYKIND_NS = "http://qudt.org/vocab/quantitykind/"
+
+TD_TYPE_TO_XSD = {"integer": "xsd:integer", "number": "xsd:float", "boolean": "xsd:boolean", "string": "xsd:string"}
+
+
+def _normalize(name: str) -> str:
+    return re.sub(r"[^a-z0-9%°]", "", name.strip().lower())
+
+
+def _resolve_unit(unit):
+    """Maps a TD unit (QUDT IRI or free text) to a QUDT unit local name, or None if unknown."""
+    if not unit:
+        return None
+    unit = str(unit).strip()
+    if unit.startswith(QUDT_UNIT_NS):
+        return unit[len(QUDT_UNIT_NS):]
+    return UNIT_ALIASES.get(unit.lower().replace(" ", ""))
+
+
+def _align_td_properties(columns, td_properties: dict) -> dict:
+    """Matches each column to a TD property by normalized name or title (workstation_id ~ workstationId)."""
+    by_key = {}
+    for prop_name, details in td_properties.items():
+        by_key.setdefault(_normalize(prop_name), details)
+        if isinstance(details, dict) and details.get("title"):
+            by_key.setdefault(_normalize(details["title"]), details)
+    return {col: by_key.get(_normalize(col)) for col in columns}
+
+
+def _slug(value: str) -> str:
+    last = re.split(r"[:/#]", value.rstrip(":/#"))[-1]
+    return re.sub(r"[^A-Za-z0-9_-]", "-", last) or "sensor"
+
+
+def align_columns(csv_file_path: str, td_file_path: str, profile: dict = None) -> dict:
+    """
+    Decides, column by column, how the generation rules map a CSV onto SOSA/QUDT.
+
+    Returns {"key": id column or None, "timestamp": column or None,
+             "sensor_properties": {col: (predicate, datatype)},
+             "measurements": {col: (quantity kind, unit, abbreviation, datatype)},
+             "unresolved": [columns no rule covers], "confidence": resolved share}.
+    """
+    if profile is None:
+        profile = cached_profile(csv_file_path)
+    td = read_td(td_file_path)
+    columns = [c["name"] for c in profile["columns"]]
+    measured = {c["name"]: c for c in profile["columns"]}
+    td_match = _align_td_properties(columns, td.get("properties", {}))
+
+    def datatype(col, default):
+        if measured[col]["type"] != "string" or default == "xsd:string":
+            return measured[col]["xsd_datatype"]
+        td_type = (td_match[col] or {}).get("type")
+        return TD_TYPE_TO_XSD.get(td_type, default)
+
+    key = None
+    timestamp = None
+    sensor_properties = {}
+    measurements = {}
+    unresolved = []
+
+    for col in columns:
+        norm = _normalize(col)
+        if key is None and (norm == "id" or norm.endswith("id")) and col in profile["candidate_keys"]:
+            key = col
+        elif timestamp is None and measured[col]["is_timestamp"]:
+            timestamp = col
+        elif norm in SENSOR_PROPERTIES:
+            predicate, default = SENSOR_PROPERTIES[norm]
+            sensor_properties[col] = (predicate, datatype(col, default))
+        elif norm in MEASUREMENTS and measured[col]["type"] in ("integer", "float"):
+            quantity_kind, default_unit, abbreviation = MEASUREMENTS[norm]
+            td_unit = (td_match[col] or {}).get("unit")
+            unit = _resolve_unit(td_unit) if td_unit else default_unit
+            if unit is None:
+                unresolved.append(col)  # The TD names a unit we cannot translate
+                continue
+            measurements[col] = (quantity_kind, unit, abbreviation, datatype(col, "xsd:float"))
+        else:
+            unresolved.append(col)
+
+    # Observations need a per-row key for their IRIs
+    if measurements and key is None and timestamp is None:
+        unresolved.extend(measurements)
+        measurements = {}
+
+    resolved = len(columns) - len(unresolved)
+    return {
+        "key": key,
+        "timestamp": timestamp,
+        "sensor_properties": sensor_properties,
+        "measurements": measurements,
+        "unresolved": unresolved,
+        "confidence": round(resolved / len(columns), 3) if columns else 0.0,
+        "td_id": td.get("id") or td.get("title") or "sensor",
+        "td_title": td.get("title", ""),
+    }
+
+
+def _object_map(lines: list) -> str:
+    return "        rml:objectMap [\n" + ";\n".join(f"            {line}" for line in lines) + "\n        ]"
+
+
+def _pom(predicate: str, object_lines: list) -> str:
+    return f"    rml:predicateObjectMap [\n        rml:predicate {predicate};\n{_object_map(object_lines)}\n    ]"
+
+
+def _triples_map(name: str, source: str, subject_lines: list, poms: list) -> str:
+    subject = ";\n".join(f"        {line}" for line in subject_lines)
+    return (
+        f"<#{name}> a rml:TriplesMap;\n"
+        f"    rml:logicalSource [\n        rml:source \"{source}\";\n        rml:referenceFormulation ql:CSV\n    ];\n"
+        f"    rml:subjectMap [\n{subject}\n    ];\n"
+        + ";\n".join(poms) + ".\n"
+    )
+
+
+def generate_rule_based_rml(csv_file_path: str, alignment: dict) -> str:
+    """Emits RML for every column the alignment resolved, following the generation prompt's rules."""
+    source = os.path.basename(csv_file_path)
+    key = alignment["key"]
+    if key:
+        sensor_subject = [f'rml:template "http://example.org/sensor/{{{key}}}"']
+    else:
+        # One physical sensor (from the TD) produced every row
+        sensor_subject = [f"rml:constant <http://example.org/sensor/{_slug(alignment['td_id'])}>"]
+
+    sensor_poms = [
+        _pom(predicate, [f'rml:reference "{col}"', f"rml:datatype {dtype}"])
+        for col, (predicate, dtype) in alignment["sensor_properties"].items()
+    ]
+    if not any(p == "schema:name" for p, _ in alignment["sensor_properties"].values()) and alignment["td_title"]:
+        title = alignment["td_title"].replace("\\", "\\\\").replace('"', '\\"')
+        sensor_poms.insert(0, _pom("schema:name", [f'rml:constant "{title}"']))
+
+    blocks = []
+    if sensor_poms:
+        blocks.append(_triples_map("SensorTriplesMap", source, sensor_subject + ["rml:class sosa:Sensor"], sensor_poms))
+
+    obs_key = key or alignment["timestamp"]
+    for col, (quantity_kind, unit, abbreviation, dtype) in alignment["measurements"].items():
+        poms = [
+            _pom("sosa:hasSimpleResult", [f'rml:reference "{col}"', f"rml:datatype {dtype}"]),
+            _pom("sosa:observedProperty", [f"rml:constant <{QUDT_QUANTITYKIND_NS}{quantity_kind}>"]),
+            _pom("qudt:unit", [f"rml:constant <{QUDT_UNIT_NS}{unit}>"]),
+            _pom("sosa:madeBySensor", sensor_subject),
+        ]
+        if alignment["timestamp"]:
+            poms.append(_pom("sosa:resultTime", [f'rml:reference "{alignment["timestamp"]}"', "rml:datatype xsd:dateTime"]))
+        name = "".join(part.capitalize() for part in re.split(r"[^A-Za-z0-9]+", col) if part)
+        blocks.append(_triples_map(
+            f"{name}ObservationTriplesMap", source,
+            [f'rml:template "http://example.org/obs/{abbreviation}-{{{obs_key}}}"', "rml:class sosa:Observation"],
+            poms,
+        ))
+
+    return get_prefix_declarations() + "\n\n" + "\n".join(blocks)
@@ -1,16 +1,62 @@
 import json
 import os
 
+from tools.data_analyzer import read_csv_headers
+from tools.token_budget import PROMPT_TOKEN_BUDGET, estimate_tokens, header_terms, is_relevant
+
 def read_td(path: str) -> dict:
     """Reads and parses a Thing Description JSON file."""
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
-def construct_td_prompt(td_file_path: str) -> str:
+def _property_details(details) -> dict:
+    """A TD property as a dict; a non-object value (malformed TD) becomes its description."""
+    return details if isinstance(details, dict) else {'description': str(details)}
+
+def _prefixes_used(text: str, context) -> list:
+    """Keeps the URLs and namespace prefixes of a TD @context, and the term definitions used in text."""
+    kept = []
+    for entry in context if isinstance(context, list) else [context]:
+        if isinstance(entry, dict):
+            entry = {
+                k: v for k, v in entry.items()
+                if (isinstance(v, str) and v.endswith(("#", "/"))) or k in text
+            }
+            if not entry:
+                continue
+        kept.append(entry)
+    return kept
+
+
+def construct_td_prompt(td_file_path: str, csv_file_path: str = None, token_budget: int = None) -> str:
     """
     Constructs a prompt focused on Thing Description semantic structure.
+
+    With a csv_file_path, a TD whose prompt exceeds token_budget (default
+    PROMPT_TOKEN_BUDGET) is reduced to the properties matching the CSV headers
+    and the @context prefixes those properties use.
     """
     td = read_td(td_file_path)
+    prompt = _render_td_prompt(td)
+    budget = PROMPT_TOKEN_BUDGET if token_budget is None else token_budget
+    if csv_file_path is None or estimate_tokens(prompt) <= budget:
+        return prompt
+
+    terms = header_terms(read_csv_headers(csv_file_path))
+    properties = td.get('properties', {})
+    relevant = {
+        name: details for name, details in properties.items()
+        if is_relevant(name, _property_details(details).get('title', ''), terms)
+    }
+    if not relevant:
+        return prompt
+    compact = dict(td, properties=relevant)
+    compact['@context'] = _prefixes_used(json.dumps(relevant), td.get('@context', []))
+    omitted = len(properties) - len(relevant)
+    return _render_td_prompt(compact, f"({omitted} properties without a matching CSV column omitted)" if omitted else "")
+
+
+def _render_td_prompt(td: dict, omitted_note: str = "") -> str:
     
     # Extract key TD information
     td_title = td.get('title', 'Unknown')
@@ -21,11 +67,14 @@ def construct_td_prompt(td_file_path: str) -> str:
     
     td_properties_info = []
     for prop_name, prop_details in td_properties.items():
+        prop_details = _property_details(prop_details)
         title = prop_details.get('title', prop_name)
         description = prop_details.get('description', '')
         data_type = prop_details.get('type', 'unknown')
         td_properties_info.append(f"- {prop_name} ({data_type}): '{title}' - {description}")
     
+    if omitted_note:
+        td_properties_info.append(omitted_note)
     td_properties_str = "\n   ".join(td_properties_info)
     
     td_prompt = f"""
@@ -0,0 +1,93 @@
+import functools
+import math
+import os
+import re
+
+# Upper bound for one prompt; the free-text sections are compacted to fit it
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "6000"))
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|[^\sA-Za-z\d]")
+_WORD_RE = re.compile(r"[a-z]+|\d+")
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding():
+    # Loaded on the first count, so importing this module stays cheap
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # Optional: without tiktoken (or its data files) the local estimate is used
+        return None
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Token count of text: exact with tiktoken, otherwise a local estimate that
+    counts one token per four letters of a word and one per symbol. The
+    estimate errs high, so a prompt it fits into the budget really fits.
+    """
+    if not text:
+        return 0
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    count = 0
+    for piece in _PIECE_RE.findall(text):
+        if piece[0].isalpha():
+            count += math.ceil(len(piece) / 4)
+        elif piece[0].isdigit():
+            count += math.ceil(len(piece) / 3)
+        else:
+            count += 1
+    return count
+
+
+def name_terms(name: str) -> set:
+    """Words of an identifier: 'workstationId', 'workstation_id' and 'Workstation ID' all give {'workstation', 'id'}."""
+    spaced = re.sub(r"([a-z])([A-Z])", r"\1 \2", name)
+    return set(_WORD_RE.findall(spaced.lower()))
+
+
+def header_terms(headers) -> set:
+    terms = set()
+    for header in headers:
+        terms |= name_terms(header.strip())
+    return terms
+
+
+def is_relevant(name: str, title: str, terms: set) -> bool:
+    """True if a TD property shares a meaningful word with the CSV headers."""
+    words = {w for w in name_terms(name) | name_terms(title or "") if len(w) > 2 or w in ("id", "lat", "lon")}
+    return bool(words & terms)
+
+
+def compact_passages(text: str, terms: set, max_tokens: int, topic: str = "the CSV columns") -> str:
+    """
+    Shortens free text to max_tokens by keeping the passages (paragraphs, or
+    lines for a single paragraph) that mention the most terms (CSV header
+    terms, or those of `topic`), in their original order.
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    passages = [p for p in re.split(r"\n\s*\n", text) if p.strip()]
+    separator = "\n\n"
+    if len(passages) < 3:
+        passages = [p for p in text.splitlines() if p.strip()]
+        separator = "\n"
+
+    scored = []
+    for i, passage in enumerate(passages):
+        words = set(_WORD_RE.findall(passage.lower()))
+        scored.append((-len(words & terms), i, passage))
+    kept, used = [], 0
+    for _, i, passage in sorted(scored):
+        cost = estimate_tokens(passage)
+        if used + cost > max_tokens:
+            continue
+        kept.append((i, passage))
+        used += cost
+    omitted = len(passages) - len(kept)
+    out = separator.join(p for _, p in sorted(kept))
+    if omitted:
+        out += f"{separator}[{omitted} passage(s) not about {topic} omitted to fit the token budget]"
+    return out